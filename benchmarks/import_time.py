@@ -0,0 +1,35 @@
+"""
+Time importing pandas_stash
+
+Run with ``python benchmarks/import_time.py``.  Reports the best of several
+runs of the cumulative import time of pandas_stash, and of pandas for
+comparison, as measured by ``python -X importtime``.
+"""
+import subprocess
+import sys
+
+REPEAT = 5
+
+
+def _import_time(module):
+    cmd = [sys.executable, '-X', 'importtime', '-c', 'import ' + module]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, universal_newlines=True)
+    _, err = proc.communicate()
+    if proc.returncode != 0:
+        raise RuntimeError(err)
+    for line in err.splitlines():
+        parts = line[len('import time:'):].split('|')
+        if len(parts) == 3 and parts[2].strip() == module:
+            return int(parts[1])
+    raise RuntimeError('{0} was not imported.'.format(module))
+
+
+def main():
+    for module in ('pandas_stash', 'pandas'):
+        best = min(_import_time(module) for _ in range(REPEAT))
+        print('{0:<14} {1:>8.1f}ms'.format(module, best / 1000.0))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Time selecting variables from large namespaces
+
+Run with ``python benchmarks/selection.py``.  Each line compares two
+selections that a matcher testing every pattern separately, or scanning
+the namespace for exact names, would take very different times on.
+"""
+import re
+import time
+
+from pandas_stash.selection import Selector
+
+
+def _names(n):
+    return ['var_{0}_{1}'.format(i % 1000, i) for i in range(n)]
+
+
+def _best_time(function, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def _patterns(count):
+    patterns = ['var_{0}_*'.format(i) for i in range(count)]
+    return patterns + ['res_{0}'.format(i) for i in range(count)]
+
+
+def _report(label, first, second):
+    print('{0:<36} {1:.4f}s {2:.4f}s  x{3:.1f}'.format(
+        label, first, second, second / first))
+
+
+def main():
+    large = dict((name, 1) for name in _names(100000))
+    small = dict((name, 1) for name in _names(10000))
+
+    few = Selector(include=_patterns(3))
+    many = Selector(include=_patterns(300))
+    _report('6 vs 600 patterns, 100k names',
+            _best_time(lambda: few.names(large)),
+            _best_time(lambda: many.names(large)))
+
+    patterns = ['var_{0}_*'.format(i) for i in range(100)]
+    patterns.append(re.compile('_99999$'))
+    exclude = Selector(exclude=patterns)
+    _report('10k vs 100k names, 101 patterns',
+            _best_time(lambda: exclude.names(small)),
+            _best_time(lambda: exclude.names(large)))
+
+    exact = Selector(include=_names(100))
+    scan = Selector(include=['var_*'])
+    _report('100 exact names vs scan, 100k names',
+            _best_time(lambda: exact.names(large)),
+            _best_time(lambda: scan.names(large)))
+
+
+if __name__ == '__main__':
+    main()
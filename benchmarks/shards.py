@@ -0,0 +1,69 @@
+"""
+Time reading a sharded stash in the calling process, with threads and with
+processes
+
+Run with ``python benchmarks/shards.py``.  Shards are read one after another
+in the calling process.  Threads only overlap the work done without the HDF5
+lock, such as copying columns, and reading with processes pickles each vault
+read back to the caller.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from pandas_stash import stash, unstash
+from pandas_stash.shards import _load_shard, _map, read_index
+
+SHARDS = 4
+
+
+def _frame():
+    rs = np.random.RandomState(0)
+    frame = {}
+    for i in range(2 * SHARDS):
+        frame['arr{0}'.format(i)] = np.round(rs.randn(1000000, 4), 2)
+        frame['df{0}'.format(i)] = pd.DataFrame(
+            {'a': np.round(rs.randn(500000), 2), 'b': np.arange(500000)})
+    return frame
+
+
+def _best_time(function, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def _threads(tasks):
+    with ThreadPoolExecutor(SHARDS) as executor:
+        return list(executor.map(_load_shard, tasks))
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'stash')
+    try:
+        stash(path, frame=_frame(), shards=SHARDS, workers=1, verbose=False,
+              complib='blosc:zstd', complevel=5)
+        tasks = [(os.path.join(path, name), None, False, None, None, False)
+                 for name in read_index(path)['shards']]
+        timings = [
+            ('serial', lambda: unstash(path, frame={}, verbose=False)),
+            ('threads', lambda: _threads(tasks)),
+            ('processes', lambda: _map(_load_shard, tasks, SHARDS))]
+        print('{0} CPUs'.format(os.cpu_count()))
+        for label, function in timings:
+            print('{0:<10} {1:.3f}s'.format(label, _best_time(function)))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,46 @@
-import inspect
+"""
+Save and restore entire workspaces.
 
-from .io import Saver, Loader
+Importing the package is deliberately cheap: pandas, numpy and PyTables are
+only imported when a stash is first written or read.
+"""
+import sys
+
+from .store import stash_gc
+from .sync import wait_for_stash
+
+__all__ = ['stash', 'unstash', 'astash', 'aunstash', 'aunstash_iter',
+           'stash_diff', 'stash_gc', 'stash_stream', 'unstash_stream',
+           'wait_for_stash', 'CheckpointRing', 'ReadCache', 'get_read_cache',
+           'Saver', 'Loader']
+
+_LAZY_ATTRIBUTES = {'Saver': 'io', 'Loader': 'io', 'stash_diff': 'diff',
+                    'stash_stream': 'stream', 'unstash_stream': 'stream',
+                    'CheckpointRing': 'memory', 'ReadCache': 'cache',
+                    'get_read_cache': 'cache', 'astash': 'aio',
+                    'aunstash': 'aio', 'aunstash_iter': 'aio'}
+
+
+def __getattr__(name):
+    # PEP 562: resolve attributes that need pandas on first access
+    if name in _LAZY_ATTRIBUTES:
+        from importlib import import_module
+        module = import_module('.' + _LAZY_ATTRIBUTES[name], __name__)
+        return getattr(module, name)
+    raise AttributeError('module {0!r} has no attribute '
+                         '{1!r}'.format(__name__, name))
+
+
+def __dir__():
+    return sorted(list(globals().keys()) + list(_LAZY_ATTRIBUTES))
 
 
 def stash(path=None, pandas=True, scalars=True, numpy=True, frame=None,
-          private=False, include=None, exclude=None, verbose=True, **kwargs):
+          private=False, include=None, exclude=None, verbose=True,
+          chunkshape=None, store_dir=None, checksums=False, containers=True,
+          fallback=None, atomic=True, append_rows=False, shards=None,
+          workers=None, downcast=None, to='file', types=None,
+          max_nbytes=None, list_only=False, **kwargs):
     """
     Save the contents of your workspace -- pandas, numpy or scalars
 
@@ -17,51 +53,178 @@ def stash(path=None, pandas=True, scalars=True, numpy=True, frame=None,
     scalars: bool, optional
         Flag indicating whether to save scalars (float, int, string)
     numpy: bool, optional
-        Flag indicating whether to save numpy arrays (1-4 dimension, most
-        dtypes except complex)
-    frame: dict-like, optional
-        Dictionary-like structure that supports key-based access (e.g.
-        globals()).  Uses the frame of the calling namespace if not given.
+        Flag indicating whether to save numpy arrays (1-4 dimension, numeric,
+        complex, datetime, timedelta, string and structured dtypes)
+    frame: Mapping or sequence of Mapping, optional
+        Mapping holding the variables (e.g. globals()), or a sequence of
+        mappings such as ``[locals(), globals()]`` where earlier mappings
+        take precedence.  Uses the frame of the calling namespace if not
+        given.
     private: bool, optional
         Flag indicating whether to include variables starting with
         underscore (``_``)
-    include: iterable of str, optional
-        Iterable containing variables names to store or wildcard patterns to
-        match (e.g. ``ap*le`` or ``*pple``)
-    exclude: iterable of str, optional
-        Iterable containing variables names to exclude from the store or
-        wildcard patterns to match (e.g. ``ap*le`` or ``*pple``)
+    include: iterable of str or compiled regular expressions, optional
+        Iterable containing variables names to store, wildcard patterns to
+        match (e.g. ``ap*le`` or ``*pple``) or regular expressions searched
+        for in names (e.g. ``re.compile('^fit_[0-9]+$')``).  Names and
+        patterns are compiled into one matcher, so selecting from large
+        namespaces with many patterns stays fast.
+    exclude: iterable of str or compiled regular expressions, optional
+        Iterable containing variables names to exclude from the store,
+        wildcard patterns to match or regular expressions searched for in
+        names
     verbose: bool, optional
         Flag indicating whether to display information about variables stored.
+    chunkshape: {'auto', 'row', 'column'}, tuple or dict, optional
+        Chunk layout of numpy arrays.  'row' suits reading ranges of rows,
+        'column' suits reading columns and a tuple sets the chunk shape
+        explicitly.  A dict maps variable names to layouts.  The default,
+        'auto', lets PyTables choose.
+    store_dir: str, optional
+        Directory of a content-addressed store shared by many stashes.  When
+        given, each pandas object and numpy array is written once to the
+        store as a blob named by the hash of its content, and the stash file
+        only holds references to the blobs.  Use ``stash_gc`` to remove
+        blobs that are no longer referenced.
+    checksums: bool, optional
+        Flag indicating whether to record content hashes of each variable,
+        computed in blocks of rows, which make ``stash_diff`` fast and
+        let ``pandas-stash verify`` check the data.  Hashing costs about as
+        much as writing, so it is off by default, and ``stash_diff``
+        computes missing hashes by reading the variables.  Hashes are
+        always computed with store_dir and append_rows, which need them.
+    containers: bool, optional
+        Flag indicating whether to save dicts, lists and tuples, possibly
+        nested, that only hold pandas objects, numpy arrays and scalars.
+        Each pandas object and array is stored in its own node so that it
+        can be read individually with ``Loader.read``.
+    fallback: {None, 'pickle'}, optional
+        How to save variables that are not otherwise supported.  None skips
+        them.  'pickle' pickles them with protocol 5 and writes large
+        buffers, such as the arrays held by fitted models or sparse
+        matrices, out-of-band to compressed datasets without copying them
+        into the pickle.  Modules are always skipped.
+    atomic: bool, optional
+        Flag indicating whether to write to a temporary file in the same
+        directory that atomically replaces path once complete.  Readers,
+        including those using ``wait_for_stash``, then never see a partial
+        stash, and readers that already have path open keep reading the
+        previous version.
+    append_rows: bool, optional
+        Flag indicating whether to update an existing stash in place.
+        pandas objects whose stored rows are the leading rows of the current
+        object, with the same columns and dtypes, only have their new rows
+        appended, and unchanged ones are not written at all, so a checkpoint
+        of a growing DataFrame costs time proportional to the new rows.
+        Other pandas objects and all other variables are rewritten.  The
+        stored rows are checked against the block hashes in the manifest.
+        Updates are made in place, so atomic is ignored, and the manifest
+        is removed until the update completes.  Cannot be used with
+        store_dir.
+    shards: int, optional
+        Number of shards of a sharded stash.  When given, or when path is
+        the directory of an existing sharded stash, path is a directory
+        holding an index and this many shard files, each an ordinary stash
+        holding some of the variables.  Variables are assigned to shards so
+        that each holds a similar number of bytes, and shards are written
+        in parallel.  A shard is only rewritten if its variables changed,
+        which requires them to be pandas objects, numpy arrays or scalars.
+    workers: int, optional
+        Number of worker processes writing the shards of a sharded stash.
+        Defaults to the number of CPUs.
+    downcast: {None, 'safe'} or dict, optional
+        Policy narrowing the dtypes of pandas objects and numpy arrays
+        before they are written, which reduces the bytes written.  'safe'
+        only makes lossless changes: integers are narrowed to the smallest
+        dtype of the same signedness holding their range, float64 values
+        exactly representable as float32 are narrowed, object columns of
+        bools become bool and object columns of strings with many repeated
+        values become categoricals.
+        A dict maps variable names to 'safe', a dtype or, for DataFrames, a
+        dict mapping columns to dtypes, which are applied even if values
+        are lost.  The original dtypes are recorded so that
+        ``unstash(..., restore_dtypes=True)`` can restore them.
+    to: {'file', 'memory'}, optional
+        Where the stash is written.  'memory' builds the stash in memory,
+        without touching the disk, and returns the bytes of the complete,
+        compressed stash, which ``unstash`` accepts in place of a path.
+        These can be kept as an undo checkpoint, see ``CheckpointRing``, or
+        sent to another process.  path must be omitted, and shards,
+        store_dir and append_rows cannot be used.
+    types: type or tuple of types, optional
+        Only variables that are instances of these types are saved, e.g.
+        ``types=pd.DataFrame``
+    max_nbytes: int, optional
+        Variables using more than this many bytes in memory are not saved.
+        Sizes are only computed for variables selected by name.
+    list_only: bool, optional
+        Flag indicating whether to only return the variables that would be
+        saved, without writing anything
     kwargs: optional
         optional additional arguments to pass to HDFStore when creating the
         store. Can include values such as compression variables (complib,
         complevel)
 
+    Returns
+    -------
+    buffer : bytes, dict or None
+        The stash if written to memory.  If list_only, the kind each
+        variable would be saved as, one of 'pandas', 'numpy', 'builtin',
+        'container' or 'pickle', keyed by name.  Otherwise None.
+
     Notes
     -----
-    Does not currently support complex-valued numpy arrays.
+    numpy arrays are stored as typed HDF5 datasets without conversion.
     Includes are processed before excludes, so values that match both will be
     included.
     """
+    from .io import Saver
+    from .shards import is_sharded, stash_shards
+
     if frame is None:
-        _globals = inspect.currentframe().f_back.f_globals
-        frame = _globals if frame is None else frame
+        frame = sys._getframe(1).f_globals
+    if list_only:
+        saver = Saver(path, pandas, scalars, numpy, frame, private, include,
+                      exclude, verbose, containers=containers,
+                      fallback=fallback, types=types, max_nbytes=max_nbytes)
+        return saver.selection()
+    if to == 'memory' and shards is not None:
+        raise ValueError('shards cannot be used when writing to memory.')
+    if to != 'memory' and (shards is not None or is_sharded(path)):
+        stash_shards(path, frame, shards, workers, verbose, pandas=pandas,
+                     scalars=scalars, numpy=numpy, private=private,
+                     include=include, exclude=exclude, chunkshape=chunkshape,
+                     store_dir=store_dir, checksums=checksums,
+                     containers=containers, fallback=fallback, atomic=atomic,
+                     append_rows=append_rows, downcast=downcast, types=types,
+                     max_nbytes=max_nbytes, **kwargs)
+        return
     saver = Saver(path, pandas, scalars, numpy, frame, private, include,
-                  exclude, verbose, **kwargs)
+                  exclude, verbose, chunkshape, store_dir, checksums,
+                  containers, fallback, atomic, append_rows, downcast, to,
+                  types, max_nbytes, **kwargs)
     saver.open()
-    saver.write()
+    try:
+        saver.write()
+    except BaseException:
+        saver.abort()
+        raise
     saver.close()
+    return saver.buffer
 
 
-def unstash(path=None, insert=True, frame=None, overwrite=False, verbose=True):
+def unstash(path=None, insert=True, frame=None, overwrite=False, verbose=True,
+            max_bytes=None, lazy=False, store_dir=None, downcast=None,
+            restore_dtypes=False, cache=None):
     """
     Loads the contents of a file created by stash
 
     Parameters
     ----------
-    path: str, optional
-        Full path of file to save.  If omitted uses ./workspace.h5
+    path: str or bytes, optional
+        Full path of file to load, or the bytes of a stash returned by
+        ``stash(to='memory')``, which is read at once so lazy and
+        max_bytes cannot be used.  If omitted uses ./workspace.h5
     insert: bool, optional
         Flag indicating whether to insert into frame
     frame: dict-like, optional
@@ -71,6 +234,36 @@ def unstash(path=None, insert=True, frame=None, overwrite=False, verbose=True):
         Flag indicating whether to overwrite existing values in the frame
     verbose: bool, optional
         Flag indicating whether to display information about variables loaded
+    max_bytes: int, optional
+        Memory budget for pandas and numpy variables.  When set, these are
+        read on first access and the least-recently used are evicted from
+        the vault once the budget is exceeded, to be re-read from the file
+        when next accessed.  Requires ``insert=False``.
+    lazy: bool, optional
+        Flag indicating whether to defer reading.  pandas variables are read
+        on first access and numpy arrays are returned as ``ArrayProxy``
+        objects that only read the HDF5 chunks covered by a slice.  Since
+        inserting variables into a frame would read them, ``insert=False``
+        is required.
+    store_dir: str, optional
+        Directory of the content-addressed store holding the variables of a
+        stash written with ``store_dir``.  Defaults to the directory used
+        when the stash was written.
+    downcast: {None, 'safe'} or dict, optional
+        Policy narrowing the dtypes of pandas objects and numpy arrays as
+        they are loaded, which reduces the memory they use.  See ``stash``.
+        Arrays read lazily are not narrowed.
+    restore_dtypes: bool, optional
+        Flag indicating whether to restore the dtypes that pandas objects and
+        numpy arrays had before they were downcast by ``stash``
+    cache: bool or ReadCache, optional
+        Cache of the pandas objects and numpy arrays read, keyed by the path,
+        version and node they were read from.  While the file is unchanged
+        they are returned from the cache without being read and decompressed
+        again.  Cached values are shared, so they are returned with
+        read-only data unless the cache was created with ``copy=True``.
+        True uses the cache shared by the process, see ``get_read_cache``.
+        Not used for sharded stashes.
 
     Returns
     -------
@@ -78,8 +271,16 @@ def unstash(path=None, insert=True, frame=None, overwrite=False, verbose=True):
         dict-like object that supports tab completion for keys in IPython
 
     """
+    from .io import Loader
+    from .memory import is_buffer
+    from .shards import is_sharded, unstash_shards
+
     if frame is None:
-        _globals = inspect.currentframe().f_back.f_globals
-        frame = _globals if frame is None else frame
-    loader = Loader(path, insert, frame, overwrite, verbose)
+        frame = sys._getframe(1).f_globals
+    if not is_buffer(path) and is_sharded(path):
+        return unstash_shards(path, insert, frame, overwrite, verbose,
+                              max_bytes, lazy, store_dir, downcast,
+                              restore_dtypes)
+    loader = Loader(path, insert, frame, overwrite, verbose, max_bytes,
+                    lazy, store_dir, downcast, restore_dtypes, cache)
     return loader.load()
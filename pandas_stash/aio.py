@@ -0,0 +1,166 @@
+"""
+asyncio interface to stash and unstash
+
+Stashing and unstashing compress and read or write HDF5 files, which blocks
+for as long as the data takes to process.  The coroutines here run that
+work in a bounded pool of threads so that the event loop is never blocked.
+At most ``MAX_PENDING`` operations per event loop are submitted to the pool
+at once, and further calls wait for one of them to finish, so a burst of
+requests cannot queue an unbounded amount of work.  The HDF5 work of the
+operations is serialized by the lock described in ``concurrency``.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import threading
+import weakref
+
+from . import stash, unstash
+from .concurrency import hdf5_lock
+
+DEFAULT_WORKERS = 4
+MAX_PENDING = 16
+
+_EXECUTOR = None
+_EXECUTOR_LOCK = threading.Lock()
+# Semaphores bounding the operations submitted by each event loop
+_PENDING = weakref.WeakKeyDictionary()
+
+
+def get_executor():
+    """
+    Thread pool used by astash and aunstash when no executor is given
+
+    Returns
+    -------
+    executor : ThreadPoolExecutor
+    """
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(
+                DEFAULT_WORKERS, thread_name_prefix='pandas-stash')
+        return _EXECUTOR
+
+
+def _pending(loop):
+    semaphore = _PENDING.get(loop)
+    if semaphore is None:
+        semaphore = _PENDING[loop] = asyncio.Semaphore(MAX_PENDING)
+    return semaphore
+
+
+async def _run(function, executor):
+    loop = asyncio.get_running_loop()
+    async with _pending(loop):
+        return await loop.run_in_executor(executor or get_executor(),
+                                          function)
+
+
+async def astash(path=None, frame=None, executor=None, verbose=False,
+                 **kwargs):
+    """
+    Save variables without blocking the event loop
+
+    Parameters
+    ----------
+    path: str, optional
+        Full path of file to save.  If omitted uses ./workspace.h5
+    frame: dict-like
+        Dictionary-like structure holding the variables.  Required since the
+        namespace calling a coroutine is not known when it runs.
+    executor: Executor, optional
+        Executor running the stash.  Defaults to a shared pool of threads,
+        see ``get_executor``.
+    verbose: bool, optional
+        Flag indicating whether to display information about variables stored
+    kwargs: optional
+        Other arguments of ``stash``
+
+    Returns
+    -------
+    buffer : bytes or None
+        The stash if written to memory with ``to='memory'``, otherwise None
+    """
+    if frame is None:
+        raise TypeError('frame must be given to astash.')
+    return await _run(partial(stash, path, frame=frame, verbose=verbose,
+                              **kwargs), executor)
+
+
+async def aunstash(path=None, frame=None, overwrite=False, executor=None,
+                   verbose=False, **kwargs):
+    """
+    Load a stash without blocking the event loop
+
+    Parameters
+    ----------
+    path: str or bytes, optional
+        Full path of file to load, or the bytes of a stash written to
+        memory.  If omitted uses ./workspace.h5
+    frame: dict-like, optional
+        Dictionary-like structure to insert the variables into.  Variables
+        are only returned in the vault if omitted.
+    overwrite: bool, optional
+        Flag indicating whether to overwrite existing values in the frame
+    executor: Executor, optional
+        Executor running the unstash.  Defaults to a shared pool of threads,
+        see ``get_executor``.
+    verbose: bool, optional
+        Flag indicating whether to display information about variables loaded
+    kwargs: optional
+        Other arguments of ``unstash``
+
+    Returns
+    -------
+    vault : Vault
+        dict-like object that supports tab completion for keys in IPython
+    """
+    insert = frame is not None
+    frame = {} if frame is None else frame
+    return await _run(partial(unstash, path, insert=insert, frame=frame,
+                              overwrite=overwrite, verbose=verbose,
+                              **kwargs), executor)
+
+
+def _variable_names(loader):
+    import tables
+    from .manifest import read_manifest
+
+    with hdf5_lock(), tables.open_file(loader._path, mode='r') as h5f:
+        manifest = read_manifest(h5f)
+    if manifest is None:
+        raise ValueError('{0} has no manifest, so its variables cannot be '
+                         'read individually.'.format(loader._path))
+    return sorted(manifest['variables'])
+
+
+async def aunstash_iter(path=None, executor=None, **kwargs):
+    """
+    Asynchronously iterate over the variables of a stash as each is read
+
+    Parameters
+    ----------
+    path: str, optional
+        Full path of file to load.  If omitted uses ./workspace.h5
+    executor: Executor, optional
+        Executor reading the variables.  Defaults to a shared pool of
+        threads, see ``get_executor``.
+    kwargs: optional
+        Other arguments of ``Loader``, such as store_dir, downcast,
+        restore_dtypes and cache
+
+    Yields
+    ------
+    name : str
+        Name of the variable
+    value
+        Value of the variable
+    """
+    from .io import Loader
+
+    loader = Loader(path, insert=False, frame={}, verbose=False, **kwargs)
+    names = await _run(partial(_variable_names, loader), executor)
+    for name in names:
+        value = await _run(partial(loader.read, name), executor)
+        yield name, value
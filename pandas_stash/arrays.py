@@ -0,0 +1,325 @@
+"""
+Storage of numpy arrays as typed HDF5 datasets and lazy access to them
+"""
+from ast import literal_eval
+import operator
+
+import numpy as np
+import tables
+
+from .concurrency import hdf5_lock
+from .sync import check_signature
+
+# Target uncompressed size of a chunk when the layout is 'row' or 'column'
+CHUNK_BYTES = 2 ** 18
+CHUNK_LAYOUTS = ('auto', 'row', 'column')
+
+
+def is_supported_dtype(dtype):
+    """
+    Dtypes that can be stored as HDF5 datasets without conversion
+    """
+    if dtype.hasobject or dtype.itemsize == 0:
+        return False
+    return dtype.kind in 'biufcmMSUV'
+
+
+def dtype_label(dtype):
+    return 'record' if dtype.fields is not None else str(dtype)
+
+
+def _has_trailing_axis(dtype):
+    # Strings and records are stored with an extra axis holding their bytes
+    return dtype.kind in 'UV'
+
+
+def _to_dtype(descr):
+    return np.lib.format.descr_to_dtype(literal_eval(descr))
+
+
+def encode_array(arr):
+    """
+    View of arr with a dtype HDF5 can store and a description of its dtype
+
+    Datetimes and timedeltas are viewed as int64, unicode strings as uint32
+    code points and structured arrays as bytes.  Strings and structured
+    arrays gain a trailing axis with one element per code point or byte.
+    Only arrays in non-native byte order are copied.
+    """
+    dtype = arr.dtype
+    descr = repr(np.lib.format.dtype_to_descr(dtype))
+    if dtype.kind == 'V':
+        arr = np.ascontiguousarray(arr)
+        storage = arr.view(np.uint8).reshape(arr.shape + (dtype.itemsize,))
+        return storage, descr
+    if not dtype.isnative:
+        arr = arr.astype(dtype.newbyteorder('='))
+    if dtype.kind in 'mM':
+        return arr.view(np.int64), descr
+    if dtype.kind == 'U':
+        arr = np.ascontiguousarray(arr)
+        nchar = dtype.itemsize // 4
+        return arr.view(np.uint32).reshape(arr.shape + (nchar,)), descr
+    return arr, descr
+
+
+def decode_array(storage, descr):
+    """
+    Inverse of encode_array, which only creates a view of storage
+    """
+    dtype = _to_dtype(descr)
+    if _has_trailing_axis(dtype):
+        native = dtype if dtype.kind == 'V' else dtype.newbyteorder('=')
+        storage = np.ascontiguousarray(storage)
+        arr = storage.view(native).reshape(storage.shape[:-1])
+    elif dtype.kind in 'mM':
+        arr = storage.view(dtype.newbyteorder('='))
+    else:
+        arr = storage
+    if arr.dtype != dtype:
+        arr = arr.astype(dtype)
+    return arr
+
+
+def chunkshape(shape, dtype, layout):
+    """
+    Chunk shape of the stored dataset for an array with a given layout
+
+    Parameters
+    ----------
+    shape : tuple
+        Shape of the array
+    dtype : dtype
+        Dtype of the array
+    layout : {'auto', 'row', 'column'}, tuple or None
+        'row' lays out whole rows contiguously, which suits slices of
+        leading-axis ranges.  'column' lays out long runs of the leading
+        axis for a single position in the remaining axes, which suits
+        reading columns.  A tuple is used as the chunk shape.  'auto' or
+        None lets PyTables choose.
+
+    Returns
+    -------
+    chunkshape : tuple or None
+    """
+    if layout is None or layout == 'auto':
+        return None
+    itemsize = dtype.itemsize
+    if isinstance(layout, tuple):
+        if len(layout) != len(shape):
+            raise ValueError('chunkshape must have one element per '
+                             'dimension of the array.')
+        chunks = tuple(int(c) for c in layout)
+    elif layout == 'row':
+        row_bytes = itemsize * int(np.prod(shape[1:], dtype=np.int64))
+        rows = max(1, CHUNK_BYTES // max(row_bytes, 1))
+        chunks = (rows,) + tuple(shape[1:])
+    elif layout == 'column':
+        rows = max(1, CHUNK_BYTES // itemsize)
+        chunks = (rows,) + (1,) * (len(shape) - 1)
+    else:
+        raise ValueError('chunkshape must be one of {0} or a '
+                         'tuple.'.format(', '.join(CHUNK_LAYOUTS)))
+    chunks = tuple(max(1, min(c, s)) for c, s in zip(chunks, shape))
+    if _has_trailing_axis(dtype):
+        nbytes = 1 if dtype.kind == 'V' else 4
+        chunks += (itemsize // nbytes,)
+    return chunks
+
+
+def write_array(handle, where, name, arr, filters, layout=None):
+    """
+    Write arr as a typed dataset in an open PyTables file, creating the
+    groups in where if needed
+    """
+    storage, descr = encode_array(arr)
+    if storage.size == 0:
+        node = handle.create_array(where, name, obj=storage,
+                                   createparents=True)
+    else:
+        chunks = chunkshape(arr.shape, arr.dtype, layout)
+        node = handle.create_carray(where, name, obj=storage,
+                                    filters=filters, chunkshape=chunks,
+                                    createparents=True)
+    node.attrs.stash_dtype = descr
+    return node
+
+
+def create_extendable_array(handle, where, name, template, filters,
+                            expectedrows=None):
+    """
+    Create a dataset in an open PyTables file that arrays with the dtype and
+    trailing shape of template can be appended to with append_array
+    """
+    storage, descr = encode_array(template)
+    atom = tables.Atom.from_dtype(storage.dtype)
+    kwargs = {} if expectedrows is None else {'expectedrows': expectedrows}
+    node = handle.create_earray(where, name, atom=atom,
+                                shape=(0,) + storage.shape[1:],
+                                filters=filters, createparents=True,
+                                **kwargs)
+    node.attrs.stash_dtype = descr
+    return node
+
+
+def append_array(node, arr):
+    """
+    Append the rows of arr to a dataset created by create_extendable_array
+    """
+    storage, _ = encode_array(arr)
+    if storage.shape[0]:
+        node.append(storage)
+
+
+def read_array(node):
+    return decode_array(node.read(), node.attrs.stash_dtype)
+
+
+def _split_index(key, shape):
+    """
+    Split a basic index into a read using positive steps and an index that
+    is applied to the array read
+    """
+    if not isinstance(key, tuple):
+        key = (key,)
+    if sum(k is Ellipsis for k in key) > 1:
+        raise IndexError('an index can only have a single ellipsis (...)')
+    n_axes = sum(k is not None and k is not Ellipsis for k in key)
+    if n_axes > len(shape):
+        raise IndexError('too many indices for array')
+    read = []
+    local = []
+    for k in key:
+        if k is Ellipsis:
+            for _ in range(len(shape) - n_axes):
+                read.append(slice(None))
+                local.append(slice(None))
+        elif k is None:
+            local.append(None)
+        elif isinstance(k, slice):
+            length = shape[len(read)]
+            start, stop, step = k.indices(length)
+            count = len(range(start, stop, step))
+            if count == 0:
+                read.append(slice(0, 0))
+                local.append(slice(None))
+            elif step > 0:
+                read.append(slice(start, start + (count - 1) * step + 1,
+                                  step))
+                local.append(slice(None))
+            else:
+                last = start + (count - 1) * step
+                read.append(slice(last, start + 1, -step))
+                local.append(slice(None, None, -1))
+        else:
+            try:
+                index = operator.index(k)
+            except TypeError:
+                raise IndexError('only integers, slices (`:`), ellipsis '
+                                 '(`...`) and numpy.newaxis (`None`) are '
+                                 'supported when indexing an ArrayProxy')
+            length = shape[len(read)]
+            if not -length <= index < length:
+                raise IndexError('index {0} is out of bounds for axis {1} '
+                                 'with size {2}'.format(index, len(read),
+                                                        length))
+            read.append(index % length)
+    read.extend([slice(None)] * (len(shape) - len(read)))
+    return tuple(read), tuple(local)
+
+
+class ArrayProxy(object):
+    """
+    Array held in a stash that is read on demand
+
+    Indexing with integers, slices, ellipsis and ``None`` reads only the
+    HDF5 chunks that the selection covers.  ``np.asarray(proxy)`` or
+    ``proxy.read()`` reads the complete array.
+
+    Parameters
+    ----------
+    path: str
+        Path of the stash
+    name: str
+        Name of the node holding the array
+    shape: tuple
+        Shape of the array
+    dtype: dtype
+        Dtype of the array
+    signature: tuple, optional
+        Signature of the stash when it was loaded.  Reads raise if the stash
+        has since been replaced.
+    """
+
+    def __init__(self, path, name, shape, dtype, signature=None):
+        self._path = path
+        self._name = name
+        self._shape = tuple(shape)
+        self._dtype = np.dtype(dtype)
+        self._signature = signature
+
+    @classmethod
+    def _from_node(cls, path, node, signature=None):
+        dtype = _to_dtype(node.attrs.stash_dtype)
+        shape = node.shape
+        if _has_trailing_axis(dtype):
+            shape = shape[:-1]
+        return cls(path, node._v_pathname, shape, dtype, signature)
+
+    @property
+    def shape(self):
+        return self._shape
+
+    @property
+    def dtype(self):
+        return self._dtype
+
+    @property
+    def ndim(self):
+        return len(self._shape)
+
+    @property
+    def size(self):
+        return int(np.prod(self._shape, dtype=np.int64))
+
+    @property
+    def nbytes(self):
+        return self.size * self._dtype.itemsize
+
+    def __len__(self):
+        if not self._shape:
+            raise TypeError('len() of unsized object')
+        return self._shape[0]
+
+    def _read(self, key=None):
+        check_signature(self._path, self._signature)
+        with hdf5_lock(), tables.open_file(self._path, mode='r') as h5f:
+            node = h5f.get_node(self._name)
+            if key is None:
+                storage = node.read()
+            else:
+                if _has_trailing_axis(self._dtype):
+                    key += (slice(None),)
+                storage = np.asarray(node[key])
+            return decode_array(storage, node.attrs.stash_dtype)
+
+    def read(self):
+        """
+        Read the complete array
+        """
+        return self._read()
+
+    def __getitem__(self, key):
+        read, local = _split_index(key, self._shape)
+        arr = self._read(read)
+        if any(k is None or k.step is not None for k in local):
+            arr = arr[local]
+        return arr[()] if arr.ndim == 0 else arr
+
+    def __array__(self, dtype=None, copy=None):
+        arr = self._read()
+        return arr if dtype is None else arr.astype(dtype, copy=False)
+
+    def __repr__(self):
+        return '<ArrayProxy {0} shape={1} dtype={2}>'.format(
+            self._name.lstrip('/'), self._shape, self._dtype)
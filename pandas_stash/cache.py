@@ -0,0 +1,232 @@
+"""
+Process-wide cache of the objects read from stashes
+
+Repeatedly unstashing the same file decompresses every node each time.  A
+read cache keeps the decoded pandas objects and numpy arrays, keyed by the
+path of the file and the node they were read from, and returns them again
+while the file is unchanged.  The cached values are shared, so their arrays,
+including those underlying extension arrays, are made read-only and callers
+receive shallow copies, which can be given new columns or values but cannot
+modify the cached data in place.  Objects holding extension arrays whose
+data cannot be made read-only are copied on each hit.
+Alternatively, each hit can return a deep copy.  Entries of a file are
+dropped once it is replaced or modified, and the least-recently used
+entries are evicted once the cache holds more than its byte budget.
+"""
+from collections import OrderedDict
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+from pandas.api.extensions import ExtensionArray
+from pandas.core.arrays.masked import BaseMaskedArray
+
+from .sync import stat_signature
+from .vault import _nbytes
+
+DEFAULT_CACHE_BYTES = 2 ** 30
+
+# Cache used by unstash(..., cache=True), created on first use
+_READ_CACHE = None
+_READ_CACHE_LOCK = threading.Lock()
+
+
+def _arrays(value):
+    # numpy and extension arrays held by a value
+    if isinstance(value, (np.ndarray, ExtensionArray)):
+        return [value]
+    return getattr(getattr(value, '_mgr', None), 'arrays', [])
+
+
+def _ndarrays(array):
+    """
+    numpy arrays holding the data of a numpy or extension array, or None if
+    they are not known
+    """
+    if isinstance(array, np.ndarray):
+        return [array]
+    if isinstance(array, BaseMaskedArray):
+        return [array._data, array._mask]
+    # Categorical, datetimes, timedeltas, periods and strings
+    ndarray = getattr(array, '_ndarray', None)
+    if isinstance(ndarray, np.ndarray):
+        return [ndarray]
+    return None
+
+
+def _freeze(value):
+    """
+    Make the arrays held by a numpy array or pandas object read-only
+    """
+    for array in _arrays(value):
+        for ndarray in _ndarrays(array) or []:
+            ndarray.flags.writeable = False
+
+
+def _frozen(value):
+    """
+    Check whether all of the data held by a value is read-only
+    """
+    for array in _arrays(value):
+        ndarrays = _ndarrays(array)
+        if ndarrays is None or any(ndarray.flags.writeable
+                                   for ndarray in ndarrays):
+            return False
+    return True
+
+
+class ReadCache(object):
+    """
+    LRU cache of the pandas objects and numpy arrays read from stashes
+
+    Parameters
+    ----------
+    max_bytes: int, optional
+        Upper bound on the bytes held.  The least-recently used values are
+        evicted once it is exceeded, and values larger than the budget are
+        not cached.
+    copy: bool, optional
+        Flag indicating whether each hit returns a deep copy of the cached
+        value.  By default values are returned as read-only views that
+        share the cached data.
+
+    Notes
+    -----
+    ``hits``, ``misses``, ``evictions`` and ``invalidations`` count the
+    lookups served from the cache, the lookups that read the file, the
+    values evicted to respect the budget and the values dropped because
+    their file changed.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES, copy=False):
+        self.max_bytes = max_bytes
+        self.copy = copy
+        self._entries = OrderedDict()
+        self._signatures = {}
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def nbytes(self):
+        """
+        Bytes held by the cached values
+        """
+        return self._nbytes
+
+    def stats(self):
+        """
+        Counters describing the use of the cache
+
+        Returns
+        -------
+        stats : dict
+            hits, misses, evictions, invalidations, entries and nbytes
+        """
+        return {'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'entries': len(self._entries), 'nbytes': self._nbytes}
+
+    def get(self, path, node, read):
+        """
+        Value of a node of a file, read by calling read unless cached
+
+        Parameters
+        ----------
+        path: str
+            Path of the file
+        node: str
+            Node holding the value
+        read: callable
+            Function returning the value, called on a miss
+
+        Returns
+        -------
+        value
+            The cached value, shared read-only or copied
+        """
+        path = os.path.abspath(path)
+        # Taken before reading, so a file replaced while it is read is
+        # detected by the next lookup
+        signature = stat_signature(path)
+        key = (path, node)
+        with self._lock:
+            if self._signatures.get(path, signature) != signature:
+                self._invalidate(path)
+            if key in self._entries:
+                self._entries[key] = self._entries.pop(key)
+                self.hits += 1
+                return self._share(self._entries[key][0])
+            self.misses += 1
+        value = read()
+        _freeze(value)
+        nbytes = _nbytes(value)
+        with self._lock:
+            if (nbytes <= self.max_bytes and
+                    self._signatures.get(path, signature) == signature):
+                self._remove(key)
+                self._signatures[path] = signature
+                self._entries[key] = (value, nbytes)
+                self._nbytes += nbytes
+                self._evict()
+        return self._share(value)
+
+    def _share(self, value):
+        if self.copy:
+            return value.copy()
+        if isinstance(value, np.ndarray):
+            return value.view()
+        if isinstance(value, (pd.Series, pd.DataFrame)) and _frozen(value):
+            return value.copy(deep=False)
+        # Indexes are immutable, and extension arrays and objects holding
+        # writable data are copied
+        return value if isinstance(value, pd.Index) else value.copy()
+
+    def _remove(self, key):
+        if key in self._entries:
+            _, nbytes = self._entries.pop(key)
+            self._nbytes -= nbytes
+
+    def _invalidate(self, path):
+        for key in [key for key in self._entries if key[0] == path]:
+            self._remove(key)
+            self.invalidations += 1
+        del self._signatures[path]
+
+    def _evict(self):
+        while self._nbytes > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def clear(self):
+        """
+        Remove all cached values.  The counters are kept.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._signatures.clear()
+            self._nbytes = 0
+
+
+def get_read_cache():
+    """
+    Cache shared by every ``unstash(..., cache=True)`` in the process
+
+    Returns
+    -------
+    cache : ReadCache
+        The process cache, whose ``max_bytes`` and ``copy`` can be changed
+    """
+    global _READ_CACHE
+    with _READ_CACHE_LOCK:
+        if _READ_CACHE is None:
+            _READ_CACHE = ReadCache()
+        return _READ_CACHE
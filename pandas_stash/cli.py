@@ -0,0 +1,494 @@
+"""
+Command-line tool to inspect, verify, repack and convert stashes
+
+Usage::
+
+    python -m pandas_stash ls workspace.h5
+    python -m pandas_stash verify workspace.h5
+    python -m pandas_stash repack workspace.h5 --complib zlib --complevel 9
+    python -m pandas_stash convert workspace.h5 workspace.pkl
+"""
+from __future__ import print_function
+
+import argparse
+import multiprocessing
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+
+import pandas as pd
+import tables
+
+from . import stash, unstash
+from .arrays import CHUNK_LAYOUTS
+from .concurrency import hdf5_lock
+from .diff import _container_digest, _describe, _load, _stream_digest
+from .manifest import (MANIFEST_NODE, iter_objects, new_manifest,
+                       read_manifest, write_manifest)
+from .pickling import PICKLE_PROTOCOL
+from .store import ObjectStore
+
+# Outcomes of verify that indicate a damaged stash
+FAILURES = ('mismatch', 'missing', 'error')
+ENGINE_EXTENSIONS = {'hdf5': ('.h5', '.hdf5', '.hdf'),
+                     'pickle': ('.pkl', '.pickle')}
+
+
+def _format_bytes(nbytes):
+    if nbytes is None:
+        return '-'
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if nbytes < 1024 or unit == 'GB':
+            break
+        nbytes /= 1024.0
+    return ('{0:.0f} {1}' if unit == 'B' else '{0:.1f} {1}').format(nbytes,
+                                                                    unit)
+
+
+def _storage(store, entry):
+    """
+    Short description of where and how a variable is stored
+    """
+    if entry.get('blob') is not None:
+        return 'blob ' + entry['blob'][:12]
+    if entry['kind'] == 'container':
+        count = len(list(iter_objects(entry)))
+        return '{0} node{1}'.format(count, '' if count == 1 else 's')
+    if entry['kind'] == 'builtin':
+        return 'fixed'
+    node = store._handle.get_node(entry['node'])
+    leaf = node
+    if not isinstance(node, tables.Leaf):
+        leaf = next(iter(node._f_walknodes('Leaf')), None)
+    parts = [entry.get('format', 'pickle' if entry['kind'] == 'pickle'
+                       else 'array')]
+    if leaf is not None and leaf.filters.complevel:
+        parts.append('{0}:{1}'.format(leaf.filters.complib,
+                                      leaf.filters.complevel))
+    if isinstance(node, tables.CArray):
+        parts.append('chunks=' + 'x'.join(str(c) for c in node.chunkshape))
+    return ' '.join(parts)
+
+
+def list_stash(path):
+    """
+    Describe the variables in a stash
+
+    Returns
+    -------
+    rows : list of dict
+        One row per variable with the name, kind, type, shape, size in bytes
+        and storage of the variable.  The size does not count the strings
+        and other objects held by object columns of pandas objects.
+    """
+    rows = []
+    with hdf5_lock(), pd.HDFStore(path, mode='r') as store:
+        variables, _ = _describe(store)
+        for name in sorted(variables):
+            entry = variables[name]
+            shape = entry.get('shape')
+            nbytes = entry.get('nbytes')
+            if entry['kind'] == 'container':
+                nbytes = sum(item.get('nbytes', 0)
+                             for item in iter_objects(entry))
+            rows.append({'name': name, 'kind': entry['kind'],
+                         'type': entry.get('type', entry.get('dtype')),
+                         'shape': None if shape is None else tuple(shape),
+                         'nbytes': nbytes,
+                         'storage': _storage(store, entry)})
+    return rows
+
+
+def _verify_object(store, name, entry, store_dir):
+    if entry.get('blob') is not None:
+        blob_path = ObjectStore(store_dir).blob_path(entry['blob'])
+        if not os.path.exists(blob_path):
+            return 'missing', 'blob {0} not found'.format(entry['blob'])
+        with pd.HDFStore(blob_path, mode='r') as blob_store:
+            return _verify_object(blob_store, name, dict(entry, blob=None),
+                                  None)
+    digest = _stream_digest(store, name, entry)
+    if digest is None:
+        # Read the variable to check that it can be decoded
+        _load(store, name, entry, store_dir)
+        return 'unverified', 'not hashable'
+    if 'hash' not in entry:
+        return 'unverified', 'no checksum'
+    if digest['hash'] != entry['hash']:
+        return 'mismatch', 'content hash differs from manifest'
+    return 'ok', ''
+
+
+def _verify_entry(store, name, entry, store_dir):
+    if entry['kind'] != 'container':
+        return _verify_object(store, name, entry, store_dir)
+    results = [_verify_object(store, name, item, store_dir)
+               for item in iter_objects(entry)]
+    for status in FAILURES + ('unverified',):
+        messages = [message for result, message in results
+                    if result == status]
+        if messages:
+            return status, messages[0]
+    if 'hash' in entry:
+        digest = _container_digest(store, name, dict(entry))
+        if digest is None or digest['hash'] != entry['hash']:
+            return 'mismatch', 'container hash differs from manifest'
+    return 'ok', ''
+
+
+def verify_stash(path, store_dir=None):
+    """
+    Check that every variable in a stash can be read and matches its hash
+
+    Parameters
+    ----------
+    path: str
+        Path of the stash
+    store_dir: str, optional
+        Directory of the object store, if different from the one recorded
+        when the stash was written
+
+    Returns
+    -------
+    results : list of tuple
+        (name, status, message) for each variable, where status is one of
+        'ok', 'unverified', 'mismatch', 'missing' or 'error'.  A name of
+        None indicates that the file itself could not be read.
+    """
+    with hdf5_lock():
+        return _verify_stash(path, store_dir)
+
+
+def _verify_stash(path, store_dir):
+    try:
+        store = pd.HDFStore(path, mode='r')
+    except Exception as exc:
+        return [(None, 'error', str(exc))]
+    results = []
+    with store:
+        try:
+            variables, manifest_store_dir = _describe(store)
+        except Exception as exc:
+            return [(None, 'error', str(exc))]
+        if store_dir is None:
+            store_dir = manifest_store_dir
+        for name in sorted(variables):
+            try:
+                status, message = _verify_entry(store, name, variables[name],
+                                                store_dir)
+            except Exception as exc:
+                status, message = 'error', str(exc)
+            results.append((name, status, message))
+    return results
+
+
+def _copy_part(path, name, entry, store_dir, part, options):
+    """
+    Copy a variable to a separate file without decoding it
+
+    Pickled objects are copied since the classes needed to unpickle them
+    may not be importable, and the variables held in an object store are
+    only referenced.
+    """
+    manifest = new_manifest()
+    manifest['variables'][name] = entry
+    if store_dir is not None:
+        manifest['store_dir'] = store_dir
+    filters = None
+    if 'complib' in options or 'complevel' in options:
+        filters = tables.Filters(complib=options.get('complib', 'blosc'),
+                                 complevel=options.get('complevel', 1))
+    with hdf5_lock(), tables.open_file(part, mode='w') as dst:
+        if entry.get('blob') is None:
+            with tables.open_file(path, mode='r') as src:
+                src.copy_node(entry['node'], newparent=dst.root,
+                              recursive=True, filters=filters)
+        write_manifest(dst, manifest)
+    return part
+
+
+def _repack_part(task):
+    """
+    Stash some of the variables of a stash to a separate file
+    """
+    path, names, variables, store_dir, part, options = task
+    if len(names) == 1:
+        entry = variables[names[0]]
+        if entry.get('blob') is not None or entry['kind'] == 'pickle':
+            return _copy_part(path, names[0], entry, store_dir, part,
+                              options)
+    frame = {}
+    with hdf5_lock(), pd.HDFStore(path, mode='r') as store:
+        for name in names:
+            frame[name] = _load(store, name, variables[name], store_dir)
+    uses_store = any(item.get('blob') is not None
+                     for name in names
+                     for item in iter_objects(variables[name]))
+    # Hashes are kept if the stash recorded them
+    checksums = any('hash' in variables[name] for name in names)
+    stash(part, frame=frame, include=names, private=True, verbose=False,
+          fallback='pickle', store_dir=store_dir if uses_store else None,
+          checksums=checksums, **options)
+    return part
+
+
+def repack_stash(path, output=None, complib=None, complevel=None,
+                 chunkshape=None, workers=None):
+    """
+    Rewrite a stash, reclaiming free space and changing its storage
+
+    Each variable is read and written to a temporary file by a pool of
+    worker processes, and the temporary files are then combined.  Legacy
+    stashes are upgraded to the current format.
+
+    Parameters
+    ----------
+    path: str
+        Path of the stash
+    output: str, optional
+        Path of the repacked stash.  Defaults to replacing path.
+    complib: str, optional
+        Compression library, e.g. 'blosc', 'zlib' or 'lzo'
+    complevel: int, optional
+        Compression level, 0-9
+    chunkshape: {'auto', 'row', 'column'}, optional
+        Chunk layout of numpy arrays
+    workers: int, optional
+        Number of worker processes.  Defaults to the number of CPUs.
+    """
+    output = path if output is None else output
+    with hdf5_lock(), pd.HDFStore(path, mode='r') as store:
+        variables, store_dir = _describe(store)
+    options = {}
+    for key, value in (('complib', complib), ('complevel', complevel),
+                       ('chunkshape', chunkshape)):
+        if value is not None:
+            options[key] = value
+    scalars = sorted(name for name in variables
+                     if variables[name]['kind'] == 'builtin')
+    groups = [[name] for name in sorted(variables) if name not in scalars]
+    if scalars:
+        groups.append(scalars)
+    directory = os.path.dirname(os.path.abspath(output))
+    temp_dir = tempfile.mkdtemp(dir=directory)
+    try:
+        tasks = [(path, names, variables, store_dir,
+                  os.path.join(temp_dir, 'part{0}.h5'.format(i)), options)
+                 for i, names in enumerate(groups)]
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        workers = max(1, min(workers, len(tasks)))
+        if workers == 1:
+            parts = [_repack_part(task) for task in tasks]
+        else:
+            pool = multiprocessing.Pool(workers)
+            try:
+                parts = pool.map(_repack_part, tasks)
+            finally:
+                pool.close()
+                pool.join()
+        temp = os.path.join(temp_dir, 'repacked.h5')
+        _combine(parts, temp, variables)
+        os.replace(temp, output)
+        if store_dir is not None:
+            ObjectStore(store_dir).add_ref(output)
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def _combine(parts, path, variables):
+    """
+    Combine stashes holding distinct variables into one, keeping the
+    original dtypes recorded for the variables in the repacked stash
+    """
+    manifest = new_manifest()
+    with hdf5_lock(), tables.open_file(path, mode='w') as dst:
+        for part in parts:
+            with tables.open_file(part, mode='r') as src:
+                part_manifest = read_manifest(src)
+                manifest['variables'].update(part_manifest['variables'])
+                if 'store_dir' in part_manifest:
+                    manifest['store_dir'] = part_manifest['store_dir']
+                for node in src.list_nodes('/'):
+                    if node._v_name != MANIFEST_NODE:
+                        src.copy_node(node, newparent=dst.root,
+                                      recursive=True)
+        # Variables are stashed again as read, with their downcast dtypes
+        for name, entry in manifest['variables'].items():
+            original = variables[name].get('original_dtypes')
+            if original:
+                entry['original_dtypes'] = original
+        write_manifest(dst, manifest)
+
+
+def _read_hdf5(path):
+    return dict(unstash(path, insert=False, frame={}, verbose=False))
+
+
+def _write_hdf5(path, variables):
+    stash(path, frame=variables, private=True, verbose=False,
+          fallback='pickle')
+
+
+def _read_pickle(path):
+    with open(path, 'rb') as pickle_file:
+        try:
+            variables = pickle.load(pickle_file)
+        except (pickle.UnpicklingError, EOFError, ImportError,
+                AttributeError) as exc:
+            # e.g. a class that cannot be imported here
+            raise ValueError('{0} could not be unpickled: '
+                             '{1}'.format(path, exc))
+    if not isinstance(variables, dict):
+        raise ValueError('{0} does not hold a dict of '
+                         'variables.'.format(path))
+    return variables
+
+
+def _write_pickle(path, variables):
+    with open(path, 'wb') as pickle_file:
+        pickle.dump(variables, pickle_file, protocol=PICKLE_PROTOCOL)
+
+
+ENGINES = {'hdf5': (_read_hdf5, _write_hdf5),
+           'pickle': (_read_pickle, _write_pickle)}
+
+
+def _engine(path, engine):
+    if engine is not None:
+        if engine not in ENGINES:
+            raise ValueError('engine must be one of '
+                             '{0}.'.format(', '.join(sorted(ENGINES))))
+        return engine
+    extension = os.path.splitext(path)[1].lower()
+    for name, extensions in ENGINE_EXTENSIONS.items():
+        if extension in extensions:
+            return name
+    if os.path.isfile(path) and tables.is_hdf5_file(path):
+        return 'hdf5'
+    raise ValueError('Unable to infer the engine of {0}; set it '
+                     'explicitly.'.format(path))
+
+
+def convert_stash(source, destination, source_engine=None,
+                  destination_engine=None):
+    """
+    Convert a stash between storage engines
+
+    Parameters
+    ----------
+    source: str
+        Path of the stash to read
+    destination: str
+        Path of the stash to write
+    source_engine, destination_engine: {'hdf5', 'pickle'}, optional
+        Engines of the stashes.  Inferred from the file extensions if not
+        given.
+    """
+    read = ENGINES[_engine(source, source_engine)][0]
+    write = ENGINES[_engine(destination, destination_engine)][1]
+    write(destination, read(source))
+
+
+def _ls(args):
+    for path in args.paths:
+        rows = list_stash(path)
+        total = sum(row['nbytes'] or 0 for row in rows)
+        print('{0}: {1} variables, {2} in memory, {3} on disk'.format(
+            path, len(rows), _format_bytes(total),
+            _format_bytes(os.path.getsize(path))))
+        table = [('name', 'kind', 'type', 'shape', 'size', 'storage')]
+        for row in rows:
+            shape = row['shape']
+            shape = '-' if shape is None else 'x'.join(str(s) for s in shape)
+            table.append((row['name'], row['kind'], str(row['type']), shape,
+                          _format_bytes(row['nbytes']), row['storage']))
+        widths = [max(len(line[i]) for line in table) for i in range(6)]
+        for line in table:
+            print('  ' + '  '.join(value.ljust(width) for value, width
+                                   in zip(line, widths)).rstrip())
+    return 0
+
+
+def _verify(args):
+    failed = False
+    for path in args.paths:
+        results = verify_stash(path, args.store_dir)
+        print(path)
+        for name, status, message in results:
+            failed = failed or status in FAILURES
+            line = '  {0}: {1}'.format(name or path, status)
+            print(line + (' ({0})'.format(message) if message else ''))
+    return 1 if failed else 0
+
+
+def _repack(args):
+    before = os.path.getsize(args.path)
+    repack_stash(args.path, args.output, args.complib, args.complevel,
+                 args.chunkshape, args.workers)
+    after = os.path.getsize(args.output or args.path)
+    print('{0}: {1} -> {2}'.format(args.output or args.path,
+                                   _format_bytes(before),
+                                   _format_bytes(after)))
+    return 0
+
+
+def _convert(args):
+    convert_stash(args.source, args.destination, args.source_engine,
+                  args.destination_engine)
+    return 0
+
+
+def _parser():
+    parser = argparse.ArgumentParser(
+        prog='pandas-stash',
+        description='Inspect, verify, repack and convert stash files')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    ls = commands.add_parser('ls', help='list the variables in stashes')
+    ls.add_argument('paths', nargs='+')
+    ls.set_defaults(func=_ls)
+
+    verify = commands.add_parser('verify',
+                                 help='check that stashes are readable and '
+                                      'match their checksums')
+    verify.add_argument('paths', nargs='+')
+    verify.add_argument('--store-dir', help='directory of the object store')
+    verify.set_defaults(func=_verify)
+
+    repack = commands.add_parser('repack',
+                                 help='rewrite a stash to reclaim space or '
+                                      'change compression and chunking')
+    repack.add_argument('path')
+    repack.add_argument('-o', '--output',
+                        help='path of the repacked stash (default: replace)')
+    repack.add_argument('--complib', help='compression library')
+    repack.add_argument('--complevel', type=int, help='compression level')
+    repack.add_argument('--chunkshape', choices=CHUNK_LAYOUTS,
+                        help='chunk layout of numpy arrays')
+    repack.add_argument('-j', '--workers', type=int,
+                        help='number of worker processes')
+    repack.set_defaults(func=_repack)
+
+    convert = commands.add_parser('convert',
+                                  help='convert a stash between engines')
+    convert.add_argument('source')
+    convert.add_argument('destination')
+    convert.add_argument('--from', dest='source_engine',
+                         choices=sorted(ENGINES))
+    convert.add_argument('--to', dest='destination_engine',
+                         choices=sorted(ENGINES))
+    convert.set_defaults(func=_convert)
+    return parser
+
+
+def main(argv=None):
+    args = _parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except (IOError, OSError, ValueError, KeyError) as exc:
+        print('pandas-stash: error: {0}'.format(exc), file=sys.stderr)
+        return 2
@@ -0,0 +1,426 @@
+"""
+Native storage of pandas indexes, categoricals and extension arrays
+
+Table format stores extension dtypes through object columns, or cannot
+store them at all, and standalone indexes and arrays are not pandas tables.
+These objects, and Series and DataFrames with an extension dtype in a
+column or in their index, are instead encoded as a description, stored as
+UTF-8 encoded JSON, and the numpy arrays underlying them, each stored as a
+compressed dataset in a group:
+
+* numpy columns of a DataFrame with the same dtype are stored together as
+  one 2-d array;
+* categoricals are stored as their codes, with their categories stored
+  once;
+* masked arrays (Int64, Float64, boolean, ...) are stored as their values
+  and a bit-packed mask;
+* strings, in object or string arrays, are stored as their concatenated
+  UTF-8 bytes and end offsets, with a bit-packed mask of missing values;
+* tz-aware datetimes are stored as UTC datetime64 values and their dtype;
+* the levels and codes of a MultiIndex are stored separately, and a
+  RangeIndex by its bounds.
+
+Other values, such as object arrays of mixed types, other extension arrays
+or labels that are not JSON scalars, can only be stored pickled into uint8
+arrays.  They are only pickled when allowed, so that pickling remains opt-in,
+and PickleRequiredError is raised otherwise.
+"""
+import json
+import pickle
+
+import numpy as np
+import pandas as pd
+from pandas.api.extensions import ExtensionArray
+from pandas.api.types import infer_dtype, pandas_dtype
+import tables
+
+from .arrays import is_supported_dtype, read_array, write_array
+from .pickling import PICKLE_PROTOCOL
+
+CODEC_TYPES = (pd.Index, ExtensionArray)
+CODEC_ATTR = 'stash_codec'
+SPEC_NODE = 'spec'
+MASKED_TYPES = (pd.arrays.IntegerArray, pd.arrays.FloatingArray,
+                pd.arrays.BooleanArray)
+# Labels stored in the description rather than pickled
+JSON_TYPES = (str, int, float, bool, type(None))
+MISSING_VALUES = {'none': None, 'nan': np.nan, 'na': pd.NA, 'nat': pd.NaT}
+
+
+class PickleRequiredError(TypeError):
+    """
+    Raised when encoding a value that can only be stored pickled and
+    pickling is not allowed
+    """
+
+
+def uses_codec(obj):
+    """
+    Whether obj is stored by the codec rather than in table format
+    """
+    if isinstance(obj, CODEC_TYPES):
+        return True
+    if not isinstance(obj, (pd.Series, pd.DataFrame)):
+        return False
+    dtypes = [obj.dtype] if isinstance(obj, pd.Series) else list(obj.dtypes)
+    index = obj.index
+    levels = index.levels if isinstance(index, pd.MultiIndex) else [index]
+    dtypes += [level.dtype for level in levels]
+    return any(not isinstance(dtype, np.dtype) for dtype in dtypes)
+
+
+def _add(arrays, arr):
+    arrays.append(arr)
+    return len(arrays) - 1
+
+
+def _pickled(value, arrays, allow_pickle):
+    if not allow_pickle:
+        raise PickleRequiredError(type(value).__name__)
+    payload = pickle.dumps(value, protocol=PICKLE_PROTOCOL)
+    return {'kind': 'pickle',
+            'data': _add(arrays, np.frombuffer(payload, dtype=np.uint8))}
+
+
+def _values(obj):
+    # numpy values of numpy dtypes, and the extension array otherwise
+    if isinstance(obj.dtype, np.dtype):
+        return obj.to_numpy()
+    return obj.array
+
+
+def _encode_label(label, arrays, allow_pickle):
+    if type(label) in JSON_TYPES:
+        return {'value': label}
+    return _pickled(label, arrays, allow_pickle)
+
+
+def _decode_label(spec, arrays):
+    if 'value' in spec:
+        return spec['value']
+    return _decode_values(spec, arrays)
+
+
+def _missing_kind(missing):
+    """
+    Name of the missing value used in an object array, or None if more than
+    one is used
+    """
+    kinds = set()
+    for value in missing:
+        if value is None:
+            kinds.add('none')
+        elif value is pd.NA:
+            kinds.add('na')
+        elif value is pd.NaT:
+            kinds.add('nat')
+        elif isinstance(value, float):
+            kinds.add('nan')
+        else:
+            return None
+    if len(kinds) > 1:
+        return None
+    return kinds.pop() if kinds else 'none'
+
+
+def _encode_strings(values, mask, arrays):
+    """
+    UTF-8 bytes of the strings of an object array, their end offsets and
+    the bit-packed mask of missing values
+    """
+    present = values if mask is None else values[~mask]
+    encoded = [value.encode('utf-8', 'surrogatepass') for value in present]
+    lengths = np.fromiter(map(len, encoded), dtype=np.int64,
+                          count=len(encoded))
+    spec = {'data': _add(arrays, np.frombuffer(b''.join(encoded),
+                                               dtype=np.uint8)),
+            'offsets': _add(arrays, np.cumsum(lengths)),
+            'length': len(values)}
+    if mask is not None:
+        spec['mask'] = _add(arrays, np.packbits(mask))
+    return spec
+
+
+def _decode_strings(spec, arrays, missing):
+    data = arrays[spec['data']].tobytes()
+    strings = np.empty(arrays[spec['offsets']].shape[0], dtype=object)
+    start = 0
+    for i, end in enumerate(arrays[spec['offsets']].tolist()):
+        strings[i] = data[start:end].decode('utf-8', 'surrogatepass')
+        start = end
+    if 'mask' not in spec:
+        return strings
+    mask = np.unpackbits(arrays[spec['mask']],
+                         count=spec['length']).astype(bool)
+    values = np.empty(spec['length'], dtype=object)
+    values[mask] = missing
+    values[~mask] = strings
+    return values
+
+
+def _encode_object(values, arrays):
+    """
+    Encoding of an object array of strings, or None if it holds other
+    values
+    """
+    if values.ndim != 1:
+        return None
+    if infer_dtype(values, skipna=True) not in ('string', 'empty'):
+        return None
+    mask = pd.isna(values)
+    if not mask.any():
+        mask = None
+    missing = 'none' if mask is None else _missing_kind(values[mask])
+    if missing is None:
+        return None
+    spec = _encode_strings(values, mask, arrays)
+    spec.update(kind='strings', missing=missing)
+    return spec
+
+
+def _same_dtype(dtype):
+    # Whether dtype is restored by its name
+    try:
+        return pandas_dtype(str(dtype)) == dtype
+    except (TypeError, ValueError):
+        return False
+
+
+def _encode_values(values, arrays, allow_pickle):
+    """
+    Encoding of a numpy or extension array
+    """
+    dtype = values.dtype
+    if isinstance(values, np.ndarray):
+        if is_supported_dtype(dtype):
+            return {'kind': 'array', 'data': _add(arrays, values)}
+        if dtype.kind == 'O':
+            spec = _encode_object(values, arrays)
+            if spec is not None:
+                return spec
+    elif isinstance(values, pd.Categorical):
+        return {'kind': 'categorical', 'codes': _add(arrays, values.codes),
+                'categories': _encode_index(values.categories, arrays,
+                                            allow_pickle),
+                'ordered': bool(values.ordered)}
+    elif isinstance(values, MASKED_TYPES) and _same_dtype(dtype):
+        numpy_dtype = dtype.numpy_dtype
+        data = values.to_numpy(dtype=numpy_dtype,
+                               na_value=numpy_dtype.type(0))
+        return {'kind': 'masked', 'dtype': str(dtype),
+                'data': _add(arrays, data),
+                'mask': _add(arrays, np.packbits(values.isna())),
+                'length': len(values)}
+    elif isinstance(dtype, pd.StringDtype):
+        mask = np.asarray(values.isna())
+        spec = _encode_strings(np.asarray(values, dtype=object), mask,
+                               arrays)
+        spec.update(kind='string', storage=dtype.storage)
+        return spec
+    elif isinstance(dtype, pd.DatetimeTZDtype) and _same_dtype(dtype):
+        utc = values.tz_convert('UTC').tz_localize(None).to_numpy()
+        return {'kind': 'datetimetz', 'dtype': str(dtype),
+                'data': _add(arrays, utc)}
+    return _pickled(values, arrays, allow_pickle)
+
+
+def _decode_values(spec, arrays):
+    kind = spec['kind']
+    if kind == 'array':
+        return arrays[spec['data']]
+    if kind == 'strings':
+        return _decode_strings(spec, arrays, MISSING_VALUES[spec['missing']])
+    if kind == 'categorical':
+        dtype = pd.CategoricalDtype(_decode_index(spec['categories'], arrays),
+                                    ordered=spec['ordered'])
+        return pd.Categorical.from_codes(arrays[spec['codes']], dtype=dtype)
+    if kind == 'masked':
+        mask = np.unpackbits(arrays[spec['mask']],
+                             count=spec['length']).astype(bool)
+        array_type = pandas_dtype(spec['dtype']).construct_array_type()
+        return array_type(arrays[spec['data']], mask)
+    if kind == 'string':
+        values = _decode_strings(spec, arrays, None)
+        return pd.array(values, dtype=pd.StringDtype(spec['storage']))
+    if kind == 'datetimetz':
+        return pd.arrays.DatetimeArray(arrays[spec['data']],
+                                       dtype=pandas_dtype(spec['dtype']))
+    return pickle.loads(arrays[spec['data']].tobytes())
+
+
+def _encode_index(index, arrays, allow_pickle):
+    if isinstance(index, pd.MultiIndex):
+        return {'kind': 'multi',
+                'levels': [_encode_index(level, arrays, allow_pickle)
+                           for level in index.levels],
+                'codes': [_add(arrays, codes) for codes in index.codes],
+                'names': [_encode_label(name, arrays, allow_pickle)
+                          for name in index.names]}
+    name = _encode_label(index.name, arrays, allow_pickle)
+    if isinstance(index, pd.RangeIndex):
+        return {'kind': 'range', 'start': index.start, 'stop': index.stop,
+                'step': index.step, 'name': name}
+    values = _encode_values(_values(index), arrays, allow_pickle)
+    spec = {'kind': 'index', 'values': values, 'name': name}
+    if getattr(index, 'freq', None) is not None:
+        spec['freq'] = index.freqstr
+    return spec
+
+
+def _decode_index(spec, arrays):
+    if spec['kind'] == 'multi':
+        return pd.MultiIndex(
+            levels=[_decode_index(level, arrays) for level in spec['levels']],
+            codes=[arrays[codes] for codes in spec['codes']],
+            names=[_decode_label(name, arrays) for name in spec['names']],
+            verify_integrity=False)
+    name = _decode_label(spec['name'], arrays)
+    if spec['kind'] == 'range':
+        return pd.RangeIndex(spec['start'], spec['stop'], spec['step'],
+                             name=name)
+    values = _decode_values(spec['values'], arrays)
+    index = pd.Index(values, dtype=values.dtype, name=name, copy=False,
+                     tupleize_cols=False)
+    if 'freq' in spec:
+        index = type(index)(index, freq=spec['freq'])
+    return index
+
+
+def _encode_frame(frame, arrays, allow_pickle):
+    columns = [frame.iloc[:, i] for i in range(frame.shape[1])]
+    blocks = {}
+    data = []
+    for i, column in enumerate(columns):
+        values = _values(column)
+        if (isinstance(values, np.ndarray) and
+                is_supported_dtype(values.dtype)):
+            blocks.setdefault(values.dtype, []).append(i)
+        else:
+            data.append({'positions': [i],
+                         'values': _encode_values(values, arrays,
+                                                  allow_pickle)})
+    for positions in blocks.values():
+        # One row per column, so that each column is a contiguous view
+        block = np.vstack([columns[i].to_numpy()[None, :]
+                           for i in positions])
+        data.append({'positions': positions, 'block': True,
+                     'values': {'kind': 'array',
+                                'data': _add(arrays, block)}})
+    return {'index': _encode_index(frame.index, arrays, allow_pickle),
+            'columns': _encode_index(frame.columns, arrays, allow_pickle),
+            'data': data}
+
+
+def _decode_frame(spec, arrays):
+    columns = {}
+    for item in spec['data']:
+        values = _decode_values(item['values'], arrays)
+        if item.get('block'):
+            for j, position in enumerate(item['positions']):
+                columns[position] = values[j]
+        else:
+            columns[item['positions'][0]] = values
+    # Built from a dict without copying, so each column is its own block
+    frame = pd.DataFrame(dict(sorted(columns.items())),
+                         index=_decode_index(spec['index'], arrays),
+                         copy=False)
+    frame.columns = _decode_index(spec['columns'], arrays)
+    return frame
+
+
+def encode(obj, allow_pickle=False):
+    """
+    Encode a pandas object, index or extension array
+
+    Parameters
+    ----------
+    obj : {Series, DataFrame, Index, ExtensionArray}
+        Object to encode
+    allow_pickle : bool, optional
+        Flag indicating whether values that can only be stored pickled are
+        pickled.  If False, PickleRequiredError is raised for these values.
+
+    Returns
+    -------
+    spec : dict
+        JSON-serializable description of obj
+    arrays : list of ndarray
+        Arrays referenced by position in spec
+    """
+    arrays = []
+    if isinstance(obj, pd.DataFrame):
+        spec = _encode_frame(obj, arrays, allow_pickle)
+        spec['layout'] = 'frame'
+    elif isinstance(obj, pd.Series):
+        spec = {'layout': 'series',
+                'values': _encode_values(_values(obj), arrays,
+                                         allow_pickle),
+                'index': _encode_index(obj.index, arrays, allow_pickle),
+                'name': _encode_label(obj.name, arrays, allow_pickle)}
+    elif isinstance(obj, pd.Index):
+        spec = {'layout': 'index',
+                'index': _encode_index(obj, arrays, allow_pickle)}
+    else:
+        spec = {'layout': 'array',
+                'values': _encode_values(obj, arrays, allow_pickle)}
+    spec['type'] = type(obj).__name__
+    spec['arrays'] = len(arrays)
+    return spec, arrays
+
+
+def decode(spec, arrays):
+    """
+    Inverse of encode
+    """
+    layout = spec['layout']
+    if layout == 'frame':
+        return _decode_frame(spec, arrays)
+    if layout == 'series':
+        return pd.Series(_decode_values(spec['values'], arrays),
+                         index=_decode_index(spec['index'], arrays),
+                         name=_decode_label(spec['name'], arrays),
+                         copy=False)
+    if layout == 'index':
+        return _decode_index(spec['index'], arrays)
+    return _decode_values(spec['values'], arrays)
+
+
+def write_encoded(handle, where, name, spec, arrays, filters):
+    """
+    Write an encoded object to a group in an open PyTables file
+    """
+    group = handle.create_group(where, name, createparents=True)
+    encoded = json.dumps(spec, sort_keys=True).encode('utf-8')
+    handle.create_array(group, SPEC_NODE,
+                        obj=np.frombuffer(encoded, dtype=np.uint8))
+    for i, arr in enumerate(arrays):
+        write_array(handle, group._v_pathname, 'v' + str(i), arr, filters)
+    group._v_attrs.stash_codec = spec['type']
+    return group
+
+
+def is_codec_node(node):
+    return isinstance(node, tables.Group) and CODEC_ATTR in node._v_attrs
+
+
+def codec_type(node):
+    """
+    Name of the type of the object stored in a group written by
+    write_encoded
+    """
+    return node._v_attrs.stash_codec
+
+
+def read_encoded(group):
+    """
+    Description and arrays of an object stored in a group
+    """
+    encoded = group._f_get_child(SPEC_NODE).read()
+    spec = json.loads(encoded.tobytes().decode('utf-8'))
+    arrays = [read_array(group._f_get_child('v' + str(i)))
+              for i in range(spec['arrays'])]
+    return spec, arrays
+
+
+def read_encoded_object(group):
+    return decode(*read_encoded(group))
@@ -0,0 +1,103 @@
+"""
+Use of stashes from many threads
+
+HDF5, as built for PyTables, is not thread-safe, and neither PyTables nor
+pandas holds a lock of their own around it.  PyTables also releases the GIL
+during some HDF5 calls, so two threads using HDF5 at the same time can
+corrupt its state.  Every function using a stash therefore holds
+``hdf5_lock()``, a reentrant lock shared by the process, around its calls
+into PyTables and pandas' HDF5 support, but not while it does other work:
+
+* ``stash`` holds it while the store is opened and closed and while each
+  variable is written, so selecting, downcasting, hashing, encoding and
+  pickling variables run without it;
+* ``unstash`` and ``Loader.read`` hold it while the stash is opened and
+  closed and while each variable, or block of rows of a table, is read, so
+  decoding, unpickling, downcasting and inserting variables run without
+  it, and the variables read on first access from a lazy vault and
+  ``ArrayProxy`` reads hold it in the same way;
+* ``stash_stream`` and ``unstash_stream`` hold it for each chunk, so
+  producers and consumers of chunks run without it;
+* ``stash_diff``, ``verify_stash``, ``wait_for_stash`` and ``stash_gc``
+  hold it while they read.
+
+Stashing and unstashing from many threads is therefore safe, with the HDF5
+work of different threads serialized.  ``Saver`` and ``Loader`` instances
+hold the state of a single call and must not be shared between threads.
+As between processes, ``stash`` calls writing the same file replace each
+other, and ``stash_stream`` calls adding to the same file at the same time
+must be serialized by the caller since the lock is released between chunks.
+Code using PyTables or ``pandas.HDFStore`` directly while stashes are used
+from other threads should hold the lock as well.
+
+The lock is taken before the process forks, so worker processes start with
+HDF5 in a consistent state and a lock of their own.
+
+Node names such as ``pandas:df`` are not Python identifiers, so PyTables
+warns about them with ``NaturalNameWarning``.  A warning filter ignoring
+these warnings for the names of stash nodes only is installed once, when
+the package is imported, and is never removed.  It is only installed again
+if it is no longer among the filters when the lock is next taken, e.g.
+because the package was imported inside ``warnings.catch_warnings``.
+Filters added later that show all warnings, such as
+``warnings.simplefilter('always')``, take precedence and so show them.
+"""
+import os
+import threading
+import warnings
+
+from tables.exceptions import NaturalNameWarning
+
+# Prefixes of the nodes of a stash
+NODE_PREFIXES = ('pandas', 'numpy', 'array', 'builtin', 'container',
+                 'pickle', 'stash', 'stream')
+NODE_NAME_WARNING = (r"object name is not a valid Python identifier: "
+                     r"'({0}):".format('|'.join(NODE_PREFIXES)))
+
+
+def _ignore_node_names():
+    """
+    Install the filter ignoring warnings about stash node names, unless it
+    is already installed
+    """
+    if _NODE_NAME_FILTER not in warnings.filters:
+        warnings.filterwarnings('ignore', message=NODE_NAME_WARNING,
+                                category=NaturalNameWarning)
+
+
+warnings.filterwarnings('ignore', message=NODE_NAME_WARNING,
+                        category=NaturalNameWarning)
+_NODE_NAME_FILTER = warnings.filters[0]
+_LOCK = threading.RLock()
+
+
+def hdf5_lock():
+    """
+    Reentrant lock serializing the use of HDF5 by the threads of a process
+
+    Returns
+    -------
+    lock : context manager
+        Use as ``with hdf5_lock(): ...``
+    """
+    _ignore_node_names()
+    return _LOCK
+
+
+def _before_fork():
+    _LOCK.acquire()
+
+
+def _after_fork_in_parent():
+    _LOCK.release()
+
+
+def _after_fork_in_child():
+    global _LOCK
+    _LOCK = threading.RLock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(before=_before_fork,
+                        after_in_parent=_after_fork_in_parent,
+                        after_in_child=_after_fork_in_child)
@@ -0,0 +1,323 @@
+"""
+Differences between two stashes computed from their manifests
+
+Variables are compared using the content hashes recorded when they were
+stashed.  Hashes missing from a manifest, for example in stashes written
+with ``checksums=False`` or by older versions, are computed by streaming the
+variable from the file in blocks of rows.
+"""
+import numpy as np
+import pandas as pd
+
+from .arrays import ArrayProxy, decode_array, dtype_label, read_array
+from .codec import decode, is_codec_node, read_encoded
+from .concurrency import hdf5_lock
+from .hashing import (BLOCK_ROWS, array_block_rows, hash_array,
+                      hash_array_blocks, hash_container, hash_encoded,
+                      hash_pandas, hash_pandas_blocks, hash_pickle,
+                      hash_scalar)
+from .io import (CONTAINER_TYPES, PANDAS_TYPE_NAMES, PANDAS_TYPES,
+                 SCALAR_CONVERTERS, Loader, _decode_numpy, _read_pandas)
+from .manifest import read_manifest
+from .pickling import read_pickle_parts
+from .store import ObjectStore
+
+
+class StashDiff(object):
+    """
+    Differences between two stashes
+
+    Attributes
+    ----------
+    added : list of str
+        Variables only in the second stash
+    removed : list of str
+        Variables only in the first stash
+    changed : dict
+        Maps each variable that differs to a dictionary describing the
+        change.  ``reason`` is one of 'kind', 'type', 'dtype', 'shape' or
+        'content'.  In deep mode, ``columns`` lists the names of DataFrame
+        columns that were changed, added or removed and ``rows`` lists the
+        ``[start, stop)`` ranges of rows that differ.
+    unchanged : list of str
+        Variables that are identical in both stashes
+    """
+
+    def __init__(self, added, removed, changed, unchanged):
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+        self.unchanged = unchanged
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+    __nonzero__ = __bool__
+
+    def __repr__(self):
+        changed = ['{0} ({1})'.format(key, self.changed[key]['reason'])
+                   for key in sorted(self.changed)]
+        lines = ['StashDiff', '-' * 20,
+                 'Added: ' + (', '.join(self.added) or 'None'),
+                 'Removed: ' + (', '.join(self.removed) or 'None'),
+                 'Changed: ' + (', '.join(changed) or 'None'),
+                 'Unchanged: {0} variables'.format(len(self.unchanged))]
+        return '\n'.join(lines)
+
+
+def _describe(store):
+    """
+    Manifest entries of the variables in a stash, built by scanning the file
+    if it does not have a manifest
+    """
+    manifest = read_manifest(store._handle)
+    if manifest is not None:
+        return manifest['variables'], manifest.get('store_dir')
+    variables = {}
+    for key in store.keys():
+        parts = key.lstrip('/').split(':')
+        if parts[0] == 'pandas':
+            pandas_type = store.get_storer(key).pandas_type
+            variables[parts[-1]] = {
+                'kind': 'pandas', 'node': key,
+                'type': PANDAS_TYPE_NAMES.get(pandas_type, pandas_type)}
+        elif parts[0] == 'numpy':
+            variables[parts[-1]] = {'kind': 'numpy', 'node': key,
+                                    'dtype': parts[-2]}
+        elif parts[0] == 'builtin':
+            for name in store.get(key).index:
+                variables[name] = {'kind': 'builtin', 'node': key,
+                                   'type': parts[-1]}
+    for node in store._handle.list_nodes('/', classname='Leaf'):
+        if node._v_name.startswith('array:'):
+            proxy = ArrayProxy._from_node(None, node)
+            variables[node._v_name.split(':', 1)[-1]] = {
+                'kind': 'numpy', 'node': node._v_pathname,
+                'dtype': dtype_label(proxy.dtype),
+                'shape': list(proxy.shape)}
+    return variables, None
+
+
+def _stream_digest(store, name, entry):
+    """
+    Hash a variable by reading it from the file in blocks of rows
+    """
+    node = entry['node']
+    if entry['kind'] == 'builtin':
+        value = store.get(node)[name]
+        return hash_scalar(SCALAR_CONVERTERS[entry['type']](value))
+    if node.startswith('/numpy:'):
+        return hash_array(_decode_numpy(node, store.get(node)))
+    if entry['kind'] == 'pickle':
+        return hash_pickle(*read_pickle_parts(store._handle.get_node(node)))
+    if entry['kind'] == 'numpy':
+        h5_node = store._handle.get_node(node)
+        proxy = ArrayProxy._from_node(None, h5_node)
+        shape, dtype = proxy.shape, proxy.dtype
+        rows = array_block_rows(shape, dtype)
+        descr = h5_node.attrs.stash_dtype
+        blocks = (decode_array(h5_node[start:start + rows], descr)
+                  for start in range(0, shape[0], rows))
+        digest = hash_array_blocks(shape, dtype, blocks)
+        digest['shape'] = list(shape)
+        return digest
+    h5_node = store._handle.get_node(node)
+    if is_codec_node(h5_node):
+        # Read in full, as hashed when stashed
+        spec, arrays = read_encoded(h5_node)
+        obj = decode(spec, arrays)
+        if isinstance(obj, PANDAS_TYPES):
+            digest = hash_pandas(obj)
+        else:
+            digest = hash_encoded(spec, arrays)
+        if digest is not None:
+            digest['shape'] = list(obj.shape)
+        return digest
+    storer = store.get_storer(node)
+    if not storer.is_table:
+        obj = store.get(node)
+        digest = hash_pandas(obj)
+    else:
+        nrows = storer.nrows
+        template = store.select(node, start=0, stop=0)
+        blocks = (store.select(node, start=start, stop=start + BLOCK_ROWS)
+                  for start in range(0, nrows, BLOCK_ROWS))
+        digest = hash_pandas_blocks(template, nrows, blocks)
+        obj = template
+    if digest is not None:
+        digest['shape'] = [storer.nrows if storer.is_table else obj.shape[0]]
+        digest['shape'] += list(obj.shape[1:])
+    return digest
+
+
+def _container_digest(store, name, entry):
+    """
+    Hash a container, streaming the objects it holds that were stashed
+    without hashes
+    """
+    def digest_items(item):
+        if 'container' in item:
+            return dict(item, items=[digest_items(child)
+                                     for child in item['items']])
+        if 'node' not in item or 'hash' in item or item.get('blob'):
+            return item
+        return dict(item, **(_stream_digest(store, name, item) or {}))
+
+    digest = hash_container(digest_items(entry['structure']))
+    if digest is None:
+        return None
+    merged = dict(entry)
+    merged.update(digest)
+    return merged
+
+
+def _digest(store, name, entry, deep):
+    if entry['kind'] == 'container':
+        if 'hash' in entry:
+            return entry
+        return _container_digest(store, name, entry)
+    if 'hash' in entry and (not deep or 'blocks' in entry or
+                            entry['kind'] == 'builtin'):
+        return entry
+    if entry.get('blob') is not None:
+        return entry
+    digest = _stream_digest(store, name, entry)
+    if digest is None:
+        return None
+    merged = dict(entry)
+    merged.update(digest)
+    return merged
+
+
+def _metadata_change(entry_a, entry_b):
+    for reason in ('kind', 'type', 'dtype', 'shape'):
+        if reason not in entry_a or reason not in entry_b:
+            continue
+        if entry_a[reason] != entry_b[reason]:
+            return reason
+    return None
+
+
+def _changed_rows(digest_a, digest_b):
+    if digest_a.get('block_rows') != digest_b.get('block_rows'):
+        return None
+    block_rows = digest_a['block_rows']
+    blocks_a, blocks_b = digest_a['blocks'], digest_b['blocks']
+    nrows = max(digest_a['shape'][0], digest_b['shape'][0])
+    ranges = []
+    for i in range(max(len(blocks_a), len(blocks_b))):
+        if (i < len(blocks_a) and i < len(blocks_b) and
+                blocks_a[i] == blocks_b[i]):
+            continue
+        start, stop = i * block_rows, min((i + 1) * block_rows, nrows)
+        if ranges and ranges[-1][1] == start:
+            ranges[-1][1] = stop
+        else:
+            ranges.append([start, stop])
+    return ranges
+
+
+def _changed_columns(digest_a, digest_b):
+    if 'column_names' not in digest_a or 'column_names' not in digest_b:
+        return None
+    columns_a = dict(zip(digest_a['column_names'], digest_a['columns']))
+    columns_b = dict(zip(digest_b['column_names'], digest_b['columns']))
+    names = set(columns_a).union(columns_b)
+    return sorted(name for name in names
+                  if columns_a.get(name) != columns_b.get(name))
+
+
+def _load(store, name, entry, store_dir):
+    """
+    Read a variable described by a manifest entry from an open stash
+    """
+    if entry['kind'] in ('container', 'pickle'):
+        loader = Loader(store.filename, insert=False, frame={}, verbose=False,
+                        store_dir=store_dir)
+        return loader.read(name)
+    node = entry['node']
+    if entry.get('blob') is not None:
+        path = ObjectStore(store_dir).blob_path(entry['blob'])
+        with pd.HDFStore(path, mode='r') as blob_store:
+            return _load(blob_store, name, dict(entry, blob=None), None)
+    if entry['kind'] == 'builtin':
+        return SCALAR_CONVERTERS[entry['type']](store.get(node)[name])
+    if node.startswith('/numpy:'):
+        return _decode_numpy(node, store.get(node))
+    if entry['kind'] == 'numpy':
+        return read_array(store._handle.get_node(node))
+    return _read_pandas(store, node)
+
+
+def _equal(a, b):
+    if type(a) in CONTAINER_TYPES:
+        if type(a) is not type(b) or len(a) != len(b):
+            return False
+        if type(a) is dict:
+            return (list(a) == list(b) and
+                    all(_equal(a[key], b[key]) for key in a))
+        return all(_equal(x, y) for x, y in zip(a, b))
+    if isinstance(a, np.ndarray):
+        return np.array_equal(a, b)
+    if hasattr(a, 'equals'):
+        return a.equals(b)
+    return a == b
+
+
+def stash_diff(path_a, path_b, deep=False):
+    """
+    Compare the variables in two stashes without loading their data
+
+    Parameters
+    ----------
+    path_a: str
+        Path of the first, or older, stash
+    path_b: str
+        Path of the second, or newer, stash
+    deep: bool, optional
+        Flag indicating whether to locate the changes within each changed
+        variable, by column for DataFrames and by ranges of rows
+
+    Returns
+    -------
+    diff : StashDiff
+        Variables added, removed, changed and unchanged
+    """
+    with hdf5_lock(), pd.HDFStore(path_a, mode='r') as store_a:
+        with pd.HDFStore(path_b, mode='r') as store_b:
+            variables_a, store_dir_a = _describe(store_a)
+            variables_b, store_dir_b = _describe(store_b)
+            added = sorted(set(variables_b).difference(variables_a))
+            removed = sorted(set(variables_a).difference(variables_b))
+            changed = {}
+            unchanged = []
+            for name in sorted(set(variables_a).intersection(variables_b)):
+                entry_a, entry_b = variables_a[name], variables_b[name]
+                reason = _metadata_change(entry_a, entry_b)
+                if reason in ('kind', 'type', 'dtype'):
+                    changed[name] = {'reason': reason}
+                    continue
+                digest_a = _digest(store_a, name, entry_a, deep)
+                digest_b = _digest(store_b, name, entry_b, deep)
+                if digest_a is None or digest_b is None:
+                    # Contains values that cannot be hashed
+                    obj_a = _load(store_a, name, entry_a, store_dir_a)
+                    obj_b = _load(store_b, name, entry_b, store_dir_b)
+                    if _equal(obj_a, obj_b):
+                        unchanged.append(name)
+                    else:
+                        changed[name] = {'reason': reason or 'content'}
+                    continue
+                if reason is None and digest_a['hash'] == digest_b['hash']:
+                    unchanged.append(name)
+                    continue
+                details = {'reason': reason or 'content'}
+                if deep and 'blocks' in digest_a and 'blocks' in digest_b:
+                    columns = _changed_columns(digest_a, digest_b)
+                    if columns is not None:
+                        details['columns'] = columns
+                    rows = _changed_rows(digest_a, digest_b)
+                    if rows is not None:
+                        details['rows'] = rows
+                changed[name] = details
+    return StashDiff(added, removed, changed, unchanged)
@@ -0,0 +1,197 @@
+"""
+Narrowing the dtypes of pandas objects and numpy arrays
+
+The 'safe' policy only makes changes that lose no values: integers are
+narrowed to the smallest integer dtype of the same kind holding their range,
+float64 values that are exactly representable as float32 are narrowed,
+object columns holding only bools become bool and object columns of strings
+with many repeated values become categoricals.  Signed integers stay signed,
+even if none are negative, so that arithmetic on them cannot wrap around.
+Each check is a single vectorized pass over a column.  The original dtypes
+are returned so that they can be restored.
+"""
+import numpy as np
+import pandas as pd
+from pandas.api.types import infer_dtype
+
+DOWNCAST_POLICIES = (None, 'safe')
+# Object columns of strings become categoricals when the number of distinct
+# values is at most this fraction of the number of rows
+CATEGORY_RATIO = 0.5
+_SIGNED = (np.int8, np.int16, np.int32)
+_UNSIGNED = (np.uint8, np.uint16, np.uint32)
+
+
+def _narrow_integer(values):
+    low, high = values.min(), values.max()
+    candidates = _UNSIGNED if values.dtype.kind == 'u' else _SIGNED
+    for candidate in candidates:
+        info = np.iinfo(candidate)
+        if np.dtype(candidate).itemsize >= values.dtype.itemsize:
+            break
+        if info.min <= low and high <= info.max:
+            return np.dtype(candidate)
+    return None
+
+
+def _narrow_float(values):
+    if values.dtype != np.float64:
+        return None
+    with np.errstate(over='ignore', invalid='ignore'):
+        narrowed = values.astype(np.float32)
+        exact = np.array_equal(narrowed, values, equal_nan=True)
+    return np.dtype(np.float32) if exact else None
+
+
+def _narrow_object(values):
+    inferred = infer_dtype(values, skipna=False)
+    if inferred == 'boolean':
+        return np.dtype(bool)
+    if inferred == 'string':
+        distinct = len(pd.unique(values))
+        if distinct <= CATEGORY_RATIO * len(values):
+            return 'category'
+    return None
+
+
+def safe_dtype(values):
+    """
+    Narrowest dtype that holds every element of values exactly, or None if
+    values cannot be narrowed
+
+    Parameters
+    ----------
+    values : ndarray
+        Values of a column or array
+
+    Returns
+    -------
+    dtype : {dtype, 'category', None}
+    """
+    if values.size == 0:
+        return None
+    kind = values.dtype.kind
+    if kind in 'iu':
+        return _narrow_integer(values)
+    if kind == 'f':
+        return _narrow_float(values)
+    if kind == 'O' and values.ndim == 1:
+        return _narrow_object(values)
+    return None
+
+
+def _columns(obj):
+    if isinstance(obj, pd.DataFrame):
+        return [obj.iloc[:, i] for i in range(obj.shape[1])]
+    return [obj]
+
+
+def _column_policy(obj, policy, position):
+    if not isinstance(policy, dict):
+        return policy
+    if isinstance(obj, pd.DataFrame):
+        return policy.get(obj.columns[position])
+    return policy.get(obj.name)
+
+
+def _rebuild(obj, columns):
+    if isinstance(obj, pd.Series):
+        return columns[0]
+    # Built from a dict without copying unchanged columns
+    rebuilt = pd.DataFrame(dict(enumerate(columns)), index=obj.index,
+                           copy=False)
+    rebuilt.columns = obj.columns
+    return rebuilt
+
+
+def downcast(obj, policy):
+    """
+    Narrow the dtypes of a pandas object or numpy array
+
+    Parameters
+    ----------
+    obj : {Series, DataFrame, ndarray}
+        Object to downcast
+    policy : {'safe', dtype, dict}
+        'safe' only makes lossless changes.  A dtype is applied to every
+        column, and a dict maps the columns of a DataFrame, or the name of a
+        Series, to dtypes or 'safe'.  Explicit dtypes are applied even if
+        values are lost.
+
+    Returns
+    -------
+    downcast : {Series, DataFrame, ndarray}
+        The object with narrowed dtypes, obj itself if nothing changed
+    original : dict
+        Original dtype of each changed column, keyed by its position as a
+        string
+    """
+    if isinstance(obj, np.ndarray):
+        dtype = safe_dtype(obj) if policy == 'safe' else np.dtype(policy)
+        if dtype is None or dtype == 'category' or dtype == obj.dtype:
+            return obj, {}
+        return obj.astype(dtype), {'0': str(obj.dtype)}
+    columns = _columns(obj)
+    original = {}
+    for i, column in enumerate(columns):
+        column_policy = _column_policy(obj, policy, i)
+        if column_policy is None:
+            continue
+        if column_policy == 'safe':
+            if not isinstance(column.dtype, np.dtype):
+                continue  # Extension dtypes are left alone
+            dtype = safe_dtype(column.values)
+        else:
+            dtype = column_policy
+        if dtype is None or str(dtype) == str(column.dtype):
+            continue
+        original[str(i)] = str(column.dtype)
+        columns[i] = column.astype(dtype)
+    if not original:
+        return obj, original
+    return _rebuild(obj, columns), original
+
+
+def restore_dtypes(obj, original):
+    """
+    Restore the dtypes of an object downcast by downcast
+
+    Parameters
+    ----------
+    obj : {Series, DataFrame, ndarray}
+        Downcast object
+    original : dict
+        Original dtypes returned by downcast
+
+    Returns
+    -------
+    restored : {Series, DataFrame, ndarray}
+    """
+    if not original:
+        return obj
+    if isinstance(obj, np.ndarray):
+        return obj.astype(original['0'])
+    columns = _columns(obj)
+    for position, dtype in original.items():
+        i = int(position)
+        columns[i] = columns[i].astype(dtype)
+    return _rebuild(obj, columns)
+
+
+def check_policy(policy):
+    """
+    Raise if policy is not a valid downcast argument of stash or unstash
+    """
+    if not isinstance(policy, dict) and policy not in DOWNCAST_POLICIES:
+        raise ValueError('downcast must be None, \'safe\' or a dict mapping '
+                         'variable names to policies.')
+
+
+def variable_policy(policy, name):
+    """
+    Policy used for a variable given the downcast argument of stash or
+    unstash, which is a policy or a dict mapping variable names to policies
+    """
+    if isinstance(policy, dict):
+        return policy.get(name)
+    return policy
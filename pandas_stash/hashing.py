@@ -0,0 +1,344 @@
+"""
+Content hashes of stashed variables
+
+Hashes are computed in blocks of rows so that two versions of a variable
+can be compared block by block, and for DataFrames column by column.  The
+same hashes are produced whether a variable is hashed in memory or streamed
+from a file block by block.
+"""
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+
+from .codec import encode
+
+# Rows per block of pandas objects
+BLOCK_ROWS = 2 ** 16
+# Target bytes per block of numpy arrays
+BLOCK_BYTES = 2 ** 22
+# FNV-1a prime used to combine per-column row hashes
+_ROW_PRIME = np.uint64(0x100000001b3)
+
+
+def _hasher():
+    return hashlib.blake2b(digest_size=16)
+
+
+def _update(hasher, part):
+    if not isinstance(part, (bytes, np.ndarray)):
+        part = str(part).encode('utf-8')
+    hasher.update(part)
+
+
+def _digest(*parts):
+    hasher = _hasher()
+    for part in parts:
+        _update(hasher, part)
+    return hasher.hexdigest()
+
+
+def array_block_rows(shape, dtype):
+    """
+    Number of leading-axis rows hashed together in an array
+    """
+    row_bytes = dtype.itemsize * int(np.prod(shape[1:], dtype=np.int64))
+    return max(1, BLOCK_BYTES // max(row_bytes, 1))
+
+
+def _array_bytes(arr):
+    return np.ascontiguousarray(arr).reshape(-1).view(np.uint8)
+
+
+def hash_array_blocks(shape, dtype, blocks):
+    """
+    Content hash of an array supplied as consecutive blocks of rows
+
+    Parameters
+    ----------
+    shape : tuple
+        Shape of the complete array.  The number of rows may be None, in
+        which case the rows of the blocks are counted.
+    dtype : dtype
+        Dtype of the array
+    blocks : iterable of ndarray
+        Consecutive blocks of array_block_rows(shape, dtype) rows
+
+    Returns
+    -------
+    digest : dict
+        Dictionary with keys hash, the hash of the array, block_rows, the
+        number of rows in each block, and blocks, the hash of each block.
+    """
+    block_hashes = []
+    nrows = 0
+    for block in blocks:
+        block_hashes.append(_digest(_array_bytes(block)))
+        nrows += block.shape[0]
+    if shape[0] is None:
+        shape = (nrows,) + tuple(shape[1:])
+    header = repr((np.lib.format.dtype_to_descr(dtype), tuple(shape)))
+    return {'hash': _digest(header, *block_hashes),
+            'block_rows': array_block_rows(shape, dtype),
+            'blocks': block_hashes}
+
+
+def hash_array(arr):
+    """
+    Content hash of a numpy array
+
+    Parameters
+    ----------
+    arr : ndarray
+        Array to hash
+
+    Returns
+    -------
+    digest : dict
+        See hash_array_blocks
+    """
+    rows = array_block_rows(arr.shape, arr.dtype)
+    blocks = (arr[start:start + rows]
+              for start in range(0, arr.shape[0], rows))
+    return hash_array_blocks(arr.shape, arr.dtype, blocks)
+
+
+def _type_hashes(values):
+    """
+    Hashes of the type names of the values of an object index or column,
+    or None if they are strings, which pandas hashes without their types
+    """
+    if isinstance(values, pd.MultiIndex):
+        levels = [_type_hashes(values.get_level_values(i))
+                  for i in range(values.nlevels)]
+        if all(level is None for level in levels):
+            return None
+        hashes = np.zeros(len(values), dtype=np.uint64)
+        for level in levels:
+            hashes *= _ROW_PRIME
+            if level is not None:
+                hashes ^= level
+        return hashes
+    if values.dtype != object:
+        return None
+    if pd.api.types.infer_dtype(values, skipna=True) in ('string', 'empty'):
+        return None
+    names = np.array([type(value).__name__ for value in values],
+                     dtype=object)
+    # Missing values hash alike however they are represented
+    names[pd.isna(np.asarray(values, dtype=object))] = ''
+    return pd.util.hash_array(names)
+
+
+def _value_hashes(values, **kwargs):
+    # pandas hashes objects by their string form, so 1 and '1' or b'a' and
+    # 'a' have the same hash unless their types are added
+    hashes = pd.util.hash_pandas_object(values, **kwargs).values
+    types = _type_hashes(values)
+    if types is not None:
+        hashes = hashes * _ROW_PRIME ^ types
+    return hashes
+
+
+def _dtype_key(dtype):
+    """
+    Description of a dtype that includes the parameters str omits, such as
+    the categories and ordering of categoricals
+    """
+    if isinstance(dtype, pd.CategoricalDtype):
+        categories = dtype.categories
+        hashes = _value_hashes(categories, index=False)
+        return 'category[{0}, {1}, {2}, {3}]'.format(
+            dtype.ordered, categories.dtype, len(categories),
+            _digest(hashes))
+    return str(dtype)
+
+
+def _dtypes_key(obj):
+    # Class and dtype of the index and dtypes of each column of a Series or
+    # DataFrame
+    _, dtypes = _columns(obj)
+    return repr([type(obj.index).__name__, _dtype_key(obj.index.dtype)] +
+                list(map(_dtype_key, dtypes)))
+
+
+def _row_hashes(obj):
+    # Yields uint64 row hashes for the index and then each column
+    yield _value_hashes(obj.index, categorize=True)
+    if isinstance(obj, pd.Series):
+        yield _value_hashes(obj, index=False)
+        return
+    for i in range(obj.shape[1]):
+        yield _value_hashes(obj.iloc[:, i], index=False)
+
+
+def _combine_rows(dtypes_key, index_hash, column_hashes):
+    rows = index_hash.copy()
+    for column_hash in column_hashes:
+        rows *= _ROW_PRIME
+        rows ^= column_hash
+    # Rows only hash values, so categoricals with different categories
+    # would otherwise have the same hash
+    return _digest(dtypes_key, rows)
+
+
+def hash_pandas_rows(block):
+    """
+    Hash of a block of rows of a pandas object, as used for the blocks of
+    hash_pandas_blocks, or None if the rows cannot be hashed
+    """
+    try:
+        hashes = _row_hashes(block)
+        return _combine_rows(_dtypes_key(block), next(hashes),
+                             list(hashes))
+    except (TypeError, ValueError):
+        return None
+
+
+def _columns(obj):
+    if isinstance(obj, pd.Series):
+        return [obj.name], [obj.dtype]
+    return list(obj.columns), list(obj.dtypes)
+
+
+def hash_pandas_blocks(template, nrows, blocks):
+    """
+    Content hash of a pandas object supplied as consecutive blocks of rows
+
+    Parameters
+    ----------
+    template : {Series, DataFrame}
+        Object with the columns, dtypes and index type of the complete
+        object.  Usually a slice with no rows.
+    nrows : int or None
+        Number of rows in the complete object.  If None, the rows of the
+        blocks are counted.
+    blocks : iterable of {Series, DataFrame}
+        Consecutive blocks of BLOCK_ROWS rows
+
+    Returns
+    -------
+    digest : dict
+        Dictionary with keys hash, block_rows and blocks as returned by
+        hash_array, and columns and column_names, the hash and name of each
+        column.  None if the object contains values that cannot be hashed.
+    """
+    columns, dtypes = _columns(template)
+    dtypes_key = _dtypes_key(template)
+    index_hasher = _hasher()
+    _update(index_hasher, _dtype_key(template.index.dtype))
+    column_hashers = [_hasher() for _ in dtypes]
+    for hasher, dtype in zip(column_hashers, dtypes):
+        _update(hasher, _dtype_key(dtype))
+    block_hashes = []
+    counted = 0
+    for block in blocks:
+        counted += block.shape[0]
+        # Errors raised while producing blocks are not caught
+        try:
+            hashes = _row_hashes(block)
+            index_hash = next(hashes)
+            hashes = list(hashes)
+        except (TypeError, ValueError):
+            return None
+        index_hasher.update(index_hash)
+        for hasher, column_hash in zip(column_hashers, hashes):
+            hasher.update(column_hash)
+        block_hashes.append(_combine_rows(dtypes_key, index_hash, hashes))
+    column_hashes = [hasher.hexdigest() for hasher in column_hashers]
+    shape = (counted if nrows is None else nrows,) + template.shape[1:]
+    header = repr((type(template).__name__, shape, dtypes_key, columns,
+                   list(template.index.names)))
+    return {'hash': _digest(header, index_hasher.hexdigest(),
+                            *column_hashes),
+            'block_rows': BLOCK_ROWS,
+            'blocks': block_hashes,
+            'columns': column_hashes,
+            'column_names': [str(column) for column in columns]}
+
+
+def hash_pandas(obj):
+    """
+    Content hash of a Series or DataFrame
+
+    Parameters
+    ----------
+    obj : {Series, DataFrame}
+        Object to hash
+
+    Returns
+    -------
+    digest : dict
+        See hash_pandas_blocks
+    """
+    nrows = obj.shape[0]
+    blocks = (obj.iloc[start:start + BLOCK_ROWS]
+              for start in range(0, nrows, BLOCK_ROWS))
+    return hash_pandas_blocks(obj.iloc[:0], nrows, blocks)
+
+
+def hash_scalar(value):
+    """
+    Content hash of a built-in scalar
+    """
+    return {'hash': _digest(type(value).__name__, repr(value))}
+
+
+def hash_pickle(payload, buffers):
+    """
+    Content hash of a pickled object from its pickle and out-of-band buffers
+    """
+    return {'hash': _digest('pickle', len(buffers), payload, *buffers)}
+
+
+def hash_encoded(spec, arrays):
+    """
+    Content hash of an index or extension array from its description and
+    arrays as encoded by the codec
+    """
+    parts = [json.dumps(spec, sort_keys=True)]
+    for arr in arrays:
+        parts.extend([str(arr.dtype), arr.shape, _array_bytes(arr)])
+    return {'hash': _digest(*parts)}
+
+
+def hash_variable(obj):
+    """
+    Content hash of a pandas object, index, extension array or numpy array,
+    or None if unhashable
+    """
+    if isinstance(obj, np.ndarray):
+        return hash_array(obj)
+    if isinstance(obj, (pd.Series, pd.DataFrame)):
+        return hash_pandas(obj)
+    return hash_encoded(*encode(obj, allow_pickle=True))
+
+
+def hash_container(structure):
+    """
+    Content hash of a container from the description of its structure, or
+    None if any pandas object or array it holds is unhashable
+    """
+    hasher = _hasher()
+
+    def update(item):
+        if 'container' in item:
+            _update(hasher, item['container'])
+            _update(hasher, len(item['items']))
+            for key in item.get('keys', ()):
+                _update(hasher, repr(key))
+            for child in item['items']:
+                if not update(child):
+                    return False
+        elif 'value' in item:
+            _update(hasher, repr(item['value']))
+        elif item.get('hash') is None:
+            return False
+        else:
+            _update(hasher, item['hash'])
+        return True
+
+    if not update(structure):
+        return None
+    return {'hash': hasher.hexdigest()}
@@ -1,34 +1,57 @@
 from collections import defaultdict
+from contextlib import contextmanager
+from functools import partial
 from inspect import currentframe
+import os
+from types import ModuleType
 import warnings
-from fnmatch import filter
 
 import numpy as np
 import pandas as pd
 
-from tables.exceptions import NaturalNameWarning
+import tables
 
+from .arrays import (ArrayProxy, dtype_label, is_supported_dtype,
+                     read_array, write_array)
+from .cache import get_read_cache
+from .codec import (CODEC_TYPES, PickleRequiredError, codec_type, decode,
+                    encode, is_codec_node, read_encoded, uses_codec,
+                    write_encoded)
 from .compat import SCALAR_TYPES, long, u
-from .vault import Vault
+from .concurrency import hdf5_lock
+from .downcast import (check_policy, downcast, restore_dtypes,
+                       variable_policy)
+from .hashing import (hash_container, hash_encoded, hash_pandas,
+                      hash_pandas_rows, hash_pickle, hash_scalar,
+                      hash_variable)
+from .manifest import (MANIFEST_NODE, new_manifest, read_manifest,
+                       write_manifest)
+from .memory import TARGETS, is_buffer, open_memory_store
+from .pickling import dumps, loads, read_pickle_parts, write_pickle
+from .selection import Selector, namespace
+from .store import ObjectStore
+from .sync import check_signature, publish, stat_signature, temp_path
+from .vault import Vault, _nbytes
 
 DEFAULT_PATH = 'workspace.h5'
 PANDAS_TYPES = (pd.Series, pd.DataFrame)
-PANDAS_NUMPY_MAP = dict([(i + 1, pd_type)
-                         for i, pd_type in enumerate(PANDAS_TYPES)])
 SCALAR_TYPES_LIST = tuple(SCALAR_TYPES)
-NUMPY_DTYPES = {np.bool: 'bool',
-                np.int8: 'int8',
-                np.int16: 'int16',
-                np.int32: 'int32',
-                np.int64: 'int64',
-                np.uint8: 'uint8',
-                np.uint16: 'uint16',
-                np.uint32: 'uint32',
-                np.uint64: 'uint64',
-                np.float32: 'float32',
-                np.float64: 'float64',
-                np.str: 'str'}
-NUMPY_DTYPES_LIST = tuple(NUMPY_DTYPES)
+VARIABLE_KINDS = ('pandas', 'numpy', 'builtin', 'container', 'pickle')
+FALLBACKS = (None, 'pickle')
+CONTAINER_TYPES = (dict, list, tuple)
+# Scalars held in containers are stored in the manifest as JSON
+CONTAINER_SCALAR_TYPES = SCALAR_TYPES_LIST + (bool, long, type(None))
+KEY_TYPES = {'str': str, 'unicode': u, 'int': int, 'long': long,
+             'float': float, 'bool': bool, 'NoneType': lambda key: None}
+# Target bytes read at a time from pandas tables
+READ_BYTES = 2 ** 20
+BLOB_NODES = {'pandas': '/pandas:data', 'numpy': '/array:data',
+              'pickle': '/pickle:data'}
+SCALAR_CONVERTERS = {'str': str, 'float': float, 'int': int, 'unicode': u}
+PANDAS_TYPE_NAMES = {'frame': 'DataFrame',
+                     'frame_table': 'DataFrame',
+                     'series': 'Series',
+                     'series_table': 'Series'}
 
 
 class UnsupportedDimensionWarning(Warning):
@@ -49,22 +72,300 @@ unsupported_value_doc = """
 and so cannot be saved.
 """
 
+unpicklable_value_doc = """
+{0} could not be pickled ({1}), and so cannot be saved.
+"""
+
+pickle_required_doc = """
+{0} holds values that can only be saved pickled ({1}), and so is only saved
+with fallback='pickle'.
+"""
+
+
+def _locked(function, *args):
+    """
+    Call function holding the HDF5 lock
+    """
+    with hdf5_lock():
+        return function(*args)
+
+
+@contextmanager
+def _reading(path):
+    """
+    Open a stash for reading, holding the HDF5 lock while it is opened and
+    closed but not while it is open
+    """
+    with hdf5_lock():
+        store = pd.HDFStore(path, mode='r')
+    try:
+        yield store
+    finally:
+        with hdf5_lock():
+            store.close()
+
+
+def _read_array_from_file(path, name):
+    with hdf5_lock(), pd.HDFStore(path, mode='r') as store:
+        return read_array(store._handle.get_node('/', name))
+
+
+def _decode_numpy(key, item):
+    dtype = key.split(':')[-2]
+    # A view of the values when the dtype matches, as it does unless the
+    # stash was written by a version that converted the array
+    return np.asarray(getattr(item, 'values', item), dtype=dtype)
+
+
+def _is_numpy_dtype(dtype):
+    return isinstance(dtype, np.dtype)
+
+
+def _read_pandas(store, key):
+    """
+    Read a pandas object from an open store
+
+    Tables are read in blocks of rows that are copied into the final array
+    of each column, so neither a record array holding the whole table nor a
+    second copy made when combining columns of different dtypes is needed.
+    Tables with extension dtypes or a MultiIndex are read by pandas, and
+    objects stored by the codec are decoded.  The HDF5 lock is held while
+    each block is read, but not while blocks are copied or decoded.
+    """
+    with hdf5_lock():
+        node = store._handle.get_node(key)
+        encoded = read_encoded(node) if is_codec_node(node) else None
+    if encoded is not None:
+        return decode(*encoded)
+    with hdf5_lock():
+        storer = store.get_storer(key)
+        if not storer.is_table:
+            return store.get(key)
+        nrows = storer.nrows
+        rows = max(1, READ_BYTES // storer.table.rowsize)
+        if nrows <= rows:
+            return store.get(key)
+        first = store.select(key, start=0, stop=rows)
+    is_series = isinstance(first, pd.Series)
+    columns = [first] if is_series else [first.iloc[:, i]
+                                         for i in range(first.shape[1])]
+    index = first.index
+    dtypes = [column.dtype for column in columns] + [index.dtype]
+    if (isinstance(index, pd.MultiIndex) or
+            not all(_is_numpy_dtype(dtype) for dtype in dtypes)):
+        return _locked(store.get, key)
+    values = [np.empty(nrows, dtype=column.dtype) for column in columns]
+    index_values = np.empty(nrows, dtype=index.dtype)
+    for start in range(0, nrows, rows):
+        chunk = first
+        if start > 0:
+            with hdf5_lock():
+                chunk = store.select(key, start=start, stop=start + rows)
+        stop = start + len(chunk)
+        index_values[start:stop] = chunk.index.values
+        if is_series:
+            values[0][start:stop] = chunk.values
+        else:
+            for i, column in enumerate(values):
+                column[start:stop] = chunk.iloc[:, i].values
+        del chunk
+    new_index = pd.Index(index_values, name=index.name, copy=False)
+    if getattr(index, 'freq', None) is not None:
+        new_index = pd.DatetimeIndex(new_index, freq=index.freq)
+    if is_series:
+        return pd.Series(values[0], index=new_index, name=first.name,
+                         copy=False)
+    # Built from a dict without copying, so each column is its own block
+    obj = pd.DataFrame(dict(enumerate(values)), index=new_index, copy=False)
+    obj.columns = first.columns
+    return obj
 
-def _is_string_type(dtype):
+
+def _pandas_class(store, key):
+    """
+    Name of the class of a stored pandas object
+    """
+    node = store._handle.get_node(key)
+    if is_codec_node(node):
+        return codec_type(node)
+    pandas_type = store.get_storer(key).pandas_type
+    return PANDAS_TYPE_NAMES.get(pandas_type, pandas_type)
+
+
+def _read_entry(store, entry):
+    """
+    Read the pickled object, numpy array or pandas object described by a
+    manifest entry from an open store
+    """
+    if entry['kind'] == 'pandas':
+        return _read_pandas(store, entry['node'])
+    with hdf5_lock():
+        node = store._handle.get_node(entry['node'])
+        if entry['kind'] == 'numpy':
+            return read_array(node)
+        parts = read_pickle_parts(node)
+    # Unpickled without the lock, which the object may need
+    return loads(*parts)
+
+
+def _read_variable(path, key):
+    """
+    Read a single pandas or numpy variable from a stash
+    """
+    with _reading(path) as store:
+        if key.lstrip('/').startswith('numpy'):
+            return _decode_numpy(key, _locked(store.get, key))
+        return _read_pandas(store, key)
+
+
+def _is_supported_array(obj):
+    return is_supported_dtype(obj.dtype) and obj.ndim in (1, 2, 3, 4)
+
+
+# Kind of variable each type is saved as, filled in as types are seen
+_TYPE_KINDS = {}
+
+
+def _variable_kind(cls):
+    """
+    Kind of variable values of type cls are saved as, or None if not saved
+
+    numpy arrays and containers are only saved as such if their dtype,
+    dimension and contents are supported, which is checked for each value.
+    """
     try:
-        return dtype.type in (np.str, np.str_)
-    except AttributeError:
+        return _TYPE_KINDS[cls]
+    except KeyError:
+        pass
+    if issubclass(cls, PANDAS_TYPES + CODEC_TYPES):
+        kind = 'pandas'
+    elif issubclass(cls, SCALAR_TYPES_LIST):
+        kind = 'builtin'
+    elif issubclass(cls, np.ndarray):
+        kind = 'numpy'
+    elif cls in CONTAINER_TYPES:
+        kind = 'container'
+    elif issubclass(cls, ModuleType):
+        kind = None
+    else:
+        kind = 'pickle'
+    _TYPE_KINDS[cls] = kind
+    return kind
+
+
+def _is_storable_container(obj, parents=()):
+    """
+    Check whether obj is a dict, list or tuple that only holds pandas
+    objects, numpy arrays, scalars and further such containers
+    """
+    if id(obj) in parents:  # Self-referencing
+        return False
+    parents = parents + (id(obj),)
+    if type(obj) is dict:
+        if any(type(key).__name__ not in KEY_TYPES for key in obj):
+            return False
+        values = obj.values()
+    else:
+        values = obj
+    for value in values:
+        if type(value) in CONTAINER_TYPES:
+            if not _is_storable_container(value, parents):
+                return False
+        elif isinstance(value, np.ndarray):
+            if not _is_supported_array(value):
+                return False
+        elif not isinstance(value, PANDAS_TYPES + CODEC_TYPES +
+                            CONTAINER_SCALAR_TYPES):
+            return False
+    return True
+
+
+def _locate(structure, keys):
+    """
+    Structure of the element of a container reached by a sequence of keys
+    """
+    for key in keys:
+        if 'container' not in structure:
+            raise KeyError(key)
+        if structure['container'] == 'dict':
+            decoded = [KEY_TYPES[key_type](value)
+                       for key_type, value in structure['keys']]
+            if key not in decoded:
+                raise KeyError(key)
+            structure = structure['items'][decoded.index(key)]
+        else:
+            structure = structure['items'][key]
+    return structure
+
+
+def _same_schema(stored, obj):
+    """
+    Check whether rows of obj can be appended to a table holding stored,
+    which are both empty slices
+    """
+    if type(stored) is not type(obj):
+        return False
+    if list(stored.index.names) != list(obj.index.names):
+        return False
+    if stored.index.dtype != obj.index.dtype:
         return False
+    if isinstance(obj, pd.Series):
+        return stored.name == obj.name and stored.dtype == obj.dtype
+    return (list(stored.columns) == list(obj.columns) and
+            list(stored.dtypes) == list(obj.dtypes))
+
+
+def _prefix_matches(obj, digest, previous):
+    """
+    Check whether the rows described by previous, a manifest entry, are the
+    leading rows of obj, using the block hashes of both
+    """
+    block_rows = digest['block_rows']
+    if block_rows != previous['block_rows']:
+        return False
+    stored_rows = previous['shape'][0]
+    full = stored_rows // block_rows
+    if digest['blocks'][:full] != previous['blocks'][:full]:
+        return False
+    if stored_rows % block_rows == 0:
+        return True
+    # The last stored block is partial
+    partial = obj.iloc[full * block_rows:stored_rows]
+    return hash_pandas_rows(partial) == previous['blocks'][full]
+
+
+def _as_stored(obj):
+    """
+    obj with the index a table reads back, which is never a RangeIndex, so
+    that it hashes as it does when streamed from the file
+    """
+    if not isinstance(obj.index, pd.RangeIndex):
+        return obj
+    stored = obj.copy(deep=False)
+    stored.index = pd.Index(np.asarray(obj.index), name=obj.index.name)
+    return stored
+
+
+def _hash_table(obj):
+    return hash_variable(_as_stored(obj))
+
+
+def _hash_encoded(spec, arrays, obj):
+    return hash_encoded(spec, arrays)
+
+
+def _hash_pickle(payload, buffers, obj):
+    return hash_pickle(payload, buffers)
 
 
 def _print_detailed_info(header, variables):
     print(header)
     print('-' * 20)
-    cts = [len(variables[key]) > 0 for key in ('pandas', 'numpy', 'builtin')]
+    cts = [len(variables[key]) > 0 for key in VARIABLE_KINDS]
     if not any(cts):
         print('None')
         return
-    for key in ('pandas', 'numpy', 'builtin'):
+    for key in VARIABLE_KINDS:
         if len(variables[key]) > 0:
             print(' ' + key.capitalize())
             print(' ' + '-' * 16)
@@ -91,26 +392,75 @@ class Saver(object):
     path: str, optional
         Full path of file to save.  If omitted uses ./workspace.h5
     pandas: bool, optional
-        Flag indicating to include pandas objects (Series, DataFrame)
+        Flag indicating to include pandas objects (Series, DataFrame, Index
+        and extension arrays such as Categorical)
     scalars: bool, optional
         Flag indicating whether to save scalars (float, int, string)
     numpy: bool, optional
-        Flag indicating whether to save numpy arrays (1-4 dimension, most
-        dtypes except complex)
-    frame: dict-like, optional
-        Dictionary-like structure that supports key-based access (e.g.
-        globals()).  Uses the frame of the calling namespace if not given.
+        Flag indicating whether to save numpy arrays (1-4 dimension, numeric,
+        complex, datetime, timedelta, string and structured dtypes)
+    frame: Mapping or sequence of Mapping, optional
+        Mapping holding the variables (e.g. globals()), or a sequence of
+        mappings such as ``[locals(), globals()]`` where earlier mappings
+        take precedence.  Uses the frame of the calling namespace if not
+        given.
     private: bool, optional
         Flag indicating whether to include variables starting with
         underscore (``_``)
-    include: iterable of str, optional
-        Iterable containing variables names to store or wildcard patterns to
-        match (e.g. ``ap*le`` or ``*pple``)
-    exclude: iterable of str, optional
-        Iterable containing variables names to exclude from the store or
-        wildcard patterns to match (e.g. ``ap*le`` or ``*pple``)
+    include: iterable of str or compiled regular expressions, optional
+        Iterable containing variables names to store, wildcard patterns to
+        match (e.g. ``ap*le`` or ``*pple``) or regular expressions
+        searched for in names
+    exclude: iterable of str or compiled regular expressions, optional
+        Iterable containing variables names to exclude from the store,
+        wildcard patterns to match (e.g. ``ap*le`` or ``*pple``) or regular
+        expressions searched for in names
     verbose: bool, optional
         Flag indicating whether to display information about variables stored.
+    chunkshape: {'auto', 'row', 'column'}, tuple or dict, optional
+        Chunk layout of numpy arrays.  'row' suits reading ranges of rows,
+        'column' suits reading columns and a tuple sets the chunk shape
+        explicitly.  A dict maps variable names to layouts.  The default,
+        'auto', lets PyTables choose.
+    store_dir: str, optional
+        Directory of a content-addressed store shared by many stashes.  When
+        given, each pandas object and numpy array is written once to the
+        store as a blob named by the hash of its content, and the stash file
+        only holds references to the blobs.
+    checksums: bool, optional
+        Flag indicating whether to record content hashes of each variable,
+        computed in blocks of rows, which are used by ``stash_diff``.
+        Always True with store_dir or append_rows.
+    containers: bool, optional
+        Flag indicating whether to save dicts, lists and tuples that only
+        contain pandas objects, numpy arrays, scalars and further such
+        containers.  Each pandas object and array is stored in its own node.
+    fallback: {None, 'pickle'}, optional
+        How to save variables that are not otherwise supported.  None skips
+        them.  'pickle' pickles them with protocol 5, writing large buffers,
+        such as the arrays held by a fitted model, out-of-band to
+        compressed datasets.  Modules are always skipped.
+    atomic: bool, optional
+        Flag indicating whether to write to a temporary file that replaces
+        path once complete, so that readers never see a partial stash.
+    append_rows: bool, optional
+        Flag indicating whether to update an existing stash in place,
+        appending only the new rows of pandas objects that extend the rows
+        already stored.  Other variables are rewritten.  Ignores atomic.
+    downcast: {None, 'safe'} or dict, optional
+        Policy narrowing the dtypes of pandas objects and numpy arrays
+        before they are written.  'safe' only makes lossless changes.  A
+        dict maps variable names to 'safe', a dtype or, for DataFrames, a
+        dict mapping columns to dtypes.  Original dtypes are recorded in
+        the manifest.
+    to: {'file', 'memory'}, optional
+        Where the stash is written.  'memory' builds it in memory without a
+        backing file, and the bytes of the complete stash are available from
+        ``buffer`` once closed.  path must be omitted and atomic is ignored.
+    types: type or tuple of types, optional
+        Only variables that are instances of these types are saved
+    max_nbytes: int, optional
+        Variables using more than this many bytes in memory are not saved
     kwargs: optional
         optional additional arguments to pass to HDFStore when creating the
         store. Can include values such as compression variables (complib,
@@ -118,119 +468,389 @@ class Saver(object):
 
     Notes
     -----
-    Does not currently support complex-valued numpy arrays.
+    numpy arrays are stored as typed HDF5 datasets without conversion.
+    Indexes, extension arrays, and Series and DataFrames with extension
+    dtypes are stored as the arrays underlying them, see ``codec``.
     Includes are processed before excludes, so values that match both will be
     included.
     """
 
     def __init__(self, path=None, pandas=True, scalars=True, numpy=True,
                  frame=None, private=False, include=None, exclude=None,
-                 verbose=True, **kwargs):
+                 verbose=True, chunkshape=None, store_dir=None,
+                 checksums=False, containers=True, fallback=None, atomic=True,
+                 append_rows=False, downcast=None, to='file', types=None,
+                 max_nbytes=None, **kwargs):
+        if to not in TARGETS:
+            raise ValueError('to must be \'file\' or \'memory\'.')
+        self._memory = to == 'memory'
+        if self._memory and path is not None:
+            raise ValueError('path cannot be given when writing to memory.')
+        if self._memory and (append_rows or store_dir is not None):
+            raise ValueError('append_rows and store_dir cannot be used when '
+                             'writing to memory.')
+        self._buffer = None
         self._path = 'workspace.h5' if path is None else path
         _globals = currentframe().f_back.f_globals
-        self._frame = _globals if frame is None else frame
-        if not issubclass(type(self._frame), dict):
-            raise TypeError('frame must be dict-like if provided.')
+        self._frame = namespace(_globals if frame is None else frame)
         self._pandas = pandas
         self._scalars = scalars
         self._numpy = numpy
+        self._containers = containers
+        if fallback not in FALLBACKS:
+            raise ValueError('fallback must be None or \'pickle\'.')
+        self._fallback = fallback
         if 'complib' not in kwargs:
             kwargs['complib'] = 'blosc'
         if 'complevel' not in kwargs:
             kwargs['complevel'] = 1
         self._kwargs = kwargs
-        self._private = private
         self._pandas_vars = []
         self._numpy_vars = []
         self._scalar_vars = []
+        self._container_vars = []
+        self._pickle_vars = []
         self._store = None
+        self._atomic = atomic
+        self._temp = None
+        if append_rows and store_dir is not None:
+            raise ValueError('append_rows cannot be used with store_dir '
+                             'since blobs are never modified.')
+        self._append_rows = append_rows
+        self._previous = None
+        check_policy(downcast)
+        self._downcast = downcast
         self._verbose = verbose
         self._variables = dict([(key, defaultdict(list))
-                                for key in ('pandas', 'numpy', 'builtin')])
-        self._include = include
-        self._exclude = exclude
+                                for key in VARIABLE_KINDS])
+        self._selector = Selector(include, exclude, private, types,
+                                  max_nbytes)
+        self._chunkshape = chunkshape
+        self._objects = None
+        if store_dir is not None:
+            self._objects = ObjectStore(store_dir)
+        # Blob names and appended rows are checked using the hashes
+        self._checksums = (checksums or store_dir is not None or
+                           append_rows)
+        self._manifest = new_manifest()
 
     def open(self):
         """
         Open the store for writing
         """
-        self._store = pd.HDFStore(self._path, mode='w', **self._kwargs)
+        with hdf5_lock():
+            if self._memory:
+                self._store = open_memory_store(mode='w', **self._kwargs)
+                return
+            if self._append_rows and self._open_existing():
+                return
+            path = self._path
+            if self._atomic:
+                path = self._temp = temp_path(self._path)
+            self._store = pd.HDFStore(path, mode='w', **self._kwargs)
+
+    def _open_existing(self):
+        """
+        Open an existing stash to update in place
+        """
+        if not os.path.exists(self._path):
+            return False
+        store = pd.HDFStore(self._path, mode='a', **self._kwargs)
+        manifest = read_manifest(store._handle)
+        if manifest is None or 'store_dir' in manifest:
+            store.close()
+            return False
+        # Removed until the update is complete so that wait_for_stash does
+        # not treat the stash as complete while it is being written
+        store._handle.remove_node('/', MANIFEST_NODE)
+        store._handle.flush()
+        self._previous = manifest['variables']
+        self._store = store
+        return True
+
+    def _remove_previous(self):
+        """
+        Remove the nodes of an existing stash that are not reused
+        """
+        handle = self._store._handle
+        keep = set('/pandas:' + key for key in self._pandas_vars)
+        for node in list(handle.root):
+            if node._v_pathname not in keep:
+                handle.remove_node(node, recursive=True)
 
     def write(self):
         """
         Write data to an open store.
+
+        The HDF5 lock is only held while the store is written, so variables
+        are downcast, hashed and encoded without it.
         """
         self._select_variables()
+        if self._previous is not None:
+            with hdf5_lock():
+                self._remove_previous()
         if self._pandas:
             self._write_pandas()
         if self._scalars:
             self._write_scalars()
         if self._numpy:
             self._write_numpy()
+        if self._containers:
+            self._write_containers()
+        if self._fallback == 'pickle':
+            self._write_pickles()
+        if self._objects is not None:
+            self._manifest['store_dir'] = self._objects.path
+            self._objects.add_ref(self._path)
+        with hdf5_lock():
+            write_manifest(self._store._handle, self._manifest)
         if self._verbose:
             _print_detailed_info('Variables Saved', self._variables)
 
     def _select_variables(self):
-        frame = self._frame
-        candidates = list(frame.keys())
-        pandas = []
-        numpy = []
-        scalars = []
-        wildcard_matches = []
-        if self._include is not None:
-            for incl in self._include:
-                if incl.find('*') >= 0:
-                    wildcard_matches.extend(filter(candidates, incl))
-            candidates = [candidate for candidate in candidates
-                          if candidate in self._include]
-            candidates = set(candidates + wildcard_matches)
-        elif self._exclude is not None:
-            excluded = [candidate for candidate in candidates
-                        if candidate in self._exclude]
-            for excl in self._exclude:
-                if excl.find('*') >= 0:
-                    wildcard_matches.extend(filter(candidates, excl))
-            excluded = excluded + wildcard_matches
-            candidates = set(candidates).difference(excluded)
-
-        for candidate in candidates:
-            if not self._private and candidate.startswith('_'):
+        selected = dict((kind, []) for kind in VARIABLE_KINDS)
+        for name, obj in self._selector.select(self._frame):
+            kind = _variable_kind(type(obj))
+            if kind == 'numpy':
+                supported = is_supported_dtype(obj.dtype)
+                if supported and obj.ndim in (1, 2, 3, 4):
+                    pass
+                elif self._fallback == 'pickle':
+                    kind = 'pickle'
+                else:
+                    if supported:
+                        warnings.warn(
+                            unsupported_dimension_doc.format(obj.ndim),
+                            UnsupportedDimensionWarning)
+                    continue
+            elif kind == 'container' and not _is_storable_container(obj):
+                kind = 'pickle'
+            elif kind is None:
                 continue
-            obj = frame[candidate]
-            if isinstance(obj, PANDAS_TYPES):
-                pandas.append(candidate)
-            elif isinstance(obj, SCALAR_TYPES_LIST):
-                scalars.append(candidate)
-            elif isinstance(obj, np.ndarray):
-                dtype = getattr(obj, 'dtype', None)
-                if (dtype in NUMPY_DTYPES_LIST or _is_string_type(dtype)) \
-                        and obj.ndim in (1, 2, 3, 4):
-                    numpy.append(candidate)
-                elif (dtype in NUMPY_DTYPES_LIST and
-                        obj.ndim not in (1, 2, 3, 4)):
-                    warnings.warn(unsupported_dimension_doc.format(obj.ndim),
-                                  UnsupportedDimensionWarning)
-
-        self._pandas_vars = pandas
-        self._numpy_vars = numpy
-        self._scalar_vars = scalars
+            selected[kind].append(name)
+
+        self._pandas_vars = selected['pandas']
+        self._numpy_vars = selected['numpy']
+        self._scalar_vars = selected['builtin']
+        self._container_vars = selected['container']
+        self._pickle_vars = selected['pickle']
+
+    def selection(self):
+        """
+        Variables that write would save, without saving them
+
+        Returns
+        -------
+        selection : dict
+            Kind of each variable saved, one of 'pandas', 'numpy',
+            'builtin', 'container' or 'pickle', keyed by name
+        """
+        self._select_variables()
+        kinds = [('pandas', self._pandas_vars, self._pandas),
+                 ('builtin', self._scalar_vars, self._scalars),
+                 ('numpy', self._numpy_vars, self._numpy),
+                 ('container', self._container_vars, self._containers),
+                 ('pickle', self._pickle_vars, self._fallback == 'pickle')]
+        return dict((name, kind) for kind, names, enabled in kinds
+                    if enabled for name in names)
 
     def close(self):
         """
-        Close an open store
+        Close an open store, publishing it if written atomically
+        """
+        with hdf5_lock():
+            if self._memory:
+                self._buffer = self._store._handle.get_file_image()
+            self._store.close()
+        if self._temp is not None:
+            publish(self._temp, self._path)
+            self._temp = None
+
+    @property
+    def buffer(self):
+        """
+        Bytes of a stash written to memory, available once closed
+        """
+        return self._buffer
+
+    def abort(self):
+        """
+        Close an open store after a failed write, discarding it if written
+        atomically
+        """
+        with hdf5_lock():
+            self._store.close()
+        if self._temp is not None:
+            if os.path.exists(self._temp):
+                os.remove(self._temp)
+            self._temp = None
+
+    def _write_variable(self, key, obj, entry, node, write,
+                        hasher=hash_variable):
+        """
+        Write a pandas object, numpy array or pickled object and record it in
+        the manifest
+        """
+        self._manifest['variables'][key] = self._write_object(obj, entry,
+                                                              node, write,
+                                                              hasher)
+
+    def _write_object(self, obj, entry, node, write, hasher=hash_variable):
+        """
+        Write a pandas object, numpy array or pickled object to the store, or
+        to a blob in the object store if one is used, and return its manifest
+        entry
+        """
+        if 'nbytes' not in entry:
+            # Shallow, since visiting every string costs as much as writing
+            entry['nbytes'] = _nbytes(obj, deep=False)
+        entry['node'] = '/' + node
+        digest = None
+        if self._checksums:
+            digest = hasher(obj)
+        if digest is not None:
+            entry.update(digest)
+        if digest is None or self._objects is None:
+            with hdf5_lock():
+                write(self._store, node)
+        else:
+            entry['blob'] = digest['hash']
+            entry['node'] = BLOB_NODES[entry['kind']]
+            self._objects.put(digest['hash'],
+                              partial(self._write_blob, entry['node'], write))
+        return entry
+
+    def _write_blob(self, node, write, path):
+        with hdf5_lock(), pd.HDFStore(path, mode='w', **self._kwargs) as store:
+            write(store, node.lstrip('/'))
+
+    def _pandas_writer(self, obj):
+        """
+        Manifest entry of a pandas object, function that writes it and
+        function that hashes it
+        """
+        entry = {'kind': 'pandas', 'type': type(obj).__name__,
+                 'format': 'table', 'shape': list(obj.shape)}
+        if not uses_codec(obj):
+            def write(store, node):
+                store.append(node, obj, index=False)
+
+            return entry, write, _hash_table
+
+        entry['format'] = 'codec'
+        spec, arrays = encode(obj, allow_pickle=self._fallback == 'pickle')
+        filters = self._filters()
+
+        def write(store, node):
+            where, _, name = ('/' + node).rpartition('/')
+            write_encoded(store._handle, where or '/', name, spec, arrays,
+                          filters)
+
+        hasher = hash_variable
+        if not isinstance(obj, PANDAS_TYPES):
+            hasher = partial(_hash_encoded, spec, arrays)
+        return entry, write, hasher
+
+    def _numpy_writer(self, key, obj):
+        """
+        Manifest entry of a numpy array and function that writes it
         """
+        filters = self._filters()
+        layout = self._chunkshape
+        if isinstance(layout, dict):
+            layout = layout.get(key)
+        entry = {'kind': 'numpy', 'dtype': dtype_label(obj.dtype),
+                 'shape': list(obj.shape)}
+
+        def write(store, node):
+            where, _, name = ('/' + node).rpartition('/')
+            write_array(store._handle, where or '/', name, obj, filters,
+                        layout)
 
-        self._store.close()
+        return entry, write
 
     def _write_pandas(self):
         frame = self._frame
-        store = self._store
-        warnings.simplefilter('ignore', NaturalNameWarning)
         for key in self._pandas_vars:
-            store.append('pandas:' + key, frame[key], index=False)
-            pandas_type = str(type(frame[key])).split('.')[-1].split("'")[0]
-            self._variables['pandas'][pandas_type].append(key)
-        warnings.simplefilter('default', NaturalNameWarning)
+            obj, original = self._narrow(key, frame[key])
+            if (self._previous is None or key not in self._previous or
+                    not self._append_pandas(key, obj, self._previous[key])):
+                try:
+                    entry, write, hasher = self._pandas_writer(obj)
+                except PickleRequiredError as exc:
+                    warnings.warn(pickle_required_doc.format(key, exc),
+                                  UnsupportedValueWarning)
+                    continue
+                self._write_variable(key, obj, entry, 'pandas:' + key, write,
+                                     hasher)
+                self._variables['pandas'][entry['type']].append(key)
+            if original:
+                self._manifest['variables'][key]['original_dtypes'] = original
+
+    def _narrow(self, key, obj):
+        """
+        Downcast a pandas object or numpy array by the policy for its
+        variable, returning it and the original dtypes of changed columns
+        """
+        policy = variable_policy(self._downcast, key)
+        if policy is None or not isinstance(obj, PANDAS_TYPES + (np.ndarray,)):
+            return obj, {}
+        return downcast(obj, policy)
+
+    def _append_pandas(self, key, obj, previous):
+        """
+        Append the rows of obj that are not already stored, if the stored
+        rows are the leading rows of obj
+
+        The stored rows are compared using the block hashes in the manifest,
+        so only obj is hashed.  Returns False, after removing the stored
+        variable, if it must be rewritten.
+        """
+        node = '/pandas:' + key
+        store = self._store
+        with hdf5_lock():
+            if node not in store._handle:
+                return False
+            if not self._appendable(node, obj, previous):
+                store._handle.remove_node(node, recursive=True)
+                return False
+        stored_rows = previous['shape'][0]
+        stored = _as_stored(obj)
+        digest = hash_pandas(stored)
+        with hdf5_lock():
+            if (digest is None or
+                    not _prefix_matches(stored, digest, previous)):
+                store._handle.remove_node(node, recursive=True)
+                return False
+            if obj.shape[0] > stored_rows:
+                try:
+                    store.append(node, obj.iloc[stored_rows:], index=False)
+                except (TypeError, ValueError):
+                    # e.g. strings longer than the stored column allows
+                    store._handle.remove_node(node, recursive=True)
+                    return False
+        entry, _, _ = self._pandas_writer(obj)
+        entry['nbytes'] = _nbytes(obj, deep=False)
+        entry['node'] = node
+        entry.update(digest)
+        self._manifest['variables'][key] = entry
+        self._variables['pandas'][entry['type']].append(key)
+        return True
+
+    def _appendable(self, node, obj, previous):
+        if uses_codec(obj):
+            return False
+        if (previous.get('kind') != 'pandas' or
+                previous.get('format') != 'table' or
+                previous.get('node') != node or 'blocks' not in previous):
+            return False
+        storer = self._store.get_storer(node)
+        if not storer.is_table or storer.nrows != previous['shape'][0]:
+            return False
+        if storer.nrows > obj.shape[0]:
+            return False
+        stored = self._store.select(node, start=0, stop=0)
+        return _same_schema(stored, obj.iloc[:0])
 
     def _write_scalars(self):
         frame = self._frame
@@ -245,26 +865,109 @@ class Saver(object):
             values[type(frame[key])][key] = frame[key]
             _type = SCALAR_TYPES[type(frame[key])]
             self._variables['builtin'][_type].append(key)
+            entry = {'kind': 'builtin', 'type': _type,
+                     'node': '/builtin:' + _type}
+            if self._checksums:
+                entry.update(hash_scalar(frame[key]))
+            self._manifest['variables'][key] = entry
 
-        warnings.simplefilter('ignore', NaturalNameWarning)
         for key in values:
             items = values[key]
             hdf_key = 'builtin:' + SCALAR_TYPES[key]
-            store.put(hdf_key, pd.Series(items), format='fixed')
-        warnings.simplefilter('default', NaturalNameWarning)
+            with hdf5_lock():
+                store.put(hdf_key, pd.Series(items), format='fixed')
+
+    def _filters(self):
+        kwargs = self._kwargs
+        return tables.Filters(complevel=kwargs['complevel'],
+                              complib=kwargs['complib'],
+                              fletcher32=kwargs.get('fletcher32', False))
 
     def _write_numpy(self):
-        store = self._store
         frame = self._frame
-        warnings.simplefilter('ignore', NaturalNameWarning)
         for key in self._numpy_vars:
+            obj, original = self._narrow(key, frame[key])
+            entry, write = self._numpy_writer(key, obj)
+            if original:
+                entry['original_dtypes'] = original
+            self._write_variable(key, obj, entry, 'array:' + key, write)
+            self._variables['numpy'][entry['dtype']].append(key)
+
+    def _write_pickles(self):
+        frame = self._frame
+        filters = self._filters()
+        for key in self._pickle_vars:
+            obj = frame[key]
+            try:
+                payload, buffers = dumps(obj)
+            except Exception as exc:
+                warnings.warn(unpicklable_value_doc.format(key, exc),
+                              UnsupportedValueWarning)
+                continue
+            pickle_type = type(obj).__name__
+            entry = {'kind': 'pickle', 'type': pickle_type,
+                     'nbytes': int(payload.nbytes +
+                                   sum(buf.nbytes for buf in buffers))}
+
+            def write(store, node, payload=payload, buffers=buffers):
+                where, _, name = ('/' + node).rpartition('/')
+                write_pickle(store._handle, where or '/', name, payload,
+                             buffers, filters)
+
+            self._write_variable(key, obj, entry, 'pickle:' + key, write,
+                                 partial(_hash_pickle, payload, buffers))
+            self._variables['pickle'][pickle_type].append(key)
+
+    def _encode_item(self, key, obj, node):
+        """
+        Write the pandas objects and arrays held in a container and return
+        a description of its structure
+        """
+        if type(obj) in CONTAINER_TYPES:
+            if type(obj) is dict:
+                keys = [[type(k).__name__, k] for k in obj]
+                values = list(obj.values())
+            else:
+                keys = None
+                values = obj
+            items = [self._encode_item(key, value, node + '/i' + str(i))
+                     for i, value in enumerate(values)]
+            structure = {'container': type(obj).__name__, 'items': items}
+            if keys is not None:
+                structure['keys'] = keys
+            return structure
+        if isinstance(obj, PANDAS_TYPES + CODEC_TYPES):
+            entry, write, hasher = self._pandas_writer(obj)
+        elif isinstance(obj, np.ndarray):
+            entry, write = self._numpy_writer(key, obj)
+            hasher = hash_variable
+        else:
+            return {'value': obj}
+        return self._write_object(obj, entry, node, write, hasher)
+
+    def _write_containers(self):
+        frame = self._frame
+        for key in self._container_vars:
             obj = frame[key]
-            dtype = obj.dtype
-            pd_obj = PANDAS_NUMPY_MAP[obj.ndim](obj, dtype=dtype)
-            hdf_key = 'numpy:' + str(dtype) + ':' + key
-            store.append(hdf_key, pd_obj, index=False)
-            self._variables['numpy'][str(dtype)].append(key)
-        warnings.simplefilter('default', NaturalNameWarning)
+            node = 'container:' + key
+            container_type = type(obj).__name__
+            try:
+                structure = self._encode_item(key, obj, node)
+            except PickleRequiredError as exc:
+                with hdf5_lock():
+                    if '/' + node in self._store._handle:
+                        self._store._handle.remove_node('/' + node,
+                                                        recursive=True)
+                warnings.warn(pickle_required_doc.format(key, exc),
+                              UnsupportedValueWarning)
+                continue
+            entry = {'kind': 'container', 'type': container_type,
+                     'node': '/' + node, 'structure': structure}
+            digest = hash_container(structure)
+            if digest is not None:
+                entry.update(digest)
+            self._manifest['variables'][key] = entry
+            self._variables['container'][container_type].append(key)
 
 
 class Loader(object):
@@ -273,8 +976,9 @@ class Loader(object):
 
     Parameters
     ----------
-    path: str, optional
-        Full path of file to save.  If omitted uses ./workspace.h5
+    path: str or bytes, optional
+        Full path of file to load, or the bytes of a stash written to
+        memory.  If omitted uses ./workspace.h5
     insert: bool, optional
         Flag indicating whether to insert into frame
     frame: dict-like, optional
@@ -284,38 +988,329 @@ class Loader(object):
         Flag indicating whether to overwrite existing values in the frame
     verbose: bool, optional
         Flag indicating whether to display information about variables loaded
+    max_bytes: int, optional
+        Memory budget for pandas and numpy variables.  When set, these are
+        read on first access and the least-recently used are evicted from
+        the vault once the budget is exceeded.  Requires ``insert=False``.
+    lazy: bool, optional
+        Flag indicating whether to defer reading.  pandas variables are read
+        on first access and numpy arrays are returned as ``ArrayProxy``
+        objects that only read the slices that are indexed.  Requires
+        ``insert=False``.
+    store_dir: str, optional
+        Directory of the content-addressed store holding the variables of a
+        stash written with ``store_dir``.  Defaults to the directory used
+        when the stash was written.
+    downcast: {None, 'safe'} or dict, optional
+        Policy narrowing the dtypes of pandas objects and numpy arrays as
+        they are loaded, as used by ``Saver``.  Arrays read lazily are not
+        narrowed.
+    restore_dtypes: bool, optional
+        Flag indicating whether to restore the dtypes that pandas objects and
+        numpy arrays had before they were downcast when stashed
+    cache: bool or ReadCache, optional
+        Cache holding the pandas objects and numpy arrays read, which are
+        returned without reading the file again while it is unchanged.  True
+        uses the cache shared by the process, see ``get_read_cache``.
 
     """
 
     def __init__(self, path=None, insert=True, frame=None, overwrite=False,
-                 verbose=True):
+                 verbose=True, max_bytes=None, lazy=False, store_dir=None,
+                 downcast=None, restore_dtypes=False, cache=None):
         self._path = DEFAULT_PATH if path is None else path
         _globals = currentframe().f_back.f_globals
         self._frame = _globals if frame is None else frame
+        if max_bytes is not None and insert:
+            raise ValueError('max_bytes requires insert=False since values '
+                             'inserted into frame cannot be evicted.')
+        if lazy and insert:
+            raise ValueError('lazy requires insert=False since values '
+                             'inserted into frame are read at once.')
+        self._buffer = path if is_buffer(path) else None
+        if self._buffer is not None and (lazy or max_bytes is not None):
+            raise ValueError('lazy and max_bytes cannot be used with a stash '
+                             'held in memory, which is read at once.')
+        self._memory_store = None
+        if cache is True:
+            cache = get_read_cache()
+        elif cache is False:
+            cache = None
+        self._cache = cache
         self._insert = insert
         self._overwrite = overwrite
-        self._vault = Vault()
+        self._max_bytes = max_bytes
+        self._lazy = lazy
+        self._store_dir = store_dir
+        self._vault = Vault(max_bytes=max_bytes)
+        check_policy(downcast)
+        self._downcast = downcast
+        self._restore_dtypes = restore_dtypes
+        self._manifest = None
+        self._signature = None
         self._verbose = verbose
         self._variables = dict([(key, defaultdict(list))
-                                for key in ('pandas', 'numpy', 'builtin')])
+                                for key in VARIABLE_KINDS])
+
+    @contextmanager
+    def _opened(self, path):
+        """
+        Open the stash, or a blob, for reading.  The HDF5 lock is held while
+        it is opened and closed, and taken for each read while it is open.
+        A stash held in memory is opened once for each load or read.
+        """
+        if self._buffer is None or path is not self._path:
+            with _reading(path) as store:
+                yield store
+        elif self._memory_store is not None:
+            yield self._memory_store
+        else:
+            with hdf5_lock():
+                store = open_memory_store(self._buffer)
+            self._memory_store = store
+            try:
+                yield store
+            finally:
+                self._memory_store = None
+                with hdf5_lock():
+                    store.close()
+
+    def _cached(self, path, node, read):
+        """
+        Read a pandas object or numpy array through the read cache, if used
+        """
+        if self._cache is None or is_buffer(path):
+            return read()
+        return self._cache.get(path, node, read)
+
+    def _read_from(self, path, entry):
+        with self._opened(path) as store:
+            return _read_entry(store, entry)
+
+    def _convert(self, name, value):
+        """
+        Restore the original dtypes of a pandas object or numpy array, and
+        downcast it, as requested
+        """
+        if not isinstance(value, PANDAS_TYPES + (np.ndarray,)):
+            return value
+        if self._restore_dtypes and self._manifest is not None:
+            entry = self._manifest['variables'].get(name, {})
+            value = restore_dtypes(value, entry.get('original_dtypes'))
+        policy = variable_policy(self._downcast, name)
+        if policy is not None:
+            value, _ = downcast(value, policy)
+        return value
+
+    def _converted(self, name, load):
+        return self._convert(name, load())
+
+    def _set(self, name, value):
+        self._vault[name] = self._convert(name, value)
+
+    def _set_lazy(self, name, load):
+        if self._restore_dtypes or self._downcast is not None:
+            load = partial(self._converted, name, load)
+        self._vault._set_lazy(name, load)
 
     def _load_pandas(self, key, item):
         variable_name = key.split(':')[-1]
-        self._vault[variable_name] = item
+        self._set(variable_name, item)
         klass = item.__class__.__name__
         self._variables['pandas'][klass].append(variable_name)
 
     def _load_numpy(self, key, item):
         variable_name = key.split(':')[-1]
         dtype = key.split(':')[-2]
-        self._vault[variable_name] = np.array(item, dtype=dtype)
+        self._set(variable_name, _decode_numpy(key, item))
         self._variables['numpy'][dtype].append(variable_name)
 
+    def _load_array(self, node, variable_name, path):
+        signature = self._signature if path == self._path else None
+        with hdf5_lock():
+            proxy = ArrayProxy._from_node(path, node, signature)
+        if self._lazy:
+            self._vault[variable_name] = proxy
+        elif self._max_bytes is not None:
+            load = partial(self._cached, path, node._v_pathname,
+                           partial(_read_array_from_file, path,
+                                   node._v_pathname))
+            if signature is not None:
+                load = partial(self._checked, load)
+            self._set_lazy(variable_name, load)
+        else:
+            self._set(variable_name,
+                      self._cached(path, node._v_pathname,
+                                   partial(_locked, read_array, node)))
+        label = dtype_label(proxy.dtype)
+        self._variables['numpy'][label].append(variable_name)
+
+    def _load_blobs(self, manifest):
+        blobs = [(key, entry) for key, entry in manifest['variables'].items()
+                 if entry.get('blob') is not None and
+                 entry['kind'] in ('pandas', 'numpy')]
+        if not blobs:
+            return
+        objects = self._object_store(manifest)
+        deferred = self._lazy or self._max_bytes is not None
+        for variable_name, entry in sorted(blobs):
+            path = objects.blob_path(entry['blob'])
+            if not os.path.exists(path):
+                raise IOError('{0} is missing from the object store {1} '
+                              '(blob {2}).'.format(variable_name,
+                                                   objects.path,
+                                                   entry['blob']))
+            if entry['kind'] == 'numpy':
+                with _reading(path) as store:
+                    node = _locked(store._handle.get_node, entry['node'])
+                    self._load_array(node, variable_name, path)
+                continue
+            self._variables['pandas'][entry['type']].append(variable_name)
+            load = partial(self._cached, path, entry['node'],
+                           partial(_read_variable, path, entry['node']))
+            if deferred:
+                self._set_lazy(variable_name, load)
+            else:
+                self._set(variable_name, load())
+
+    def _object_store(self, manifest):
+        store_dir = self._store_dir
+        if store_dir is None:
+            store_dir = manifest.get('store_dir')
+        return None if store_dir is None else ObjectStore(store_dir)
+
+    def _read_object(self, entry, objects, name):
+        """
+        Read a pandas object or numpy array held in the stash or in a blob
+        """
+        path = self._path
+        if entry.get('blob') is not None:
+            path = objects.blob_path(entry['blob'])
+            if not os.path.exists(path):
+                raise IOError('{0} is missing from the object store {1} '
+                              '(blob {2}).'.format(name, objects.path,
+                                                   entry['blob']))
+        if entry['kind'] == 'numpy' and self._lazy:
+            signature = self._signature if path == self._path else None
+            with hdf5_lock(), tables.open_file(path, mode='r') as h5f:
+                return ArrayProxy._from_node(path,
+                                             h5f.get_node(entry['node']),
+                                             signature)
+        read = partial(self._read_from, path, entry)
+        if entry['kind'] == 'pickle':
+            return read()
+        return self._cached(path, entry['node'], read)
+
+    def _rebuild(self, structure, objects, name):
+        """
+        Rebuild a stashed container, or one of its elements, from the
+        description of its structure
+        """
+        if 'container' in structure:
+            items = [self._rebuild(item, objects, name)
+                     for item in structure['items']]
+            if structure['container'] == 'dict':
+                keys = [KEY_TYPES[key_type](key)
+                        for key_type, key in structure['keys']]
+                return dict(zip(keys, items))
+            return tuple(items) if structure['container'] == 'tuple' else items
+        if 'value' in structure:
+            return structure['value']
+        return self._read_object(structure, objects, name)
+
+    def _load_manifest_variables(self, manifest, kind):
+        """
+        Load the containers or pickled objects described in the manifest
+        """
+        variables = [(key, entry)
+                     for key, entry in manifest['variables'].items()
+                     if entry['kind'] == kind]
+        if not variables:
+            return
+        objects = self._object_store(manifest)
+        for variable_name, entry in sorted(variables):
+            if kind == 'container':
+                load = partial(self._rebuild, entry['structure'], objects,
+                               variable_name)
+            else:
+                load = partial(self._read_object, entry, objects,
+                               variable_name)
+            if self._lazy or self._max_bytes is not None:
+                self._vault._set_lazy(variable_name,
+                                      partial(self._checked, load))
+            else:
+                self._vault[variable_name] = load()
+            self._variables[kind][entry['type']].append(variable_name)
+
+    def read(self, name, *keys):
+        """
+        Read a single variable, or an element of a stashed container,
+        without loading the rest of the stash
+
+        Parameters
+        ----------
+        name: str
+            Name of the variable
+        keys: optional
+            Keys or positions locating an element of a container, e.g.
+            ``read('results', 'fits', 0)`` reads ``results['fits'][0]``
+
+        Returns
+        -------
+        value
+            The variable or element
+        """
+        with self._opened(self._path) as store:
+            manifest = self._manifest = _locked(read_manifest, store._handle)
+            if manifest is None or name not in manifest['variables']:
+                raise KeyError(name)
+            entry = manifest['variables'][name]
+            objects = self._object_store(manifest)
+            if entry['kind'] == 'container':
+                return self._rebuild(_locate(entry['structure'], keys),
+                                     objects, name)
+            if keys:
+                raise TypeError('{0} is not a container.'.format(name))
+            if entry['kind'] == 'builtin':
+                value = _locked(store.get, entry['node'])[name]
+                return SCALAR_CONVERTERS[entry['type']](value)
+            return self._convert(name,
+                                 self._read_object(entry, objects, name))
+
+    def _checked(self, load):
+        # Deferred reads must come from the version of the stash loaded
+        check_signature(self._path, self._signature)
+        return load()
+
+    def _defer(self, store, key):
+        variable_name = key.split(':')[-1]
+        if key.startswith('/pandas'):
+            pandas_class = _locked(_pandas_class, store, key)
+            self._variables['pandas'][pandas_class].append(variable_name)
+        else:
+            dtype = key.split(':')[-2]
+            self._variables['numpy'][dtype].append(variable_name)
+        load = partial(self._cached, self._path, key,
+                       partial(_read_variable, self._path, key))
+        self._set_lazy(variable_name, partial(self._checked, load))
+
+    def _load_encoded(self, store, node):
+        """
+        Load a pandas object stored by the codec, which is not one of the
+        keys of the store
+        """
+        key = node._v_pathname
+        if self._lazy or self._max_bytes is not None:
+            self._defer(store, key)
+            return
+        self._load_pandas(node._v_name, self._cached(
+            self._path, key, partial(_read_pandas, store, key)))
+
     def _load_scalars(self, key, items):
         builtin_type = key.split(':')[-1]
-        converters = {'str': str, 'float': float, 'int': int, 'unicode': u}
-        for index, val in items.iteritems():
-            self._vault[index] = converters[builtin_type](val)
+        converter = SCALAR_CONVERTERS[builtin_type]
+        for index, val in items.items():
+            self._vault[index] = converter(val)
             self._variables['builtin'][builtin_type].append(index)
 
     def load(self):
@@ -327,22 +1322,49 @@ class Loader(object):
         vault : Vault
         dict-like object that supports tab completion for keys in IPython
         """
-        store = pd.HDFStore(self._path, mode='r')
-        keys = store.keys()
-        for key in keys:
-            item = store.get(key)
-            key = key.replace('/', '')
-            if key.startswith('pandas'):
-                self._load_pandas(key, item)
-            elif key.startswith('numpy'):
-                self._load_numpy(key, item)
-            elif key.startswith('builtin'):
-                self._load_scalars(key, item)
+        # Taken before opening, so a stash published after this is detected
+        if self._buffer is None:
+            self._signature = stat_signature(self._path)
+        with self._opened(self._path) as store:
+            with hdf5_lock():
+                manifest = self._manifest = read_manifest(store._handle)
+                keys = store.keys()
+                groups = [node for node in
+                          store._handle.list_nodes('/', classname='Group')
+                          if node._v_name.startswith('pandas:') and
+                          is_codec_node(node)]
+                arrays = [node for node in
+                          store._handle.list_nodes('/', classname='Leaf')
+                          if node._v_name.startswith('array:')]
+            for key in keys:
+                if key.startswith('/container'):
+                    continue
+                if ((self._lazy or self._max_bytes is not None) and
+                        key.startswith(('/pandas', '/numpy'))):
+                    self._defer(store, key)
+                    continue
+                name = key.replace('/', '')
+                if name.startswith('pandas'):
+                    self._load_pandas(name, self._cached(
+                        self._path, key, partial(_read_pandas, store, key)))
+                elif name.startswith('numpy'):
+                    self._load_numpy(name, self._cached(
+                        self._path, key, partial(_locked, store.get, key)))
+                elif name.startswith('builtin'):
+                    self._load_scalars(name, _locked(store.get, key))
+            for node in groups:
+                self._load_encoded(store, node)
+            for node in arrays:
+                variable_name = node._v_name.split(':', 1)[-1]
+                self._load_array(node, variable_name, self._path)
+            if manifest is not None:
+                self._load_blobs(manifest)
+                self._load_manifest_variables(manifest, 'container')
+                self._load_manifest_variables(manifest, 'pickle')
         if self._insert:
             for key in self._vault:
                 if self._overwrite or key not in self._frame:
                     self._frame[key] = self._vault[key]
         if self._verbose:
             _print_detailed_info('Variables Loaded', self._variables)
-        store.close()
         return self._vault
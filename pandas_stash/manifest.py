@@ -0,0 +1,54 @@
+"""
+Manifest describing the variables held in a stash
+
+The manifest is stored as UTF-8 encoded JSON in a uint8 array at the root of
+the file.  Stashes written before manifests were introduced do not have one.
+"""
+import json
+
+import numpy as np
+
+MANIFEST_NODE = 'stash:manifest'
+MANIFEST_VERSION = 1
+
+
+def new_manifest():
+    return {'version': MANIFEST_VERSION, 'variables': {}}
+
+
+def write_manifest(handle, manifest):
+    """
+    Write or replace the manifest in an open PyTables file
+    """
+    encoded = json.dumps(manifest, sort_keys=True).encode('utf-8')
+    if MANIFEST_NODE in handle.root:
+        handle.remove_node('/', MANIFEST_NODE)
+    handle.create_array('/', MANIFEST_NODE,
+                        obj=np.frombuffer(encoded, dtype=np.uint8))
+
+
+def read_manifest(handle):
+    """
+    Read the manifest from an open PyTables file, or None if there is none
+    """
+    if MANIFEST_NODE not in handle.root:
+        return None
+    encoded = handle.get_node('/', MANIFEST_NODE).read()
+    return json.loads(encoded.tobytes().decode('utf-8'))
+
+
+def iter_objects(entry):
+    """
+    Entries of the pandas objects, arrays and pickled objects stored for a
+    variable, which are nested in the structure of containers
+    """
+    if 'structure' in entry:
+        stack = [entry['structure']]
+        while stack:
+            item = stack.pop()
+            if 'container' in item:
+                stack.extend(reversed(item['items']))
+            elif 'node' in item:
+                yield item
+    elif entry.get('kind') in ('pandas', 'numpy', 'pickle'):
+        yield entry
@@ -0,0 +1,202 @@
+"""
+Stashes held in memory
+
+A stash written with ``to='memory'`` is built by the HDF5 core driver
+without a backing file and returned as the bytes of the complete, compressed
+file, which ``unstash`` reads directly.  The bytes can be kept as an undo
+checkpoint or sent to another process, and written to disk they are an
+ordinary stash file.
+"""
+from collections import deque
+import sys
+import uuid
+
+import pandas as pd
+
+TARGETS = ('file', 'memory')
+MEMORY_DRIVER = 'H5FD_CORE'
+DEFAULT_CHECKPOINTS = 5
+
+
+def is_buffer(obj):
+    """
+    Check whether obj holds a stash in memory rather than the path of one
+    """
+    return (isinstance(obj, (bytes, bytearray, memoryview)) and
+            not isinstance(obj, str))
+
+
+def open_memory_store(buffer=None, mode='r', **kwargs):
+    """
+    Open an HDFStore held in memory
+
+    Parameters
+    ----------
+    buffer: bytes-like, optional
+        Contents of a stash to read.  A new, empty store is created if
+        omitted.
+    mode: str, optional
+        Mode used to open the store
+    kwargs: optional
+        Other arguments of HDFStore, such as complib and complevel
+
+    Returns
+    -------
+    store : HDFStore
+    """
+    if buffer is not None and not isinstance(buffer, bytes):
+        buffer = bytes(buffer)
+    # The name is only a label, unique so that PyTables does not treat
+    # stores open at the same time as the same file
+    name = 'memory-{0}.h5'.format(uuid.uuid4().hex)
+    return pd.HDFStore(name, mode=mode, driver=MEMORY_DRIVER,
+                       driver_core_image=buffer,
+                       driver_core_backing_store=0, **kwargs)
+
+
+class CheckpointRing(object):
+    """
+    Bounded ring of in-memory checkpoints used to undo changes to a
+    namespace
+
+    Parameters
+    ----------
+    size: int, optional
+        Number of checkpoints kept.  The oldest is dropped when a checkpoint
+        is added to a full ring.
+    options: optional
+        Other arguments of ``stash`` used for every checkpoint, such as
+        include, exclude or fallback
+
+    Examples
+    --------
+    >>> ring = CheckpointRing(size=3)
+    >>> ring.checkpoint()
+    >>> df = risky_step(df)
+    >>> ring.undo()
+    """
+
+    def __init__(self, size=DEFAULT_CHECKPOINTS, **options):
+        if int(size) != size or size < 1:
+            raise ValueError('size must be a positive integer.')
+        for key in ('path', 'frame', 'to', 'verbose', 'shards'):
+            if key in options:
+                raise TypeError('{0} cannot be used with '
+                                'CheckpointRing.'.format(key))
+        self._checkpoints = deque(maxlen=int(size))
+        self._options = options
+
+    def __len__(self):
+        return len(self._checkpoints)
+
+    @property
+    def size(self):
+        """
+        Number of checkpoints kept
+        """
+        return self._checkpoints.maxlen
+
+    @property
+    def labels(self):
+        """
+        Labels of the checkpoints, oldest first
+        """
+        return [label for label, _ in self._checkpoints]
+
+    @property
+    def nbytes(self):
+        """
+        Bytes used by the checkpoints
+        """
+        return sum(len(buffer) for _, buffer in self._checkpoints)
+
+    def checkpoint(self, frame=None, label=None):
+        """
+        Add a checkpoint of the variables in frame
+
+        Parameters
+        ----------
+        frame: dict-like, optional
+            Dictionary-like structure holding the variables.  Uses the frame
+            of the calling namespace if not given.
+        label: str, optional
+            Label of the checkpoint
+        """
+        from . import stash
+
+        if frame is None:
+            frame = sys._getframe(1).f_globals
+        buffer = stash(frame=frame, to='memory', verbose=False,
+                       **self._options)
+        self._checkpoints.append((label, buffer))
+
+    def buffer(self, checkpoint=-1):
+        """
+        Stash held by a checkpoint, which can be passed to ``unstash``
+
+        Parameters
+        ----------
+        checkpoint: int, optional
+            Position of the checkpoint, oldest first.  Defaults to the most
+            recent.
+
+        Returns
+        -------
+        buffer : bytes
+        """
+        if not self._checkpoints:
+            raise IndexError('No checkpoints have been taken.')
+        return self._checkpoints[checkpoint][1]
+
+    def restore(self, checkpoint=-1, frame=None):
+        """
+        Restore the variables held by a checkpoint, overwriting their
+        current values.  Variables created after the checkpoint are kept.
+
+        Parameters
+        ----------
+        checkpoint: int, optional
+            Position of the checkpoint, oldest first.  Defaults to the most
+            recent.
+        frame: dict-like, optional
+            Dictionary-like structure to restore into.  Uses the frame of
+            the calling namespace if not given.
+
+        Returns
+        -------
+        vault : Vault
+            The restored variables
+        """
+        from . import unstash
+
+        if frame is None:
+            frame = sys._getframe(1).f_globals
+        return unstash(self.buffer(checkpoint), frame=frame, overwrite=True,
+                       verbose=False)
+
+    def undo(self, frame=None):
+        """
+        Restore the most recent checkpoint and remove it from the ring
+
+        Parameters
+        ----------
+        frame: dict-like, optional
+            Dictionary-like structure to restore into.  Uses the frame of
+            the calling namespace if not given.
+
+        Returns
+        -------
+        vault : Vault
+            The restored variables
+        """
+        if frame is None:
+            frame = sys._getframe(1).f_globals
+        vault = self.restore(-1, frame)
+        self._checkpoints.pop()
+        return vault
+
+    def clear(self):
+        """
+        Remove all checkpoints
+        """
+        self._checkpoints.clear()
@@ -0,0 +1,71 @@
+"""
+Pickling of objects that are not otherwise supported
+
+Objects are pickled with protocol 5.  Large buffers, such as
+the data of numpy arrays held by an object, are passed out-of-band and each
+is written to its own compressed uint8 dataset without being copied into the
+pickle.  When loading, the datasets read are handed back to pickle so that
+the arrays are rebuilt as views of them.
+"""
+import pickle
+
+import numpy as np
+
+PICKLE_PROTOCOL = 5
+PAYLOAD_NODE = 'payload'
+
+
+def dumps(obj):
+    """
+    Pickle obj
+
+    Returns
+    -------
+    payload : ndarray
+        uint8 view of the pickle
+    buffers : list of ndarray
+        uint8 views of the buffers passed out-of-band
+    """
+    buffers = []
+    payload = pickle.dumps(obj, protocol=PICKLE_PROTOCOL,
+                           buffer_callback=buffers.append)
+    buffers = [np.frombuffer(buf.raw(), dtype=np.uint8) for buf in buffers]
+    return np.frombuffer(payload, dtype=np.uint8), buffers
+
+
+def write_pickle(handle, where, name, payload, buffers, filters):
+    """
+    Write a pickle and its out-of-band buffers to a group in an open PyTables
+    file
+    """
+    group = handle.create_group(where, name, createparents=True)
+    handle.create_array(group, PAYLOAD_NODE, obj=payload)
+    for i, buf in enumerate(buffers):
+        if buf.size == 0:
+            handle.create_array(group, 'b' + str(i), obj=buf)
+        else:
+            handle.create_carray(group, 'b' + str(i), obj=buf,
+                                 filters=filters)
+    group._v_attrs.stash_buffers = len(buffers)
+    return group
+
+
+def read_pickle_parts(group):
+    """
+    Pickle and out-of-band buffers held in a group
+    """
+    payload = group._f_get_child(PAYLOAD_NODE).read()
+    buffers = [group._f_get_child('b' + str(i)).read()
+               for i in range(int(group._v_attrs.stash_buffers))]
+    return payload, buffers
+
+
+def loads(payload, buffers):
+    """
+    Unpickle an object from its pickle and out-of-band buffers
+    """
+    return pickle.loads(payload, buffers=buffers)
+
+
+def read_pickle(group):
+    return loads(*read_pickle_parts(group))
@@ -0,0 +1,206 @@
+"""
+Selection of the variables to stash from large namespaces
+
+Names are matched against include and exclude patterns by a single compiled
+matcher: exact names are looked up in a set, and wildcard patterns are
+grouped by the literal text they start with and each group is combined into
+one regular expression that is only tried on names starting with that text.
+Selecting from a namespace therefore takes one pass over its names, and the
+time taken barely grows with the number of patterns.  When only exact
+names are included they are looked up directly, without scanning the
+namespace at all.  Compiled regular expressions can be given alongside
+names and patterns, and variables can also be selected by type and size,
+which are only checked for the names that match.
+"""
+from collections import ChainMap, defaultdict
+from collections.abc import Mapping
+from fnmatch import translate
+import re
+
+from .vault import _nbytes
+
+WILDCARD = '*'
+_PATTERN_TYPE = type(re.compile(''))
+# Text of a pattern before its first special character
+_LITERAL_PREFIX = re.compile(r'[^*?[]*')
+
+
+def _compile(patterns):
+    return re.compile('|'.join(translate(pattern)
+                               for pattern in patterns)).match
+
+
+def namespace(frame):
+    """
+    Mapping holding the variables of one or more namespaces
+
+    Parameters
+    ----------
+    frame: Mapping or sequence of Mapping
+        Namespace, such as globals(), or a sequence of namespaces, such as
+        ``[locals(), globals()]``.  Earlier namespaces take precedence over
+        later ones for names defined in several.
+
+    Returns
+    -------
+    namespace : Mapping
+    """
+    if isinstance(frame, Mapping):
+        return frame
+    if (isinstance(frame, (list, tuple)) and frame and
+            all(isinstance(item, Mapping) for item in frame)):
+        return frame[0] if len(frame) == 1 else ChainMap(*frame)
+    raise TypeError('frame must be a mapping or a sequence of mappings if '
+                    'provided.')
+
+
+class NameMatcher(object):
+    """
+    Match names against exact names, wildcard patterns and regular expressions
+
+    Parameters
+    ----------
+    patterns: iterable of str or compiled regular expressions
+        Names, wildcard patterns containing ``*`` (e.g. ``ap*le``) and
+        regular expressions, which match if they match anywhere in a name
+    """
+
+    def __init__(self, patterns):
+        if isinstance(patterns, (str, _PATTERN_TYPE)):
+            patterns = [patterns]
+        names = {}
+        prefixed = defaultdict(list)
+        wildcards = []
+        self.regexes = []
+        for pattern in patterns:
+            if isinstance(pattern, _PATTERN_TYPE):
+                self.regexes.append(pattern)
+            elif WILDCARD in pattern:
+                prefix = _LITERAL_PREFIX.match(pattern).group()
+                if prefix:
+                    prefixed[prefix].append(pattern)
+                else:
+                    wildcards.append(pattern)
+            else:
+                names[pattern] = None
+        # Ordered so that names are selected in the order given
+        self.names = list(names)
+        self._names = frozenset(names)
+        # Matchers of the patterns starting with each prefix, keyed by the
+        # length of the prefix and then the prefix
+        by_length = defaultdict(dict)
+        for prefix, group in prefixed.items():
+            by_length[len(prefix)][prefix] = _compile(group)
+        self._prefixed = sorted(by_length.items())
+        self._wildcards = _compile(wildcards) if wildcards else None
+
+    @property
+    def exact(self):
+        """
+        Flag indicating whether only exact names are matched
+        """
+        return not (self._prefixed or self._wildcards or self.regexes)
+
+    def __call__(self, name):
+        if name in self._names:
+            return True
+        for length, matchers in self._prefixed:
+            match = matchers.get(name[:length])
+            if match is not None and match(name):
+                return True
+        if self._wildcards is not None and self._wildcards(name):
+            return True
+        return any(regex.search(name) for regex in self.regexes)
+
+
+class Selector(object):
+    """
+    Select variables from a namespace by name, type and size
+
+    Parameters
+    ----------
+    include: iterable of str or compiled regular expressions, optional
+        Names, wildcard patterns or regular expressions of the variables to
+        select
+    exclude: iterable of str or compiled regular expressions, optional
+        Names, wildcard patterns or regular expressions of the variables not
+        to select.  Ignored if include is given.
+    private: bool, optional
+        Flag indicating whether to select variables starting with underscore
+    types: type or tuple of types, optional
+        Only variables that are instances of these types are selected
+    max_nbytes: int, optional
+        Variables using more than this many bytes are not selected
+    """
+
+    def __init__(self, include=None, exclude=None, private=False, types=None,
+                 max_nbytes=None):
+        self._include = None if include is None else NameMatcher(include)
+        self._exclude = None
+        if include is None and exclude is not None:
+            self._exclude = NameMatcher(exclude)
+        self._private = private
+        if isinstance(types, list):
+            types = tuple(types)
+        self._types = types
+        if max_nbytes is not None and max_nbytes < 0:
+            raise ValueError('max_nbytes must be non-negative.')
+        self._max_nbytes = max_nbytes
+
+    def names(self, frame):
+        """
+        Names of the variables in frame selected by name
+
+        Parameters
+        ----------
+        frame: Mapping
+
+        Returns
+        -------
+        names : list of str
+        """
+        include = self._include
+        exclude = self._exclude
+        if include is not None and include.exact:
+            candidates = [name for name in include.names if name in frame]
+        else:
+            candidates = frame.keys()
+        private = self._private
+        selected = []
+        for name in candidates:
+            # Only names that can name a node are stashed
+            if not isinstance(name, str):
+                continue
+            if not private and name.startswith('_'):
+                continue
+            if include is not None and not include(name):
+                continue
+            if exclude is not None and exclude(name):
+                continue
+            selected.append(name)
+        return selected
+
+    def select(self, frame):
+        """
+        Variables in frame selected by name, type and size
+
+        Parameters
+        ----------
+        frame: Mapping
+
+        Returns
+        -------
+        selected : list of tuple
+            Names and values of the selected variables
+        """
+        types = self._types
+        max_nbytes = self._max_nbytes
+        selected = []
+        for name in self.names(frame):
+            value = frame[name]
+            if types is not None and not isinstance(value, types):
+                continue
+            if max_nbytes is not None and _nbytes(value) > max_nbytes:
+                continue
+            selected.append((name, value))
+        return selected
@@ -0,0 +1,329 @@
+"""
+Sharded stashes written in parallel
+
+A sharded stash is a directory holding an index and a number of shards,
+each an ordinary stash file holding some of the variables.  Variables are
+assigned to the shard holding the fewest bytes and keep their shard when
+the stash is written again, so only the shards holding changed variables
+are rewritten.  Shards are written by a pool of worker processes, which
+inherit the variables to write when processes are forked.  Shards are read
+one after another in the calling process: HDF5 reads are serialized within
+a process, and pickling the vaults read back from worker processes costs
+more than reading in parallel saves.
+"""
+from collections import defaultdict
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+
+import numpy as np
+import tables
+
+from . import stash
+from .codec import CODEC_TYPES
+from .concurrency import hdf5_lock
+from .hashing import hash_scalar, hash_variable
+from .io import (PANDAS_TYPES, SCALAR_TYPES_LIST, VARIABLE_KINDS, Loader,
+                 Saver, _is_supported_array, _print_detailed_info)
+from .manifest import read_manifest
+from .store import _makedirs
+from .sync import publish, temp_path
+from .vault import Vault, _nbytes
+
+DEFAULT_DIRECTORY = 'workspace'
+INDEX_FILE = 'index.json'
+INDEX_VERSION = 1
+SHARD_NAME = 'shard-{0:04d}.h5'
+
+# Variables being written, set in each worker before shards are written.
+# Thread-local, so that threads writing sharded stashes at the same time in
+# one process each write their own variables.
+_STATE = threading.local()
+
+
+def _set_frame(frame):
+    _STATE.frame = frame
+
+
+def is_sharded(path):
+    """
+    Check whether path is the directory of a sharded stash
+    """
+    return path is not None and os.path.isfile(os.path.join(path, INDEX_FILE))
+
+
+def read_index(path):
+    with open(os.path.join(path, INDEX_FILE)) as index_file:
+        return json.load(index_file)
+
+
+def write_index(path, index):
+    """
+    Atomically write or replace the index of a sharded stash
+    """
+    target = os.path.join(path, INDEX_FILE)
+    temp = temp_path(target)
+    with open(temp, 'w') as index_file:
+        json.dump(index, index_file, sort_keys=True)
+    publish(temp, target)
+
+
+def _name_hash(name):
+    return int(hashlib.sha1(name.encode('utf-8')).hexdigest()[:8], 16)
+
+
+def _options_key(options):
+    """
+    Digest of the options shards are written with, such as compression,
+    chunk layout and downcasting, which change a shard without changing
+    its variables
+    """
+    encoded = json.dumps(options, sort_keys=True, default=repr)
+    return hashlib.sha1(encoded.encode('utf-8')).hexdigest()
+
+
+def assign_shards(sizes, nshards, previous=None):
+    """
+    Assign variables to shards so that each holds a similar number of bytes
+
+    Parameters
+    ----------
+    sizes: dict
+        Number of bytes used by each variable
+    nshards: int
+        Number of shards
+    previous: dict, optional
+        Shard of each variable in an existing stash.  These variables keep
+        their shard so that unchanged shards are not rewritten.
+
+    Returns
+    -------
+    shards : dict
+        Shard of each variable
+    """
+    previous = previous or {}
+    assigned = {}
+    loads = [0] * nshards
+    for name, shard in previous.items():
+        if name in sizes and shard < nshards:
+            assigned[name] = shard
+            loads[shard] += sizes[name]
+    new = sorted((name for name in sizes if name not in assigned),
+                 key=lambda name: (-sizes[name], name))
+    for name in new:
+        # Ties are broken by a hash of the name, spreading small variables
+        offset = _name_hash(name)
+        shard = min(range(nshards),
+                    key=lambda i: (loads[i], (i - offset) % nshards))
+        assigned[name] = shard
+        loads[shard] += sizes[name]
+    return assigned
+
+
+def _fingerprint(obj):
+    """
+    Content hash used to detect unchanged variables, or None if a variable
+    cannot be hashed without being written
+    """
+    if isinstance(obj, PANDAS_TYPES + CODEC_TYPES) or (
+            isinstance(obj, np.ndarray) and _is_supported_array(obj)):
+        digest = hash_variable(obj)
+    elif isinstance(obj, SCALAR_TYPES_LIST):
+        digest = hash_scalar(obj)
+    else:
+        digest = None
+    return None if digest is None else digest['hash']
+
+
+def _write_shard(task):
+    """
+    Write a shard unless it holds the same variables with the same content
+    as before
+    """
+    path, names, previous, options = task
+    selected = _STATE.frame
+    fingerprints = dict((name, _fingerprint(selected[name]))
+                        for name in names)
+    unchanged = (previous is not None and os.path.exists(path) and
+                 sorted(previous) == sorted(names) and
+                 all(fingerprints[name] is not None and
+                     fingerprints[name] == previous[name] for name in names))
+    if not unchanged:
+        frame = dict((name, selected[name]) for name in names)
+        stash(path, frame=frame, include=names, private=True, verbose=False,
+              **options)
+    with hdf5_lock(), tables.open_file(path, mode='r') as h5f:
+        variables = read_manifest(h5f)['variables']
+    return fingerprints, variables, not unchanged
+
+
+def _map(function, tasks, workers, initializer=None, initargs=()):
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    workers = max(1, min(workers, len(tasks)))
+    if workers == 1:
+        if initializer is not None:
+            initializer(*initargs)
+        return [function(task) for task in tasks]
+    pool = multiprocessing.Pool(workers, initializer, initargs)
+    try:
+        return pool.map(function, tasks)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _label(entry):
+    return entry.get('type', entry.get('dtype'))
+
+
+def stash_shards(path, frame, shards=None, workers=None, verbose=True,
+                 **options):
+    """
+    Save variables to a sharded stash
+
+    Parameters
+    ----------
+    path: str
+        Directory of the stash.  If omitted uses ./workspace
+    frame: Mapping or sequence of Mapping
+        Mapping holding the variables, or a sequence of mappings where
+        earlier mappings take precedence
+    shards: int, optional
+        Number of shards.  Defaults to the number used by an existing stash
+        at path.  Changing it reassigns every variable.
+    workers: int, optional
+        Number of worker processes.  Defaults to the number of CPUs.
+    verbose: bool, optional
+        Flag indicating whether to display information about variables stored
+    options: optional
+        Other arguments of ``stash``, which are used for every shard
+    """
+    path = DEFAULT_DIRECTORY if path is None else path
+    index = read_index(path) if is_sharded(path) else None
+    if shards is None:
+        if index is None:
+            raise ValueError('shards must be given when creating a sharded '
+                             'stash.')
+        shards = len(index['shards'])
+    if int(shards) != shards or shards < 1:
+        raise ValueError('shards must be a positive integer.')
+    shards = int(shards)
+    if index is not None and len(index['shards']) != shards:
+        index = None
+    previous = {}
+    if index is not None:
+        previous = dict((name, entry['shard'])
+                        for name, entry in index['variables'].items())
+
+    saver = Saver(path, frame=frame, verbose=False, **options)
+    names = sorted(saver.selection())
+    selected = dict((name, saver._frame[name]) for name in names)
+    sizes = dict((name, _nbytes(selected[name])) for name in names)
+    assigned = assign_shards(sizes, shards, previous)
+
+    shard_options = dict((key, value) for key, value in options.items()
+                         if key not in ('include', 'exclude', 'private',
+                                        'types', 'max_nbytes'))
+    options_key = _options_key(shard_options)
+    # Shards written with other options are rewritten even if unchanged
+    reuse = index is not None and index.get('options') == options_key
+    _makedirs(path)
+    tasks = []
+    for shard in range(shards):
+        shard_names = sorted(name for name in names
+                             if assigned[name] == shard)
+        shard_previous = None
+        if reuse:
+            shard_previous = dict(
+                (name, entry.get('hash'))
+                for name, entry in index['variables'].items()
+                if entry['shard'] == shard)
+        tasks.append((os.path.join(path, SHARD_NAME.format(shard)),
+                      shard_names, shard_previous, shard_options))
+    try:
+        results = _map(_write_shard, tasks, workers, _set_frame, (selected,))
+    finally:
+        _set_frame({})
+
+    new_index = {'version': INDEX_VERSION,
+                 'shards': [SHARD_NAME.format(shard)
+                            for shard in range(shards)],
+                 'options': options_key,
+                 'variables': {}}
+    variables = dict([(key, defaultdict(list)) for key in VARIABLE_KINDS])
+    for shard, (fingerprints, entries, _) in enumerate(results):
+        for name, fingerprint in fingerprints.items():
+            new_index['variables'][name] = {'shard': shard,
+                                            'hash': fingerprint,
+                                            'nbytes': sizes[name]}
+        for name, entry in entries.items():
+            variables[entry['kind']][_label(entry)].append(name)
+    write_index(path, new_index)
+    # Shards left by a stash with more shards
+    for name in os.listdir(path):
+        if (name.startswith('shard-') and name.endswith('.h5') and
+                name not in new_index['shards']):
+            os.remove(os.path.join(path, name))
+    if verbose:
+        _print_detailed_info('Variables Saved', variables)
+
+
+def _load_shard(task):
+    path, max_bytes, lazy, store_dir, downcast, restore_dtypes = task
+    loader = Loader(path, insert=False, frame={}, verbose=False,
+                    max_bytes=max_bytes, lazy=lazy, store_dir=store_dir,
+                    downcast=downcast, restore_dtypes=restore_dtypes)
+    vault = loader.load()
+    variables = dict((kind, dict(labels))
+                     for kind, labels in loader._variables.items())
+    return vault, variables
+
+
+def unstash_shards(path=None, insert=True, frame=None, overwrite=False,
+                   verbose=True, max_bytes=None, lazy=False, store_dir=None,
+                   downcast=None, restore_dtypes=False):
+    """
+    Load a sharded stash
+
+    Parameters are those of ``unstash``.  Shards are read one after
+    another.  When reading is deferred by ``lazy`` or ``max_bytes``, each
+    variable is read from its shard when first accessed.
+
+    Returns
+    -------
+    vault : Vault
+        dict-like object that supports tab completion for keys in IPython
+    """
+    path = DEFAULT_DIRECTORY if path is None else path
+    if max_bytes is not None and insert:
+        raise ValueError('max_bytes requires insert=False since values '
+                         'inserted into frame cannot be evicted.')
+    if lazy and insert:
+        raise ValueError('lazy requires insert=False since values '
+                         'inserted into frame are read at once.')
+    index = read_index(path)
+    tasks = [(os.path.join(path, name), max_bytes, lazy, store_dir,
+              downcast, restore_dtypes) for name in index['shards']]
+    results = [_load_shard(task) for task in tasks]
+
+    vault = Vault(max_bytes=max_bytes)
+    variables = dict([(key, defaultdict(list)) for key in VARIABLE_KINDS])
+    for shard_vault, shard_variables in results:
+        for key in shard_vault:
+            if key in shard_vault._sources:
+                vault._set_lazy(key, shard_vault._sources[key])
+            else:
+                vault[key] = dict.__getitem__(shard_vault, key)
+        for kind, labels in shard_variables.items():
+            for label, names in labels.items():
+                variables[kind][label].extend(names)
+    if insert:
+        for key in vault:
+            if overwrite or key not in frame:
+                frame[key] = vault[key]
+    if verbose:
+        _print_detailed_info('Variables Loaded', variables)
+    return vault
@@ -0,0 +1,188 @@
+"""
+Content-addressed object store shared by many stash files
+
+Each pandas object or numpy array is written once to a blob file named by
+the hash of its content.  Stash files written with a store only hold their
+manifest, which references the blobs, and the built-in scalars.  Every
+stash that uses a store registers itself under ``refs`` so that blobs that
+are no longer referenced can be found by ``stash_gc``.
+"""
+import errno
+import hashlib
+import os
+import time
+import uuid
+
+OBJECTS_DIR = 'objects'
+REFS_DIR = 'refs'
+BLOB_EXTENSION = '.h5'
+# Blobs younger than this are never collected since the stash referencing
+# them may still be being written
+DEFAULT_GRACE = 3600
+
+
+def _makedirs(path):
+    try:
+        os.makedirs(path)
+    except OSError as exc:
+        if exc.errno != errno.EEXIST:
+            raise
+
+
+class ObjectStore(object):
+    """
+    Directory of blobs keyed by content hash
+
+    Parameters
+    ----------
+    path: str
+        Directory holding the store.  Created if it does not exist.
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+
+    def blob_path(self, digest):
+        """
+        Path of the blob holding content with a given hash
+        """
+        return os.path.join(self.path, OBJECTS_DIR, digest[:2],
+                            digest[2:] + BLOB_EXTENSION)
+
+    def put(self, digest, write):
+        """
+        Store a blob unless one with the same hash is already present
+
+        Parameters
+        ----------
+        digest: str
+            Content hash of the blob
+        write: callable
+            Function that writes the blob to the path it is called with
+
+        Returns
+        -------
+        written : bool
+            True if the blob was written, False if it was already present
+        """
+        path = self.blob_path(digest)
+        if os.path.exists(path):
+            # Refresh so that a concurrent stash_gc sees the blob as in use
+            os.utime(path, None)
+            return False
+        _makedirs(os.path.dirname(path))
+        temp = '{0}.{1}.tmp'.format(path, uuid.uuid4().hex)
+        try:
+            write(temp)
+            os.replace(temp, path)
+        finally:
+            if os.path.exists(temp):
+                os.remove(temp)
+        return True
+
+    def _ref_path(self, stash_path):
+        stash_path = os.path.abspath(stash_path)
+        name = hashlib.sha1(stash_path.encode('utf-8')).hexdigest()
+        return os.path.join(self.path, REFS_DIR, name)
+
+    def add_ref(self, stash_path):
+        """
+        Register a stash file that references blobs in the store
+        """
+        ref = self._ref_path(stash_path)
+        if os.path.exists(ref):
+            return
+        _makedirs(os.path.dirname(ref))
+        with open(ref, 'w') as ref_file:
+            ref_file.write(os.path.abspath(stash_path))
+
+    def refs(self):
+        """
+        Paths of the ref files and the stash files they point to
+        """
+        refs_dir = os.path.join(self.path, REFS_DIR)
+        if not os.path.isdir(refs_dir):
+            return []
+        refs = []
+        for name in sorted(os.listdir(refs_dir)):
+            ref = os.path.join(refs_dir, name)
+            with open(ref) as ref_file:
+                refs.append((ref, ref_file.read().strip()))
+        return refs
+
+    def blobs(self):
+        """
+        Hashes and paths of all blobs in the store
+        """
+        objects_dir = os.path.join(self.path, OBJECTS_DIR)
+        if not os.path.isdir(objects_dir):
+            return []
+        blobs = []
+        for prefix in sorted(os.listdir(objects_dir)):
+            directory = os.path.join(objects_dir, prefix)
+            for name in sorted(os.listdir(directory)):
+                if not name.endswith(BLOB_EXTENSION):
+                    continue
+                digest = prefix + name[:-len(BLOB_EXTENSION)]
+                blobs.append((digest, os.path.join(directory, name)))
+        return blobs
+
+
+def _referenced_blobs(stash_path, store_path):
+    """
+    Hashes of the blobs in a store referenced by a stash, or None if the
+    stash no longer uses the store
+    """
+    import tables
+    from .concurrency import hdf5_lock
+    from .manifest import iter_objects, read_manifest
+
+    with hdf5_lock(), tables.open_file(stash_path, mode='r') as h5f:
+        manifest = read_manifest(h5f)
+    if manifest is None or manifest.get('store_dir') != store_path:
+        return None
+    return set(item['blob'] for entry in manifest['variables'].values()
+               for item in iter_objects(entry) if item.get('blob') is not None)
+
+
+def stash_gc(store_dir, grace=DEFAULT_GRACE, dry_run=False):
+    """
+    Remove blobs from a store that are not referenced by any stash
+
+    Parameters
+    ----------
+    store_dir: str
+        Directory of the store used with ``stash(..., store_dir=store_dir)``
+    grace: float, optional
+        Blobs modified within this many seconds are kept even if they are
+        not referenced, so that a stash that is being written is not broken.
+    dry_run: bool, optional
+        Flag indicating whether to only report the blobs that would be
+        removed
+
+    Returns
+    -------
+    removed : list of str
+        Paths of the blobs removed
+    """
+    store = ObjectStore(store_dir)
+    referenced = set()
+    for ref, stash_path in store.refs():
+        blobs = None
+        if os.path.exists(stash_path):
+            blobs = _referenced_blobs(stash_path, store.path)
+        if blobs is None:
+            if not dry_run:
+                os.remove(ref)
+            continue
+        referenced.update(blobs)
+
+    cutoff = time.time() - grace
+    removed = []
+    for digest, path in store.blobs():
+        if digest in referenced or os.path.getmtime(path) > cutoff:
+            continue
+        if not dry_run:
+            os.remove(path)
+        removed.append(path)
+    return removed
@@ -0,0 +1,438 @@
+"""
+Stashing variables supplied as a stream of chunks, and reading variables
+back in chunks
+
+Chunks of pandas objects are appended to a table and chunks of numpy arrays
+to an extendable dataset, so a variable that never exists in memory as a
+whole is stored exactly as if it had been stashed in one piece.
+"""
+from functools import partial
+from itertools import chain
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import tables
+
+from .arrays import (append_array, create_extendable_array, decode_array,
+                     dtype_label)
+from .codec import is_codec_node
+from .concurrency import hdf5_lock
+from .hashing import (BLOCK_ROWS, array_block_rows, hash_array_blocks,
+                      hash_pandas_blocks)
+from .io import (DEFAULT_PATH, PANDAS_TYPES, READ_BYTES,
+                 _as_stored, _is_supported_array, _read_pandas,
+                 _same_schema)
+from .manifest import (MANIFEST_NODE, new_manifest, read_manifest,
+                       write_manifest)
+from .store import ObjectStore
+from .sync import publish, temp_path
+from .vault import _nbytes
+
+from queue import Full, Queue
+
+# Node holding a stream until it is complete
+STREAM_PREFIX = 'stream:'
+# Seconds between checks that the consumer of a prefetched stream is alive
+_PUT_TIMEOUT = 0.1
+_END = object()
+
+
+def _put(queue, item, stopped):
+    while not stopped.is_set():
+        try:
+            queue.put(item, timeout=_PUT_TIMEOUT)
+            return True
+        except Full:
+            continue
+    return False
+
+
+def _prefetch(chunks):
+    """
+    Iterate over chunks, producing the next chunk in a background thread
+    while the current one is written
+    """
+    results = Queue(maxsize=1)
+    stopped = threading.Event()
+
+    def produce():
+        try:
+            for chunk in chunks:
+                if not _put(results, (chunk, None), stopped):
+                    return
+            _put(results, (_END, None), stopped)
+        except BaseException as exc:
+            _put(results, (None, exc), stopped)
+
+    thread = threading.Thread(target=produce)
+    thread.daemon = True
+    thread.start()
+    try:
+        while True:
+            chunk, exc = results.get()
+            if exc is not None:
+                raise exc
+            if chunk is _END:
+                return
+            yield chunk
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def _rows(obj, start, stop):
+    if isinstance(obj, PANDAS_TYPES):
+        return obj.iloc[start:stop]
+    return obj[start:stop]
+
+
+def _concat(parts):
+    if len(parts) == 1:
+        return parts[0]
+    if isinstance(parts[0], PANDAS_TYPES):
+        return pd.concat(parts)
+    return np.concatenate(parts)
+
+
+def _blocks(chunks, rows):
+    """
+    Regroup consecutive chunks into the consecutive blocks of rows that are
+    hashed
+    """
+    pending = []
+    count = 0
+    for chunk in chunks:
+        start = 0
+        while start < chunk.shape[0]:
+            stop = min(chunk.shape[0], start + rows - count)
+            pending.append(_rows(chunk, start, stop))
+            count += stop - start
+            start = stop
+            if count == rows:
+                yield _concat(pending)
+                pending = []
+                count = 0
+    if pending:
+        yield _concat(pending)
+
+
+def _same_kind(first, chunk):
+    if isinstance(first, PANDAS_TYPES):
+        return (type(chunk) is type(first) and
+                _same_schema(first.iloc[:0], chunk.iloc[:0]))
+    return (isinstance(chunk, np.ndarray) and chunk.dtype == first.dtype and
+            chunk.shape[1:] == first.shape[1:])
+
+
+def _open(path, kwargs):
+    """
+    Open a stash to add a variable to, returning the store, its manifest and
+    the temporary path to publish if it is new
+    """
+    if os.path.exists(path):
+        store = pd.HDFStore(path, mode='a', **kwargs)
+        manifest = read_manifest(store._handle)
+        if manifest is not None:
+            # Removed until the update is complete, as in Saver
+            store._handle.remove_node('/', MANIFEST_NODE)
+            store._handle.flush()
+            return store, manifest, None
+        empty = not store._handle.root._v_children
+        store.close()
+        if not empty:
+            raise ValueError('{0} has no manifest, so variables cannot be '
+                             'added to it.  Stashes written by older '
+                             'versions must be stashed again.'.format(path))
+    temp = temp_path(path)
+    return pd.HDFStore(temp, mode='w', **kwargs), new_manifest(), temp
+
+
+def _remove_variable(store, manifest, name):
+    """
+    Remove a variable from an open stash and its manifest
+    """
+    entry = manifest['variables'].pop(name, None)
+    if entry is None or entry.get('blob') is not None:
+        return
+    if entry['kind'] == 'builtin':
+        # Scalars of the same type share a node
+        values = store.get(entry['node']).drop(name)
+        store.remove(entry['node'])
+        if len(values):
+            store.put(entry['node'], values, format='fixed')
+    elif entry['node'] in store._handle:
+        store._handle.remove_node(entry['node'], recursive=True)
+
+
+def _write_stream(store, node, name, first, chunks, checksums, filters,
+                  min_itemsize, expectedrows):
+    """
+    Write a stream of chunks to node and return its manifest entry
+    """
+    if isinstance(first, PANDAS_TYPES):
+        entry = {'kind': 'pandas', 'type': type(first).__name__,
+                 'format': 'table'}
+        append = partial(store.append, node, index=False,
+                         min_itemsize=min_itemsize, expectedrows=expectedrows)
+        rows = BLOCK_ROWS
+        hasher = partial(hash_pandas_blocks, _as_stored(first.iloc[:0]),
+                         None)
+    else:
+        entry = {'kind': 'numpy', 'dtype': dtype_label(first.dtype)}
+        with hdf5_lock():
+            array = create_extendable_array(store._handle, '/', node, first,
+                                            filters, expectedrows)
+        append = partial(append_array, array)
+        rows = array_block_rows(first.shape, first.dtype)
+        hasher = partial(hash_array_blocks, (None,) + first.shape[1:],
+                         first.dtype)
+    totals = {'nrows': 0, 'nbytes': 0}
+
+    def write():
+        for i, chunk in enumerate(chain([first], chunks)):
+            if not _same_kind(first, chunk):
+                raise ValueError('Chunk {0} of {1} does not have the type, '
+                                 'columns and dtypes of the first '
+                                 'chunk.'.format(i, name))
+            # Held for each chunk so that the chunks, which may be read from
+            # another stash, are produced without it
+            with hdf5_lock():
+                append(chunk)
+            totals['nrows'] += chunk.shape[0]
+            totals['nbytes'] += _nbytes(chunk, deep=False)
+            yield chunk
+
+    if checksums:
+        blocks = _blocks(write(), rows)
+        digest = hasher(blocks)
+        if digest is not None:
+            entry.update(digest)
+    else:
+        blocks = write()
+    # Chunks left after an unhashable block, or all of them if not hashed
+    for _ in blocks:
+        pass
+    entry['shape'] = [totals['nrows']] + list(first.shape[1:])
+    entry['nbytes'] = totals['nbytes']
+    return entry
+
+
+def stash_stream(path, name, chunks, checksums=False, prefetch=True,
+                 min_itemsize=None, expectedrows=None, **kwargs):
+    """
+    Stash a variable supplied as an iterable of chunks of rows
+
+    Parameters
+    ----------
+    path: str or None
+        Full path of the stash, or None to use ./workspace.h5.  The
+        variable is added to an existing stash, replacing any variable with
+        the same name, and a new stash is created otherwise.  Stashes
+        without a manifest, written by older versions, raise ValueError
+        rather than being replaced.
+    name: str
+        Name of the variable
+    chunks: iterable of {DataFrame, Series, ndarray}
+        Consecutive chunks of rows, e.g. a generator.  All chunks must have
+        the type, columns and dtypes of the first, or for numpy arrays its
+        dtype and shape apart from the number of rows.
+    checksums: bool, optional
+        Flag indicating whether to record content hashes, which are
+        computed as the chunks are written.  ``stash_diff`` computes
+        missing hashes by reading the variable.
+    prefetch: bool, optional
+        Flag indicating whether to produce the next chunk in a background
+        thread while the current one is compressed and written
+    min_itemsize: int or dict, optional
+        Minimum width of string columns of pandas chunks, passed to
+        ``HDFStore.append``.  Needed when later chunks hold longer strings
+        than the first.
+    expectedrows: int, optional
+        Expected total number of rows, which PyTables uses to choose the
+        chunk size of the stored dataset
+    kwargs: optional
+        optional additional arguments to pass to HDFStore when creating the
+        store. Can include values such as compression variables (complib,
+        complevel)
+
+    Notes
+    -----
+    The variable is loaded by ``unstash`` like any other and can be read
+    back in chunks with ``unstash_stream``.  The chunks are written to a
+    temporary node that replaces the variable once the stream is exhausted,
+    so an error raised by the stream leaves an existing stash unchanged.
+    """
+    path = DEFAULT_PATH if path is None else path
+    if 'complib' not in kwargs:
+        kwargs['complib'] = 'blosc'
+    if 'complevel' not in kwargs:
+        kwargs['complevel'] = 1
+    filters = tables.Filters(complevel=kwargs['complevel'],
+                             complib=kwargs['complib'],
+                             fletcher32=kwargs.get('fletcher32', False))
+    chunks = iter(chunks)
+    if prefetch:
+        chunks = _prefetch(chunks)
+    try:
+        first = next(chunks, _END)
+        if first is _END:
+            raise ValueError('chunks of {0} is empty.'.format(name))
+        if not (isinstance(first, PANDAS_TYPES) or
+                (isinstance(first, np.ndarray) and
+                 _is_supported_array(first))):
+            raise TypeError('chunks must be pandas objects or numpy arrays '
+                            'with 1 to 4 dimensions and a supported dtype.')
+        node = STREAM_PREFIX + name
+        with hdf5_lock():
+            store, manifest, temp = _open(path, kwargs)
+        previous = dict(manifest['variables'])
+        try:
+            with hdf5_lock():
+                if node in store._handle.root:  # Left by an interrupted stream
+                    store._handle.remove_node('/', node, recursive=True)
+            entry = _write_stream(store, node, name, first, chunks,
+                                  checksums, filters, min_itemsize,
+                                  expectedrows)
+            with hdf5_lock():
+                if node not in store._handle.root:
+                    raise ValueError('{0} has no rows.'.format(name))
+                prefix = 'pandas:' if entry['kind'] == 'pandas' else 'array:'
+                _remove_variable(store, manifest, name)
+                store._handle.rename_node('/' + node, prefix + name)
+                entry['node'] = '/' + prefix + name
+                manifest['variables'][name] = entry
+                write_manifest(store._handle, manifest)
+        except BaseException:
+            with hdf5_lock():
+                if node in store._handle.root:
+                    store._handle.remove_node('/', node, recursive=True)
+                if temp is None:
+                    manifest['variables'] = previous
+                    write_manifest(store._handle, manifest)
+                store.close()
+            if temp is not None:
+                os.remove(temp)
+            raise
+        with hdf5_lock():
+            store.close()
+        if temp is not None:
+            publish(temp, path)
+    finally:
+        if prefetch:
+            chunks.close()
+
+
+def _locate_node(path, name, store_dir):
+    """
+    Path of the file and name of the node holding a pandas object or numpy
+    array
+    """
+    with hdf5_lock(), tables.open_file(path, mode='r') as h5f:
+        manifest = read_manifest(h5f)
+        if manifest is None:
+            for node in ('/pandas:' + name, '/array:' + name):
+                if node in h5f:
+                    return path, node
+            raise KeyError(name)
+    if name not in manifest['variables']:
+        raise KeyError(name)
+    entry = manifest['variables'][name]
+    if entry['kind'] not in ('pandas', 'numpy'):
+        raise TypeError('{0} is not a pandas object or numpy array and '
+                        'cannot be read in chunks.'.format(name))
+    if entry.get('blob') is None:
+        return path, entry['node']
+    objects = ObjectStore(store_dir or manifest['store_dir'])
+    blob = objects.blob_path(entry['blob'])
+    if not os.path.exists(blob):
+        raise IOError('{0} is missing from the object store {1} '
+                      '(blob {2}).'.format(name, objects.path, entry['blob']))
+    return blob, entry['node']
+
+
+def unstash_stream(path, name, rows=None, store_dir=None):
+    """
+    Read a pandas object or numpy array from a stash in chunks of rows
+
+    Parameters
+    ----------
+    path: str or None
+        Full path of the stash, or None to use ./workspace.h5
+    name: str
+        Name of the variable
+    rows: int, optional
+        Number of rows in each chunk.  Defaults to about 1MB of rows.
+    store_dir: str, optional
+        Directory of the content-addressed store holding the variables of a
+        stash written with ``store_dir``.  Defaults to the directory used
+        when the stash was written.
+
+    Returns
+    -------
+    chunks : generator
+        Generator of consecutive chunks of rows.  The stash is held open
+        until the generator is exhausted or closed.
+
+    Notes
+    -----
+    pandas objects stored in the fixed format, which stashes written by old
+    versions may contain, and indexes, extension arrays and objects with
+    extension dtypes, which are stored by the codec, are read in full and
+    then split into chunks.
+    """
+    path = DEFAULT_PATH if path is None else path
+    path, node = _locate_node(path, name, store_dir)
+    if node.startswith('/pandas'):
+        return _pandas_chunks(path, node, rows)
+    return _array_chunks(path, node, rows)
+
+
+# The lock is held while each chunk is read, not while it is used
+def _pandas_chunks(path, node, rows):
+    with hdf5_lock():
+        store = pd.HDFStore(path, mode='r')
+    try:
+        with hdf5_lock():
+            storer = None
+            if not is_codec_node(store._handle.get_node(node)):
+                storer = store.get_storer(node)
+            if storer is not None and storer.is_table:
+                obj = None
+                nrows = storer.nrows
+                rows = rows or max(1, READ_BYTES // storer.table.rowsize)
+            else:
+                obj = _read_pandas(store, node)
+        if obj is not None:
+            rows = rows or max(1, READ_BYTES * obj.shape[0] //
+                               max(_nbytes(obj), 1))
+            for start in range(0, obj.shape[0], rows):
+                yield _rows(obj, start, start + rows)
+            return
+        for start in range(0, nrows, rows):
+            with hdf5_lock():
+                chunk = store.select(node, start=start, stop=start + rows)
+            yield chunk
+    finally:
+        with hdf5_lock():
+            store.close()
+
+
+def _array_chunks(path, node, rows):
+    with hdf5_lock():
+        h5f = tables.open_file(path, mode='r')
+    try:
+        with hdf5_lock():
+            array = h5f.get_node(node)
+            descr = array.attrs.stash_dtype
+        row_bytes = array.atom.itemsize * int(np.prod(array.shape[1:],
+                                                      dtype=np.int64))
+        rows = rows or max(1, READ_BYTES // max(row_bytes, 1))
+        for start in range(0, array.shape[0], rows):
+            with hdf5_lock():
+                chunk = array[start:start + rows]
+            yield decode_array(chunk, descr)
+    finally:
+        with hdf5_lock():
+            h5f.close()
@@ -0,0 +1,112 @@
+"""
+Atomic publication of stashes and waiting for new ones
+
+A stash is written to a temporary file in the same directory and renamed
+over the target once complete, so readers that open the target only ever
+see a complete stash.  Readers that already have the previous version open
+keep reading it.
+"""
+import os
+import time
+import uuid
+
+
+# Longest wait between checks in wait_for_stash, in seconds
+MAX_POLL = 1.0
+
+
+def temp_path(path):
+    """
+    Path of a temporary file next to path, on the same file system
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    return os.path.join(directory,
+                        '.{0}.{1}.tmp'.format(name, uuid.uuid4().hex))
+
+
+def publish(temp, path):
+    """
+    Atomically replace path with the complete stash in temp
+    """
+    os.replace(temp, path)
+
+
+def stat_signature(path):
+    """
+    Signature of a file that changes when a new version is published
+    """
+    stat = os.stat(path)
+    return stat.st_ino, stat.st_size, stat.st_mtime
+
+
+def check_signature(path, signature):
+    """
+    Raise if path has been replaced since its signature was taken
+    """
+    if signature is not None and stat_signature(path) != signature:
+        raise IOError('{0} has been replaced since it was loaded.  Unstash it '
+                      'again to read the new version.'.format(path))
+
+
+def _is_complete(path):
+    # The manifest is the last node written, so a stash being written in
+    # place by a non-atomic writer does not have one yet
+    import tables
+    from .concurrency import hdf5_lock
+    from .manifest import MANIFEST_NODE
+
+    try:
+        with hdf5_lock(), tables.open_file(path, mode='r') as h5f:
+            return MANIFEST_NODE in h5f.root
+    except (IOError, OSError, tables.HDF5ExtError):
+        return False
+
+
+def wait_for_stash(path, newer_than=None, timeout=None, poll=0.01):
+    """
+    Wait until a complete stash newer than a given time is available
+
+    Parameters
+    ----------
+    path: str
+        Path of the stash
+    newer_than: float or datetime, optional
+        Only return once the stash was modified after this time, given as a
+        POSIX timestamp or a datetime.  Returns as soon as a complete stash
+        exists if omitted.
+    timeout: float, optional
+        Seconds to wait before raising.  Waits indefinitely if omitted.
+    poll: float, optional
+        Initial seconds between checks.  The interval doubles after each
+        check, up to one second, so waiting does not keep a CPU busy.
+
+    Returns
+    -------
+    mtime : float
+        Modification time of the stash, which can be passed as
+        ``newer_than`` to wait for the next version
+
+    Raises
+    ------
+    IOError
+        If no such stash is available before the timeout
+    """
+    if hasattr(newer_than, 'timestamp'):
+        newer_than = newer_than.timestamp()
+    deadline = None if timeout is None else time.time() + timeout
+    while True:
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            mtime = None
+        if (mtime is not None and
+                (newer_than is None or mtime > newer_than) and
+                _is_complete(path)):
+            return mtime
+        if deadline is not None:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise IOError('Timed out waiting for {0}.'.format(path))
+            poll = min(poll, remaining)
+        time.sleep(poll)
+        poll = min(2 * poll, MAX_POLL)
@@ -0,0 +1,107 @@
+import asyncio
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pandas_stash import aio, astash, aunstash, aunstash_iter, stash
+
+
+@pytest.fixture
+def directory():
+    path = tempfile.mkdtemp()
+    yield path
+    shutil.rmtree(path)
+
+
+def _frame(i=0):
+    return {'df': pd.DataFrame({'a': np.arange(1000.0) + i,
+                                'b': ['x', 'y'] * 500}),
+            'arr': np.arange(100) + i, 'x': float(i),
+            'results': {'fits': [np.arange(3) + i]}}
+
+
+def _assert_restored(vault, frame):
+    assert sorted(vault) == sorted(frame)
+    pd.testing.assert_frame_equal(vault['df'], frame['df'])
+    np.testing.assert_array_equal(vault['arr'], frame['arr'])
+    np.testing.assert_array_equal(vault['results']['fits'][0],
+                                  frame['results']['fits'][0])
+    assert vault['x'] == frame['x']
+
+
+class TestAsync(object):
+    def test_round_trip(self, directory):
+        path = os.path.join(directory, 'workspace.h5')
+        frame = _frame()
+
+        async def run():
+            await astash(path, frame=frame)
+            restored = {'x': -1.0}
+            vault = await aunstash(path, frame=restored)
+            return vault, restored
+
+        vault, restored = asyncio.run(run())
+        _assert_restored(vault, frame)
+        assert restored['x'] == -1.0
+        assert sorted(restored) == sorted(frame)
+
+    def test_concurrent(self, directory, monkeypatch):
+        monkeypatch.setattr(aio, 'MAX_PENDING', 2)
+        paths = [os.path.join(directory, 'session-{0}.h5'.format(i))
+                 for i in range(8)]
+        frames = [_frame(i) for i in range(8)]
+        ticks = []
+
+        async def ticker(done):
+            while not done.is_set():
+                ticks.append(None)
+                await asyncio.sleep(0)
+
+        async def run():
+            done = asyncio.Event()
+            tick = asyncio.ensure_future(ticker(done))
+            await asyncio.gather(*[astash(path, frame=frame)
+                                   for path, frame in zip(paths, frames)])
+            vaults = await asyncio.gather(*[aunstash(path)
+                                            for path in paths])
+            done.set()
+            await tick
+            return vaults
+
+        vaults = asyncio.run(run())
+        for vault, frame in zip(vaults, frames):
+            _assert_restored(vault, frame)
+        # The event loop kept running while the stashes were written
+        assert len(ticks) > 1
+
+    def test_iter(self, directory):
+        path = os.path.join(directory, 'workspace.h5')
+        frame = _frame()
+        stash(path, frame=frame, verbose=False)
+
+        async def run():
+            return [item async for item in aunstash_iter(path)]
+
+        items = asyncio.run(run())
+        assert [name for name, _ in items] == sorted(frame)
+        _assert_restored(dict(items), frame)
+
+    def test_memory(self):
+        frame = _frame()
+
+        async def run():
+            buffer = await astash(frame=frame, to='memory')
+            return await aunstash(buffer)
+
+        _assert_restored(asyncio.run(run()), frame)
+
+    def test_invalid(self, directory):
+        path = os.path.join(directory, 'workspace.h5')
+        with pytest.raises(TypeError):
+            asyncio.run(astash(path))
+        with pytest.raises(IOError):
+            asyncio.run(aunstash(os.path.join(directory, 'missing.h5')))
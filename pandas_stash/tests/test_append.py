@@ -0,0 +1,138 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+import tables
+from pandas.util.testing import ensure_clean
+
+from pandas_stash import stash, unstash
+from pandas_stash.cli import verify_stash
+from pandas_stash.hashing import BLOCK_ROWS
+
+
+def _frame(nrows):
+    index = pd.date_range('2000-01-01', periods=nrows, freq='T')
+    return pd.DataFrame({'a': np.arange(nrows, dtype=np.float64),
+                         'b': np.array(['x', 'y', 'z'])[np.arange(nrows) % 3]},
+                        index=index)
+
+
+@pytest.fixture
+def appended(monkeypatch):
+    # Rows passed to HDFStore.append, by key
+    rows = []
+    append = pd.HDFStore.append
+
+    def spy(self, key, value, *args, **kwargs):
+        rows.append((key.lstrip('/'), value.shape[0]))
+        return append(self, key, value, *args, **kwargs)
+
+    monkeypatch.setattr(pd.HDFStore, 'append', spy)
+    return rows
+
+
+def _nrows(path, name):
+    with tables.open_file(path) as h5f:
+        return h5f.get_node('/pandas:' + name).table.nrows
+
+
+class TestAppendRows(object):
+    @pytest.mark.parametrize('nrows', [1000, BLOCK_ROWS + 10])
+    def test_append_tail(self, appended, nrows):
+        df = _frame(nrows)
+        with ensure_clean() as path:
+            stash(path, frame={'df': df}, verbose=False, append_rows=True)
+            del appended[:]
+            grown = _frame(nrows + 500)
+            stash(path, frame={'df': grown}, verbose=False, append_rows=True)
+            assert appended == [('pandas:df', 500)]
+            assert _nrows(path, 'df') == nrows + 500
+            vault = unstash(path, frame={}, verbose=False)
+            pd.testing.assert_frame_equal(vault.df, grown)
+            assert set(status for _, status, _ in
+                       verify_stash(path)) == {'ok'}
+
+    def test_unchanged(self, appended):
+        frame = {'df': _frame(1000), 's': pd.Series(np.arange(10.0))}
+        with ensure_clean() as path:
+            stash(path, frame=frame, verbose=False, append_rows=True)
+            del appended[:]
+            stash(path, frame=frame, verbose=False, append_rows=True)
+            assert appended == []
+            vault = unstash(path, frame={}, verbose=False)
+            pd.testing.assert_frame_equal(vault.df, frame['df'])
+            pd.testing.assert_series_equal(vault.s, frame['s'])
+
+    def test_modified_prefix(self, appended):
+        df = _frame(1000)
+        with ensure_clean() as path:
+            stash(path, frame={'df': df}, verbose=False, append_rows=True)
+            grown = _frame(1500)
+            grown.iloc[10, 0] = -1.0
+            del appended[:]
+            stash(path, frame={'df': grown}, verbose=False, append_rows=True)
+            assert appended == [('pandas:df', 1500)]
+            vault = unstash(path, frame={}, verbose=False)
+            pd.testing.assert_frame_equal(vault.df, grown)
+
+    def test_schema_changes(self):
+        df = _frame(100)
+        changes = [df.astype({'a': np.float32}),
+                   df.assign(c=1.0),
+                   df.rename(columns={'a': 'c'}),
+                   df.assign(b=df.b + 'longer than before')]
+        for changed in changes:
+            with ensure_clean() as path:
+                stash(path, frame={'df': df}, verbose=False,
+                      append_rows=True)
+                stash(path, frame={'df': changed}, verbose=False,
+                      append_rows=True)
+                vault = unstash(path, frame={}, verbose=False)
+                pd.testing.assert_frame_equal(vault.df, changed)
+
+    def test_longer_strings_in_tail(self):
+        df = _frame(100)
+        grown = pd.concat([df, pd.DataFrame({'a': [1.0], 'b': ['x' * 100]},
+                                            index=[pd.Timestamp('2001')])])
+        with ensure_clean() as path:
+            stash(path, frame={'df': df}, verbose=False, append_rows=True)
+            stash(path, frame={'df': grown}, verbose=False, append_rows=True)
+            vault = unstash(path, frame={}, verbose=False)
+            pd.testing.assert_frame_equal(vault.df, grown)
+
+    def test_other_variables(self):
+        frame = {'df': _frame(100), 'x': 1.0, 'arr': np.arange(10),
+                 'old': pd.Series([1.0])}
+        with ensure_clean() as path:
+            stash(path, frame=frame, verbose=False, append_rows=True)
+            frame = {'df': _frame(200), 'x': 2.0, 'arr': np.arange(5)}
+            stash(path, frame=frame, verbose=False, append_rows=True)
+            vault = unstash(path, frame={}, verbose=False)
+            assert sorted(vault) == ['arr', 'df', 'x']
+            assert vault.x == 2.0
+            np.testing.assert_array_equal(vault.arr, np.arange(5))
+            pd.testing.assert_frame_equal(vault.df, frame['df'])
+            with tables.open_file(path) as h5f:
+                assert '/pandas:old' not in h5f
+            assert set(status for _, status, _ in
+                       verify_stash(path)) == {'ok'}
+
+    def test_new_or_plain_file(self):
+        df = _frame(100)
+        with ensure_clean() as path:
+            os.remove(path)
+            stash(path, frame={'df': df}, verbose=False, append_rows=True)
+            pd.testing.assert_frame_equal(
+                unstash(path, frame={}, verbose=False).df, df)
+        with ensure_clean() as path:
+            pd.Series([1.0]).to_hdf(path, 'series')
+            stash(path, frame={'df': df}, verbose=False, append_rows=True)
+            pd.testing.assert_frame_equal(
+                unstash(path, frame={}, verbose=False).df, df)
+
+    def test_store_dir(self):
+        with ensure_clean() as path:
+            with pytest.raises(ValueError):
+                stash(path, frame={'x': 1.0}, verbose=False,
+                      append_rows=True, store_dir=os.path.dirname(path))
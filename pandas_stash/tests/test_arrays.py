@@ -0,0 +1,127 @@
+import numpy as np
+import pytest
+import tables
+from pandas.util.testing import ensure_clean
+
+from pandas_stash import stash, unstash
+from pandas_stash.arrays import ArrayProxy, CHUNK_BYTES, chunkshape
+
+
+def _stash(arr, **kwargs):
+    path = kwargs.pop('path')
+    stash(path, frame={'arr': arr}, verbose=False, **kwargs)
+    return unstash(path, frame={}, insert=False, verbose=False,
+                   lazy=True).arr
+
+
+class TestArrayProxy(object):
+    def test_metadata(self):
+        arr = np.random.randn(100, 7)
+        with ensure_clean() as path:
+            proxy = _stash(arr, path=path)
+            assert isinstance(proxy, ArrayProxy)
+            assert proxy.shape == arr.shape
+            assert proxy.dtype == arr.dtype
+            assert proxy.ndim == 2
+            assert proxy.size == arr.size
+            assert proxy.nbytes == arr.nbytes
+            assert len(proxy) == 100
+            assert 'arr' in repr(proxy)
+            np.testing.assert_array_equal(np.asarray(proxy), arr)
+            np.testing.assert_array_equal(proxy.read(), arr)
+            assert np.asarray(proxy, dtype=np.float32).dtype == np.float32
+
+    @pytest.mark.parametrize('key', [
+        0, -1, 5, slice(None), slice(10, 20), slice(10, 20, 3),
+        slice(None, None, -1), slice(20, 10, -3), slice(-5, None),
+        slice(50, 10), (slice(10, 20), 2), (3, -2), (Ellipsis, 1),
+        (1, Ellipsis), (None, slice(2, 4)), (slice(2, 4), None, 1),
+        (slice(None, None, -2), slice(None, None, -2)), Ellipsis, ()])
+    def test_basic_slicing(self, key):
+        arr = np.arange(100 * 7, dtype=np.float64).reshape((100, 7))
+        with ensure_clean() as path:
+            proxy = _stash(arr, path=path)
+            expected = arr[key]
+            result = proxy[key]
+            assert np.shape(result) == np.shape(expected)
+            np.testing.assert_array_equal(result, expected)
+
+    def test_invalid_index(self):
+        arr = np.arange(10)
+        with ensure_clean() as path:
+            proxy = _stash(arr, path=path)
+            with pytest.raises(IndexError):
+                proxy[10]
+            with pytest.raises(IndexError):
+                proxy[0, 0]
+            with pytest.raises(IndexError):
+                proxy[[0, 1]]
+            with pytest.raises(IndexError):
+                proxy[..., ...]
+
+    @pytest.mark.parametrize('arr', [
+        np.arange(24).reshape((6, 4)).astype('M8[ns]'),
+        np.array([['apple', 'banana'], ['cherry', u'däte']]),
+        np.array([b'apple', b'banana']),
+        np.zeros((5, 3), dtype=[('a', np.float64), ('b', 'S3')]),
+        np.arange(12.0, dtype='>f8').reshape((3, 4))])
+    def test_encoded_dtypes(self, arr):
+        with ensure_clean() as path:
+            proxy = _stash(arr, path=path)
+            assert proxy.dtype == arr.dtype
+            assert proxy.shape == arr.shape
+            np.testing.assert_array_equal(proxy[1:], arr[1:])
+            np.testing.assert_array_equal(proxy[1, ...], arr[1, ...])
+            np.testing.assert_array_equal(proxy.read(), arr)
+            assert proxy.read().dtype == arr.dtype
+
+    def test_lazy_unstash(self):
+        arr = np.random.randn(10, 2)
+        with ensure_clean() as path:
+            stash(path, frame={'arr': arr}, verbose=False)
+            with pytest.raises(ValueError):
+                unstash(path, frame={}, verbose=False, lazy=True)
+            frame = {}
+            vault = unstash(path, frame=frame, insert=False, verbose=False,
+                            lazy=True)
+            assert isinstance(vault.arr, ArrayProxy)
+            assert frame == {}
+
+
+class TestChunkshape(object):
+    def test_layouts(self):
+        dtype = np.dtype(np.float64)
+        shape = (10 ** 6, 10)
+        assert chunkshape(shape, dtype, None) is None
+        assert chunkshape(shape, dtype, 'auto') is None
+        rows = CHUNK_BYTES // (8 * 10)
+        assert chunkshape(shape, dtype, 'row') == (rows, 10)
+        assert chunkshape(shape, dtype, 'column') == (CHUNK_BYTES // 8, 1)
+        assert chunkshape(shape, dtype, (100, 2)) == (100, 2)
+        assert chunkshape((10, 10), dtype, 'column') == (10, 1)
+        assert chunkshape((10,), np.dtype('U3'), 'row') == (10, 3)
+        with pytest.raises(ValueError):
+            chunkshape(shape, dtype, 'diagonal')
+        with pytest.raises(ValueError):
+            chunkshape(shape, dtype, (100,))
+
+    def test_stash_chunkshape(self):
+        frame = {'a': np.random.randn(10000, 20),
+                 'b': np.random.randn(10000, 20),
+                 'c': np.random.randn(10000, 20)}
+        layouts = {'a': 'row', 'b': 'column', 'c': (500, 5)}
+        with ensure_clean() as path:
+            stash(path, frame=frame, verbose=False, chunkshape=layouts)
+            with tables.open_file(path) as h5f:
+                for key, layout in layouts.items():
+                    node = h5f.get_node('/', 'array:' + key)
+                    expected = chunkshape(frame[key].shape,
+                                          frame[key].dtype, layout)
+                    assert node.chunkshape == expected
+            vault = unstash(path, frame={}, verbose=False)
+            for key in frame:
+                np.testing.assert_array_equal(vault[key], frame[key])
+            stash(path, frame=frame, verbose=False, chunkshape='row')
+            with tables.open_file(path) as h5f:
+                node = h5f.get_node('/', 'array:c')
+                assert node.chunkshape[1] == 20
@@ -0,0 +1,146 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.util.testing import ensure_clean
+
+from pandas_stash import Loader, ReadCache, get_read_cache, stash, unstash
+
+
+def _frame():
+    return {'df': pd.DataFrame({'a': np.arange(1000.0),
+                                'b': ['x', 'y'] * 500}),
+            's': pd.Series(np.arange(100)),
+            'arr': np.arange(1000).reshape(100, 10),
+            'x': 1.0,
+            'results': {'fits': [np.arange(3), pd.Series([1.0, 2.0])]}}
+
+
+class TestReadCache(object):
+    def test_hits(self):
+        frame = _frame()
+        cache = ReadCache()
+        with ensure_clean() as path:
+            stash(path, frame=frame, verbose=False)
+            first = unstash(path, frame={}, verbose=False, cache=cache)
+            misses = cache.misses
+            assert cache.hits == 0
+            assert misses == 5
+            second = unstash(path, frame={}, verbose=False, cache=cache)
+            assert cache.misses == misses
+            assert cache.hits == misses
+            for vault in (first, second):
+                pd.testing.assert_frame_equal(vault.df, frame['df'])
+                np.testing.assert_array_equal(vault.arr, frame['arr'])
+                pd.testing.assert_series_equal(vault.results['fits'][1],
+                                               frame['results']['fits'][1])
+                assert vault.x == 1.0
+            loader = Loader(path, insert=False, verbose=False, cache=cache)
+            np.testing.assert_array_equal(loader.read('arr'), frame['arr'])
+            assert cache.hits == misses + 1
+            stats = cache.stats()
+            assert stats['entries'] == len(cache) == misses
+            assert stats['nbytes'] == cache.nbytes > 0
+
+    def test_read_only(self):
+        frame = _frame()
+        cache = ReadCache()
+        with ensure_clean() as path:
+            stash(path, frame=frame, verbose=False)
+            vault = unstash(path, frame={}, verbose=False, cache=cache)
+            with pytest.raises(ValueError):
+                vault.arr[0, 0] = -1
+            with pytest.raises(ValueError):
+                vault.df.iloc[0, 0] = -1.0
+            vault.df['c'] = 1
+            vault.df['a'] = 0.0
+            vault = unstash(path, frame={}, verbose=False, cache=cache)
+            pd.testing.assert_frame_equal(vault.df, frame['df'])
+
+    def test_masked_read_only(self):
+        s = pd.Series(pd.array([1, None, 3], dtype='Int64'))
+        df = pd.DataFrame({'n': pd.array([1.5, None, 2.5], dtype='Float64'),
+                           't': pd.date_range('2000-01-01', periods=3)})
+        cache = ReadCache()
+        with ensure_clean() as path:
+            stash(path, frame={'s': s, 'df': df}, verbose=False)
+            vault = unstash(path, frame={}, verbose=False, cache=cache)
+            with pytest.raises(ValueError):
+                vault.s[0] = 99
+            with pytest.raises(ValueError):
+                vault.df.iloc[0, 0] = -1.0
+            with pytest.raises(ValueError):
+                vault.df.iloc[0, 1] = pd.Timestamp('1999-01-01')
+            vault = unstash(path, frame={}, verbose=False, cache=cache)
+            assert cache.hits == 2
+            pd.testing.assert_series_equal(vault.s, s)
+            pd.testing.assert_frame_equal(vault.df, df)
+
+    def test_categorical_read_only(self):
+        c = pd.Series(pd.Categorical(['a', 'b', 'a']))
+        # Intervals are copied on each hit since their data is not made
+        # read-only
+        intervals = pd.Series(pd.arrays.IntervalArray.from_breaks([0, 1, 2]))
+        cache = ReadCache()
+        with ensure_clean() as path:
+            stash(path, frame={'c': c, 'intervals': intervals},
+                  verbose=False, fallback='pickle')
+            vault = unstash(path, frame={}, verbose=False, cache=cache)
+            with pytest.raises(ValueError):
+                vault.c[0] = 'b'
+            vault.intervals[1] = pd.Interval(5, 6)
+            vault = unstash(path, frame={}, verbose=False, cache=cache)
+            assert cache.hits == 2
+            pd.testing.assert_series_equal(vault.c, c)
+            pd.testing.assert_series_equal(vault.intervals, intervals)
+
+    def test_copy(self):
+        frame = _frame()
+        cache = ReadCache(copy=True)
+        with ensure_clean() as path:
+            stash(path, frame=frame, verbose=False)
+            for _ in range(2):
+                vault = unstash(path, frame={}, verbose=False, cache=cache)
+                np.testing.assert_array_equal(vault.arr, frame['arr'])
+                pd.testing.assert_frame_equal(vault.df, frame['df'])
+                vault.arr[0, 0] = -1
+                vault.df.iloc[0, 0] = -1.0
+            assert cache.hits > 0
+
+    def test_invalidated(self):
+        cache = ReadCache()
+        with ensure_clean() as path:
+            stash(path, frame={'arr': np.arange(10)}, verbose=False)
+            unstash(path, frame={}, verbose=False, cache=cache)
+            stash(path, frame={'arr': np.arange(20)}, verbose=False)
+            vault = unstash(path, frame={}, verbose=False, cache=cache)
+            np.testing.assert_array_equal(vault.arr, np.arange(20))
+            assert cache.invalidations == 1
+            assert cache.hits == 0
+            assert len(cache) == 1
+
+    def test_evicted(self):
+        frame = dict(('a{0}'.format(i), np.arange(1000.0) + i)
+                     for i in range(5))
+        cache = ReadCache(max_bytes=3 * 8000)
+        with ensure_clean() as path:
+            stash(path, frame=frame, verbose=False)
+            unstash(path, frame={}, verbose=False, cache=cache)
+            assert cache.evictions == 2
+            assert len(cache) == 3
+            assert cache.nbytes <= cache.max_bytes
+            cache.clear()
+            assert len(cache) == 0
+            assert cache.nbytes == 0
+            cache.max_bytes = 100
+            unstash(path, frame={}, verbose=False, cache=cache)
+            assert len(cache) == 0
+
+    def test_process_cache(self):
+        assert get_read_cache() is get_read_cache()
+        with ensure_clean() as path:
+            stash(path, frame={'arr': np.arange(10)}, verbose=False)
+            hits = get_read_cache().hits
+            unstash(path, frame={}, verbose=False, cache=True)
+            unstash(path, frame={}, verbose=False, cache=True)
+            assert get_read_cache().hits == hits + 1
+        get_read_cache().clear()
@@ -0,0 +1,142 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import tables
+from pandas.util.testing import ensure_clean
+
+from pandas_stash import stash, unstash
+from pandas_stash.cli import (convert_stash, list_stash, main, repack_stash,
+                              verify_stash)
+from pandas_stash.manifest import read_manifest, write_manifest
+
+
+class Model(object):
+    def __init__(self, coef):
+        self.coef = coef
+
+
+def _frame():
+    return {'df': pd.DataFrame({'a': np.arange(1000.0),
+                                'b': ['x', 'y'] * 500}),
+            'arr': np.random.randn(100, 3),
+            'results': {'fits': [np.arange(3)], 'name': 'ols'},
+            'model': Model(np.arange(10.0)),
+            'x': 1.0, 'y': 'text'}
+
+
+def _assert_restored(vault, frame):
+    pd.testing.assert_frame_equal(vault.df, frame['df'])
+    np.testing.assert_array_equal(vault.arr, frame['arr'])
+    np.testing.assert_array_equal(vault.results['fits'][0],
+                                  frame['results']['fits'][0])
+    np.testing.assert_array_equal(vault.model.coef, frame['model'].coef)
+    assert vault.x == 1.0
+    assert vault.y == 'text'
+
+
+class TestCli(object):
+    def test_ls(self, capsys):
+        with ensure_clean() as path:
+            stash(path, frame=_frame(), verbose=False, fallback='pickle',
+                  chunkshape='row')
+            rows = list_stash(path)
+            assert [row['name'] for row in rows] == ['arr', 'df', 'model',
+                                                     'results', 'x', 'y']
+            arr = rows[0]
+            assert arr['kind'] == 'numpy'
+            assert arr['shape'] == (100, 3)
+            assert arr['nbytes'] == 2400
+            assert 'chunks=100x3' in arr['storage']
+            assert main(['ls', path]) == 0
+            out = capsys.readouterr().out
+            assert '6 variables' in out
+            assert 'DataFrame' in out
+
+    def test_verify(self, capsys):
+        with ensure_clean() as path:
+            stash(path, frame=_frame(), verbose=False, fallback='pickle',
+                  checksums=True)
+            results = verify_stash(path)
+            assert set(status for _, status, _ in results) == {'ok'}
+            with tables.open_file(path, mode='a') as h5f:
+                node = h5f.get_node('/array:arr')
+                node[0, 0] = node[0, 0] + 1
+            results = dict((name, status)
+                           for name, status, _ in verify_stash(path))
+            assert results['arr'] == 'mismatch'
+            assert results['df'] == 'ok'
+            assert main(['verify', path]) == 1
+            assert 'mismatch' in capsys.readouterr().out
+
+    def test_verify_unreadable(self):
+        with ensure_clean() as path:
+            with open(path, 'w') as not_hdf:
+                not_hdf.write('not a stash')
+            assert verify_stash(path)[0][1] == 'error'
+
+    def test_repack(self):
+        frame = _frame()
+        frame['big'] = np.random.randn(100000)
+        with ensure_clean() as path, ensure_clean() as output:
+            stash(path, frame=frame, verbose=False, fallback='pickle',
+                  checksums=True)
+            # Free space left behind by removing a variable
+            with tables.open_file(path, mode='a') as h5f:
+                h5f.remove_node('/array:big')
+                manifest = read_manifest(h5f)
+                del manifest['variables']['big']
+                write_manifest(h5f, manifest)
+            del frame['big']
+            size = os.path.getsize(path)
+            repack_stash(path, output, complib='zlib', complevel=9,
+                         chunkshape='row', workers=2)
+            assert os.path.getsize(output) < size - 400000
+            vault = unstash(output, frame={}, verbose=False)
+            _assert_restored(vault, frame)
+            assert set(status for _, status, _ in
+                       verify_stash(output)) == {'ok'}
+            with tables.open_file(output) as h5f:
+                assert h5f.get_node('/array:arr').filters.complib == 'zlib'
+            repack_stash(path, workers=1)
+            _assert_restored(unstash(path, frame={}, verbose=False), frame)
+
+    def test_repack_original_dtypes(self):
+        df = pd.DataFrame({'a': np.arange(100), 'b': ['x', 'y'] * 50})
+        with ensure_clean() as path:
+            stash(path, frame={'df': df, 'arr': np.arange(10)},
+                  downcast='safe', verbose=False)
+            repack_stash(path, workers=1)
+            vault = unstash(path, frame={}, verbose=False)
+            assert vault.df.dtypes['a'] == np.int8
+            assert vault.df.dtypes['b'] == 'category'
+            vault = unstash(path, frame={}, verbose=False,
+                            restore_dtypes=True)
+            pd.testing.assert_frame_equal(vault.df, df)
+            assert vault.arr.dtype == np.int64
+
+    def test_convert(self):
+        frame = _frame()
+        with ensure_clean('.h5') as path, ensure_clean('.pkl') as pickled:
+            with ensure_clean('.h5') as converted:
+                stash(path, frame=frame, verbose=False, fallback='pickle')
+                convert_stash(path, pickled)
+                convert_stash(pickled, converted)
+                vault = unstash(converted, frame={}, verbose=False)
+                _assert_restored(vault, frame)
+                assert main(['convert', path, 'out.unknown']) == 2
+                with open(pickled, 'wb') as pickle_file:
+                    pickle_file.write(b'not a pickle')
+                assert main(['convert', pickled, converted]) == 2
+
+    def test_module(self):
+        with ensure_clean() as path:
+            stash(path, frame={'x': 1.0}, verbose=False)
+            proc = subprocess.Popen([sys.executable, '-m', 'pandas_stash',
+                                     'ls', path], stdout=subprocess.PIPE,
+                                    universal_newlines=True)
+            out, _ = proc.communicate()
+            assert proc.returncode == 0
+            assert 'builtin' in out
@@ -0,0 +1,194 @@
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pytest
+import tables
+from pandas.util.testing import ensure_clean
+
+from pandas_stash import Loader, stash, stash_diff, unstash, unstash_stream
+from pandas_stash.cli import verify_stash
+from pandas_stash.io import UnsupportedValueWarning
+from pandas_stash.codec import (PickleRequiredError, decode, encode,
+                                uses_codec)
+from pandas_stash.manifest import read_manifest
+
+
+def _frame(n=1000):
+    df = pd.DataFrame({'a': np.arange(n),
+                       'b': np.arange(n) / 2.0,
+                       'c': np.arange(n) * 3,
+                       'nullable': pd.array(np.where(np.arange(n) % 7,
+                                                     np.arange(n), -1),
+                                            dtype='Int64'),
+                       'flag': pd.array([True, None] * (n // 2),
+                                        dtype='boolean'),
+                       'text': pd.array([('x', None, 'zé')[i % 3]
+                                         for i in range(n)], dtype='string'),
+                       'names': ['p', None] * (n // 2),
+                       'label': pd.Categorical(['lo', 'hi'] * (n // 2),
+                                               categories=['lo', 'hi', 'mid'],
+                                               ordered=True),
+                       'when': pd.date_range('2000-01-01', periods=n,
+                                             freq='H', tz='US/Eastern')},
+                      index=pd.MultiIndex.from_arrays(
+                          [np.arange(n) // 10, np.arange(n) % 10],
+                          names=['outer', 'inner']))
+    df.loc[df.index[3], 'nullable'] = pd.NA
+    return df
+
+
+def _variables():
+    return {'df': _frame(),
+            's': pd.Series(pd.array([1.5, None, 2.5], dtype='Float64'),
+                           index=pd.CategoricalIndex(['a', 'b', 'a']),
+                           name='s'),
+            'plain': pd.DataFrame({'a': np.arange(10.0)}),
+            'idx': pd.Index(['a', 'b', np.nan], name='letters'),
+            'mi': pd.MultiIndex.from_product([['a', 'b'], [1, 2, 3]],
+                                             names=['k', None]),
+            'dates': pd.date_range('2000-01-01', periods=5, freq='D',
+                                   tz='UTC', name='d'),
+            'rng': pd.RangeIndex(0, 100, 5),
+            'cat': pd.Categorical(['x', None, 'y'], categories=['y', 'x']),
+            'ints': pd.array([1, None, 3], dtype='Int64'),
+            'periods': pd.period_range('2000-01', periods=3, freq='M')}
+
+
+def _assert_equal(value, expected):
+    if isinstance(expected, pd.DataFrame):
+        pd.testing.assert_frame_equal(value, expected)
+    elif isinstance(expected, pd.Series):
+        pd.testing.assert_series_equal(value, expected)
+    elif isinstance(expected, pd.Index):
+        pd.testing.assert_index_equal(value, expected, exact=True)
+        assert type(value) is type(expected)
+        assert getattr(value, 'freq', None) == getattr(expected, 'freq',
+                                                       None)
+    else:
+        pd.testing.assert_extension_array_equal(value, expected)
+
+
+@pytest.fixture
+def store_dir():
+    path = tempfile.mkdtemp()
+    yield path
+    shutil.rmtree(path)
+
+
+def _manifest(path):
+    with tables.open_file(path) as h5f:
+        return read_manifest(h5f)
+
+
+class TestCodec(object):
+    def test_encode(self):
+        df = _frame(100)
+        spec, arrays = encode(df)
+        # Columns of the same numpy dtype are stored together
+        blocks = [item for item in spec['data'] if item.get('block')]
+        assert sorted(len(item['positions']) for item in blocks) == [1, 2]
+        assert all(isinstance(arr, np.ndarray) for arr in arrays)
+        assert not any(arr.dtype == object for arr in arrays)
+        _assert_equal(decode(spec, arrays), df)
+
+    def test_uses_codec(self):
+        assert uses_codec(pd.Index([1, 2]))
+        assert uses_codec(pd.Categorical(['a']))
+        assert uses_codec(_frame(10))
+        assert not uses_codec(pd.DataFrame({'a': [1.0], 'b': ['x']}))
+        assert not uses_codec(pd.Series([1, 2]))
+        assert uses_codec(pd.Series([1, 2], index=pd.CategoricalIndex(
+            ['a', 'b'])))
+        assert not uses_codec(np.arange(3))
+
+    def test_round_trip(self):
+        variables = _variables()
+        with ensure_clean() as path:
+            stash(path, frame=variables, verbose=False, checksums=True,
+                  fallback='pickle')
+            manifest = _manifest(path)
+            vault = unstash(path, frame={}, verbose=False)
+            for name, expected in variables.items():
+                _assert_equal(vault[name], expected)
+                entry = manifest['variables'][name]
+                assert entry['kind'] == 'pandas'
+                assert entry['type'] == type(expected).__name__
+                expected_format = 'table' if name == 'plain' else 'codec'
+                assert entry['format'] == expected_format
+            loader = Loader(path, insert=False, verbose=False)
+            _assert_equal(loader.read('mi'), variables['mi'])
+            lazy = unstash(path, frame={}, insert=False, verbose=False,
+                           lazy=True)
+            _assert_equal(lazy['df'], variables['df'])
+            results = verify_stash(path)
+            assert set(status for _, status, _ in results) == {'ok'}
+
+    def test_masks_packed(self):
+        n = 1001
+        spec, arrays = encode(pd.array(np.arange(n), dtype='Int64'))
+        values = spec['values']
+        assert arrays[values['data']].dtype == np.int64
+        assert arrays[values['mask']].shape == ((n + 7) // 8,)
+        spec, arrays = encode(pd.Index(['abc', None, 'de'] * 10))
+        values = spec['index']['values']
+        assert values['kind'] == 'strings'
+        assert arrays[values['data']].nbytes == 50
+        assert arrays[values['mask']].shape == (4,)
+
+    def test_pickle_policy(self):
+        mixed = pd.Series(['a', 1, 2.5], index=pd.Index([1, 2, 3]),
+                          dtype=object).astype('category')
+        variables = {'mixed': mixed,
+                     'periods': pd.period_range('2000-01', periods=3,
+                                                freq='M'),
+                     'named': pd.Index(['a', 'b'], name=('x', 1)),
+                     'results': {'ok': pd.Index([1, 2]), 'mixed': mixed},
+                     'idx': pd.Index([1, 2])}
+        with pytest.raises(PickleRequiredError):
+            encode(variables['periods'])
+        with ensure_clean() as path:
+            with pytest.warns(UnsupportedValueWarning):
+                stash(path, frame=variables, verbose=False)
+            vault = unstash(path, frame={}, verbose=False)
+            assert list(vault) == ['idx']
+            with tables.open_file(path) as h5f:
+                assert '/container:results' not in h5f
+            stash(path, frame=variables, verbose=False, fallback='pickle')
+            vault = unstash(path, frame={}, verbose=False)
+            for name in ('mixed', 'periods', 'named', 'idx'):
+                _assert_equal(vault[name], variables[name])
+            _assert_equal(vault.results['mixed'], mixed)
+
+    def test_containers_streams_and_diff(self):
+        variables = _variables()
+        results = {'fits': [variables['idx'], variables['cat']],
+                   'frame': variables['df']}
+        with ensure_clean() as path_a, ensure_clean() as path_b:
+            stash(path_a, frame={'results': results, 'df': variables['df']},
+                  verbose=False)
+            vault = unstash(path_a, frame={}, verbose=False)
+            _assert_equal(vault.results['fits'][0], variables['idx'])
+            _assert_equal(vault.results['fits'][1], variables['cat'])
+            _assert_equal(vault.results['frame'], variables['df'])
+            chunks = list(unstash_stream(path_a, 'df', rows=300))
+            assert len(chunks) == 4
+            _assert_equal(pd.concat(chunks), variables['df'])
+            changed = variables['df'].copy()
+            changed.loc[changed.index[5], 'text'] = 'changed'
+            stash(path_b, frame={'results': results, 'df': changed},
+                  verbose=False)
+            diff = stash_diff(path_a, path_b)
+            assert list(diff.changed) == ['df']
+            assert diff.unchanged == ['results']
+
+    def test_object_store_and_cache(self, store_dir):
+        variables = _variables()
+        with ensure_clean() as path:
+            stash(path, frame=variables, verbose=False, store_dir=store_dir,
+                  fallback='pickle')
+            for _ in range(2):
+                vault = unstash(path, frame={}, verbose=False, cache=True)
+                for name, expected in variables.items():
+                    _assert_equal(vault[name], expected)
@@ -0,0 +1,140 @@
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pytest
+import tables
+from pandas.util.testing import ensure_clean
+
+from pandas_stash import Loader, stash, stash_diff, stash_gc, unstash
+from pandas_stash.arrays import ArrayProxy
+from pandas_stash.manifest import read_manifest
+from pandas_stash.store import ObjectStore
+from pandas_stash.vault import NOT_LOADED
+
+
+def _results():
+    return {'fits': [pd.DataFrame({'a': np.arange(10.0)}),
+                     pd.Series(np.arange(5))],
+            'params': (np.arange(6.0).reshape(2, 3), 'ols', 3, None),
+            1: {'nested': np.array(['a', 'bc'])},
+            'empty': []}
+
+
+def _assert_results_equal(actual, expected):
+    assert type(actual) is type(expected)
+    if isinstance(expected, dict):
+        assert list(actual) == list(expected)
+        for key in expected:
+            _assert_results_equal(actual[key], expected[key])
+    elif isinstance(expected, (list, tuple)):
+        assert len(actual) == len(expected)
+        for a, e in zip(actual, expected):
+            _assert_results_equal(a, e)
+    elif isinstance(expected, pd.DataFrame):
+        pd.testing.assert_frame_equal(actual, expected)
+    elif isinstance(expected, pd.Series):
+        pd.testing.assert_series_equal(actual, expected)
+    elif isinstance(expected, np.ndarray):
+        np.testing.assert_array_equal(actual, expected)
+    else:
+        assert actual == expected
+
+
+class TestContainers(object):
+    def test_round_trip(self):
+        frame = {'results': _results(), 'pair': (np.arange(3), 1.5)}
+        with ensure_clean() as path:
+            stash(path, frame=frame, verbose=False, checksums=True)
+            vault = unstash(path, frame={}, verbose=False)
+            assert vault.items == ['pair', 'results']
+            _assert_results_equal(vault.results, frame['results'])
+            _assert_results_equal(vault.pair, frame['pair'])
+            with tables.open_file(path) as h5f:
+                manifest = read_manifest(h5f)
+                assert '/container:results/i0/i0' in h5f
+            entry = manifest['variables']['results']
+            assert entry['kind'] == 'container'
+            assert entry['type'] == 'dict'
+            assert 'hash' in entry
+
+    def test_unsupported(self):
+        cyclic = [np.arange(3)]
+        cyclic.append(cyclic)
+        frame = {'objects': [np.array([None, 1])], 'cyclic': cyclic,
+                 'keys': {(1, 2): np.arange(3)}, 'other': [object()],
+                 'ok': [1, 2.0, 'three']}
+        with ensure_clean() as path:
+            stash(path, frame=frame, verbose=False)
+            vault = unstash(path, frame={}, verbose=False)
+            assert vault.items == ['ok']
+            assert vault.ok == [1, 2.0, 'three']
+
+    def test_disabled(self):
+        with ensure_clean() as path:
+            stash(path, frame={'results': _results()}, verbose=False,
+                  containers=False)
+            vault = unstash(path, frame={}, verbose=False)
+            assert vault.items == []
+
+    def test_read_element(self):
+        frame = {'results': _results(), 'x': 2.0, 'arr': np.arange(4)}
+        with ensure_clean() as path:
+            stash(path, frame=frame, verbose=False)
+            loader = Loader(path, insert=False, frame={}, verbose=False)
+            pd.testing.assert_series_equal(loader.read('results', 'fits', 1),
+                                           frame['results']['fits'][1])
+            np.testing.assert_array_equal(loader.read('results', 1, 'nested'),
+                                          np.array(['a', 'bc']))
+            assert loader.read('results', 'params', 1) == 'ols'
+            _assert_results_equal(loader.read('results', 'params'),
+                                  frame['results']['params'])
+            assert loader.read('x') == 2.0
+            np.testing.assert_array_equal(loader.read('arr'), frame['arr'])
+            with pytest.raises(KeyError):
+                loader.read('results', 'missing')
+            with pytest.raises(KeyError):
+                loader.read('missing')
+            with pytest.raises(TypeError):
+                loader.read('arr', 0)
+
+    def test_lazy(self):
+        frame = {'results': _results()}
+        with ensure_clean() as path:
+            stash(path, frame=frame, verbose=False)
+            vault = unstash(path, insert=False, frame={}, verbose=False,
+                            lazy=True)
+            assert dict.__getitem__(vault, 'results') is NOT_LOADED
+            params = vault.results['params']
+            assert isinstance(params[0], ArrayProxy)
+            np.testing.assert_array_equal(params[0][1],
+                                          frame['results']['params'][0][1])
+            vault = unstash(path, insert=False, frame={}, verbose=False,
+                            max_bytes=10 ** 6)
+            _assert_results_equal(vault.results, frame['results'])
+
+    def test_store_dir(self):
+        store_dir = tempfile.mkdtemp()
+        try:
+            frame = {'results': _results()}
+            with ensure_clean() as path:
+                stash(path, frame=frame, verbose=False, store_dir=store_dir)
+                assert len(ObjectStore(store_dir).blobs()) == 4
+                vault = unstash(path, frame={}, verbose=False)
+                _assert_results_equal(vault.results, frame['results'])
+                assert stash_gc(store_dir, grace=0) == []
+        finally:
+            shutil.rmtree(store_dir)
+
+    def test_diff(self):
+        results = _results()
+        with ensure_clean() as first, ensure_clean() as second:
+            stash(first, frame={'results': results}, verbose=False,
+                  checksums=False)
+            results['fits'][0].iloc[3, 0] = -1.0
+            stash(second, frame={'results': results}, verbose=False)
+            diff = stash_diff(first, second)
+            assert list(diff.changed) == ['results']
+            diff = stash_diff(second, second)
+            assert diff.unchanged == ['results']
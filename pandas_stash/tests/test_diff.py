@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+import tables
+from pandas.util.testing import ensure_clean
+
+from pandas_stash import stash, stash_diff
+from pandas_stash.hashing import BLOCK_ROWS
+from pandas_stash.manifest import read_manifest
+
+
+def _frame():
+    n = BLOCK_ROWS * 3 + 10
+    return {'df': pd.DataFrame({'a': np.arange(n, dtype=np.float64),
+                                'b': np.arange(n) % 7,
+                                'c': ['x'] * n}),
+            's': pd.Series(np.arange(100.0)),
+            'arr': np.arange(1000.0).reshape((100, 10)),
+            'i': 1,
+            'name': 'apple'}
+
+
+class TestStashDiff(object):
+    def test_identical(self):
+        frame = _frame()
+        with ensure_clean() as a, ensure_clean() as b:
+            stash(a, frame=frame, verbose=False)
+            stash(b, frame=frame, verbose=False)
+            diff = stash_diff(a, b)
+            assert not diff
+            assert diff.unchanged == sorted(frame)
+            assert 'Unchanged: 5' in repr(diff)
+
+    def test_added_removed_changed(self):
+        frame = _frame()
+        new = dict(frame)
+        del new['s']
+        new['t'] = 2.0
+        new['i'] = 2
+        new['name'] = 1.0
+        new['arr'] = frame['arr'][:50]
+        with ensure_clean() as a, ensure_clean() as b:
+            stash(a, frame=frame, verbose=False)
+            stash(b, frame=new, verbose=False)
+            diff = stash_diff(a, b)
+            assert diff
+            assert diff.added == ['t']
+            assert diff.removed == ['s']
+            assert sorted(diff.changed) == ['arr', 'i', 'name']
+            assert diff.changed['i']['reason'] == 'content'
+            assert diff.changed['name']['reason'] == 'type'
+            assert diff.changed['arr']['reason'] == 'shape'
+            assert diff.unchanged == ['df']
+
+    def test_deep(self):
+        frame = _frame()
+        df = frame['df'].copy()
+        df.loc[BLOCK_ROWS + 5, 'b'] = -1
+        arr = frame['arr'].copy()
+        arr[-1] = -1
+        new = dict(frame, df=df, arr=arr)
+        for checksums in (True, False):
+            with ensure_clean() as a, ensure_clean() as b:
+                stash(a, frame=frame, verbose=False, checksums=checksums)
+                stash(b, frame=new, verbose=False)
+                diff = stash_diff(a, b, deep=True)
+                assert sorted(diff.changed) == ['arr', 'df']
+                details = diff.changed['df']
+                assert details['reason'] == 'content'
+                assert details['columns'] == ['b']
+                assert details['rows'] == [[BLOCK_ROWS, 2 * BLOCK_ROWS]]
+                assert diff.changed['arr']['rows'] == [[0, 100]]
+                assert 'columns' not in diff.changed['arr']
+                # Streamed hashes match those computed when stashing
+                assert stash_diff(a, a, deep=True).unchanged == sorted(frame)
+
+    def test_appended_rows(self):
+        frame = _frame()
+        df = frame['df']
+        longer = pd.concat([df, df.iloc[:20]], ignore_index=True)
+        with ensure_clean() as a, ensure_clean() as b:
+            stash(a, frame=frame, verbose=False)
+            stash(b, frame=dict(frame, df=longer), verbose=False)
+            details = stash_diff(a, b, deep=True).changed['df']
+            assert details['reason'] == 'shape'
+            assert details['columns'] == ['a', 'b', 'c']
+            assert details['rows'] == [[3 * BLOCK_ROWS, len(longer)]]
+
+    def test_without_checksums(self):
+        frame = _frame()
+        with ensure_clean() as a, ensure_clean() as b:
+            # Hashes are only recorded when asked for
+            stash(a, frame=frame, verbose=False)
+            stash(b, frame=dict(frame, i=3), verbose=False, checksums=True)
+            with tables.open_file(a) as h5f:
+                variables = read_manifest(h5f)['variables']
+            assert not [entry for entry in variables.values()
+                        if 'hash' in entry]
+            diff = stash_diff(a, b)
+            assert list(diff.changed) == ['i']
+            assert diff.unchanged == ['arr', 'df', 'name', 's']
+
+    def test_legacy_stash(self):
+        frame = _frame()
+        with ensure_clean() as a, ensure_clean() as b:
+            stash(a, frame=frame, verbose=False)
+            stash(b, frame=frame, verbose=False)
+            with tables.open_file(b, mode='a') as h5f:
+                h5f.remove_node('/', 'stash:manifest')
+            diff = stash_diff(a, b)
+            assert diff.unchanged == sorted(frame)
@@ -0,0 +1,151 @@
+import numpy as np
+import pandas as pd
+import pytest
+import tables
+from pandas.util.testing import ensure_clean
+
+from pandas_stash import stash, unstash
+from pandas_stash.cli import verify_stash
+from pandas_stash.downcast import downcast, restore_dtypes, safe_dtype
+from pandas_stash.manifest import read_manifest
+
+
+def _frame(n=1000):
+    return pd.DataFrame({'small': np.arange(n) % 100,
+                         'negative': np.arange(n) - 500,
+                         'wide': np.arange(n) * 10 ** 10,
+                         'half': np.arange(n) / 2.0,
+                         'real': np.random.randn(n),
+                         'flag': np.array([True, False] * (n // 2),
+                                          dtype=object),
+                         'label': np.array(['a', 'b', 'c'])[np.arange(n) % 3],
+                         'unique': [str(i) for i in range(n)]})
+
+
+def _manifest(path):
+    with tables.open_file(path) as h5f:
+        return read_manifest(h5f)
+
+
+class TestDowncast(object):
+    def test_safe_dtype(self):
+        assert safe_dtype(np.arange(100)) == np.int8
+        assert safe_dtype(np.arange(200)) == np.int16
+        assert safe_dtype(np.arange(-1, 200)) == np.int16
+        assert safe_dtype(np.arange(200, dtype=np.uint64)) == np.uint8
+        assert safe_dtype(np.arange(10, dtype=np.int8)) is None
+        assert safe_dtype(np.arange(10) * 2 ** 40) is None
+        assert safe_dtype(np.array([0.5, np.nan, np.inf])) == np.float32
+        assert safe_dtype(np.array([0.1])) is None
+        assert safe_dtype(np.array([True, False], dtype=object)) == bool
+        assert safe_dtype(np.array(['a', 'a', 'b', 'b'],
+                                   dtype=object)) == 'category'
+        assert safe_dtype(np.array(['a', 'b'], dtype=object)) is None
+        assert safe_dtype(np.array([], dtype=np.int64)) is None
+
+    def test_frame(self):
+        df = _frame()
+        narrowed, original = downcast(df, 'safe')
+        dtypes = narrowed.dtypes
+        assert dtypes['small'] == np.int8
+        assert dtypes['negative'] == np.int16
+        assert dtypes['wide'] == np.int64
+        assert dtypes['half'] == np.float32
+        assert dtypes['real'] == np.float64
+        assert dtypes['flag'] == bool
+        assert dtypes['label'] == 'category'
+        assert dtypes['unique'] == object
+        assert sorted(original) == ['0', '1', '3', '5', '6']
+        pd.testing.assert_frame_equal(restore_dtypes(narrowed, original), df)
+        assert (narrowed.memory_usage(deep=True).sum() <
+                df.memory_usage(deep=True).sum())
+
+    def test_explicit(self):
+        df = _frame()
+        narrowed, original = downcast(df, {'real': 'float32',
+                                           'small': 'safe'})
+        assert narrowed.dtypes['real'] == np.float32
+        assert narrowed.dtypes['small'] == np.int8
+        assert narrowed.dtypes['negative'] == np.int64
+        assert original == {'0': 'int64', '4': 'float64'}
+        arr, original = downcast(np.arange(10), 'int16')
+        assert arr.dtype == np.int16
+        np.testing.assert_array_equal(restore_dtypes(arr, original),
+                                      np.arange(10))
+
+    def test_unchanged(self):
+        df = pd.DataFrame({'a': np.arange(3, dtype=np.int8)})
+        narrowed, original = downcast(df, 'safe')
+        assert narrowed is df
+        assert original == {}
+
+
+class TestStashDowncast(object):
+    def test_round_trip(self):
+        frame = {'df': _frame(), 's': pd.Series(np.arange(100), name='s'),
+                 'arr': np.arange(1000).reshape(100, 10), 'x': 1}
+        with ensure_clean() as path:
+            stash(path, frame=frame, downcast='safe', verbose=False,
+                  checksums=True)
+            variables = _manifest(path)['variables']
+            assert variables['arr']['dtype'] == 'int16'
+            assert variables['arr']['original_dtypes'] == {'0': 'int64'}
+            assert variables['s']['original_dtypes'] == {'0': 'int64'}
+            assert 'original_dtypes' not in variables['x']
+            assert set(status for _, status, _ in
+                       verify_stash(path)) == {'ok'}
+
+            vault = unstash(path, frame={}, verbose=False)
+            assert vault.df.dtypes['label'] == 'category'
+            assert vault.arr.dtype == np.int16
+            vault = unstash(path, frame={}, verbose=False,
+                            restore_dtypes=True)
+            pd.testing.assert_frame_equal(vault.df, frame['df'])
+            pd.testing.assert_series_equal(vault.s, frame['s'])
+            np.testing.assert_array_equal(vault.arr, frame['arr'])
+            assert vault.arr.dtype == np.int64
+            assert vault.x == 1
+
+    def test_per_variable(self):
+        frame = {'a': np.arange(10), 'b': np.arange(10)}
+        with ensure_clean() as path:
+            stash(path, frame=frame, downcast={'a': 'safe'}, verbose=False)
+            vault = unstash(path, frame={}, verbose=False)
+            assert vault.a.dtype == np.int8
+            assert vault.b.dtype == np.int64
+
+    def test_unstash(self):
+        # Object columns of bools cannot be written without downcasting
+        frame = {'df': _frame().drop('flag', axis=1), 'arr': np.arange(10)}
+        with ensure_clean() as path:
+            stash(path, frame=frame, verbose=False)
+            vault = unstash(path, frame={}, verbose=False, downcast='safe',
+                            insert=False, max_bytes=10 ** 7)
+            assert vault.df.dtypes['small'] == np.int8
+            assert vault.arr.dtype == np.int8
+            vault = unstash(path, frame={}, verbose=False,
+                            downcast={'arr': 'int32'})
+            assert vault.arr.dtype == np.int32
+            assert vault.df.dtypes['small'] == np.int64
+
+    def test_append_rows(self):
+        df = _frame()
+        with ensure_clean() as path:
+            stash(path, frame={'df': df.iloc[:600]}, downcast='safe',
+                  verbose=False)
+            stash(path, frame={'df': df}, downcast='safe', append_rows=True,
+                  verbose=False)
+            vault = unstash(path, frame={}, verbose=False,
+                            restore_dtypes=True)
+            pd.testing.assert_frame_equal(vault.df, df)
+            assert set(status for _, status, _ in
+                       verify_stash(path)) == {'ok'}
+
+    def test_invalid(self):
+        with ensure_clean() as path:
+            with pytest.raises(ValueError):
+                stash(path, frame={'x': 1}, downcast='aggressive',
+                      verbose=False)
+            stash(path, frame={'x': 1}, verbose=False)
+            with pytest.raises(ValueError):
+                unstash(path, frame={}, downcast='aggressive', verbose=False)
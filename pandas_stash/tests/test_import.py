@@ -0,0 +1,45 @@
+import subprocess
+import sys
+
+import pytest
+
+HEAVY_MODULES = ('numpy', 'pandas', 'tables')
+
+
+def _import_times(statement='import pandas_stash'):
+    cmd = [sys.executable, '-X', 'importtime', '-c', statement]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, universal_newlines=True)
+    _, err = proc.communicate()
+    assert proc.returncode == 0, err
+    times = {}
+    for line in err.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        parts = line[len('import time:'):].split('|')
+        try:
+            cumulative = int(parts[1])
+        except ValueError:  # header line
+            continue
+        times[parts[2].strip()] = cumulative
+    return times
+
+
+class TestImport(object):
+    def test_no_heavy_imports(self):
+        times = _import_times()
+        assert 'pandas_stash' in times
+        for module in HEAVY_MODULES:
+            assert module not in times
+
+    def test_lazy_attributes(self):
+        for name in ('Saver', 'Loader', 'stash_diff'):
+            statement = 'import pandas_stash; pandas_stash.' + name
+            assert 'pandas' in _import_times(statement)
+
+    def test_dir(self):
+        import pandas_stash
+        for name in ('Saver', 'Loader', 'stash_diff'):
+            assert name in dir(pandas_stash)
+        with pytest.raises(AttributeError):
+            pandas_stash.not_an_attribute
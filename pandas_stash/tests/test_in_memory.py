@@ -0,0 +1,120 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+import tables
+from pandas.util.testing import ensure_clean
+
+from pandas_stash import CheckpointRing, Loader, stash, unstash
+from pandas_stash.manifest import read_manifest
+
+
+def _frame():
+    return {'df': pd.DataFrame({'a': np.arange(10000.0),
+                                'b': ['x', 'y'] * 5000}),
+            's': pd.Series(np.arange(100)),
+            'arr': np.random.randn(100, 10),
+            'x': 1.0, 'y': 'text',
+            'results': {'fits': [np.arange(3), pd.Series([1.0, 2.0])]}}
+
+
+class TestStashToMemory(object):
+    def test_round_trip(self, tmpdir):
+        frame = _frame()
+        cwd = os.getcwd()
+        os.chdir(str(tmpdir))
+        try:
+            buffer = stash(frame=frame, to='memory', verbose=False)
+            assert os.listdir(str(tmpdir)) == []
+        finally:
+            os.chdir(cwd)
+        assert isinstance(buffer, bytes)
+        for data in (buffer, bytearray(buffer), memoryview(buffer)):
+            vault = unstash(data, frame={}, verbose=False)
+            assert sorted(vault) == sorted(frame)
+            pd.testing.assert_frame_equal(vault.df, frame['df'])
+            pd.testing.assert_series_equal(vault.s, frame['s'])
+            np.testing.assert_array_equal(vault.arr, frame['arr'])
+            pd.testing.assert_series_equal(vault.results['fits'][1],
+                                           frame['results']['fits'][1])
+            assert vault.x == 1.0
+            assert vault.y == 'text'
+        loader = Loader(buffer, insert=False, verbose=False)
+        np.testing.assert_array_equal(loader.read('results', 'fits', 0),
+                                      np.arange(3))
+        assert loader.read('y') == 'text'
+
+    def test_file_image(self):
+        # The bytes are an ordinary stash file
+        frame = _frame()
+        buffer = stash(frame=frame, to='memory', verbose=False,
+                       fallback='pickle')
+        with ensure_clean() as path:
+            with open(path, 'wb') as stash_file:
+                stash_file.write(buffer)
+            with tables.open_file(path) as h5f:
+                assert sorted(read_manifest(h5f)['variables']) == sorted(frame)
+            vault = unstash(path, frame={}, verbose=False)
+            pd.testing.assert_frame_equal(vault.df, frame['df'])
+
+    def test_invalid(self):
+        frame = {'x': 1.0}
+        with pytest.raises(ValueError):
+            stash(frame=frame, to='socket', verbose=False)
+        with pytest.raises(ValueError):
+            stash('workspace.h5', frame=frame, to='memory', verbose=False)
+        with pytest.raises(ValueError):
+            stash(frame=frame, to='memory', shards=2, verbose=False)
+        with pytest.raises(ValueError):
+            stash(frame=frame, to='memory', append_rows=True, verbose=False)
+        buffer = stash(frame=frame, to='memory', verbose=False)
+        with pytest.raises(ValueError):
+            unstash(buffer, frame={}, insert=False, lazy=True,
+                    verbose=False)
+        with pytest.raises(ValueError):
+            unstash(buffer, frame={}, insert=False, max_bytes=100,
+                    verbose=False)
+
+
+class TestCheckpointRing(object):
+    def test_undo(self):
+        frame = {'df': pd.DataFrame({'a': [1.0, 2.0]}), 'x': 1}
+        ring = CheckpointRing(size=2)
+        ring.checkpoint(frame, label='start')
+        frame['df'] = frame['df'] * 2
+        frame['x'] = 2
+        ring.checkpoint(frame, label='doubled')
+        frame['df'] = None
+        frame['new'] = 3
+        assert ring.labels == ['start', 'doubled']
+        assert ring.nbytes > 0
+        ring.undo(frame)
+        pd.testing.assert_frame_equal(frame['df'],
+                                      pd.DataFrame({'a': [2.0, 4.0]}))
+        assert frame['new'] == 3
+        assert len(ring) == 1
+        ring.restore(frame=frame)
+        assert frame['x'] == 1
+        assert len(ring) == 1
+
+    def test_bounded(self):
+        frame = {'x': 0}
+        ring = CheckpointRing(size=3, include=['x'])
+        for i in range(5):
+            frame['x'] = i
+            ring.checkpoint(frame, label=i)
+        assert ring.labels == [2, 3, 4]
+        ring.restore(0, frame)
+        assert frame['x'] == 2
+        assert unstash(ring.buffer(), frame={}, verbose=False).x == 4
+        ring.clear()
+        assert len(ring) == 0
+        with pytest.raises(IndexError):
+            ring.undo(frame)
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            CheckpointRing(size=0)
+        with pytest.raises(TypeError):
+            CheckpointRing(path='workspace.h5')
@@ -0,0 +1,56 @@
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from pandas.util.testing import ensure_clean
+
+from pandas_stash import stash, unstash
+from pandas_stash.vault import _nbytes
+
+NROWS = 2 ** 19 + 17
+# Peak memory while unstashing relative to the size of the data restored.
+# Reading tables in blocks of rows costs a few blocks on top of the data.
+MAX_PEAK_RATIO = 1.5
+
+
+def _frame():
+    index = pd.date_range('2000-01-01', periods=NROWS, freq='T')
+    df = pd.DataFrame({'a': np.random.randn(NROWS),
+                       'b': np.arange(NROWS),
+                       'c': np.random.randn(NROWS) > 0,
+                       'd': np.random.randn(NROWS).astype(np.float32)},
+                      index=index)
+    return {'df': df, 's': pd.Series(np.random.randn(NROWS), name='s'),
+            'arr': np.random.randn(NROWS, 4),
+            'strings': np.array(['abc', 'de'] * (NROWS // 2))}
+
+
+def _peak_ratio(path, name):
+    tracemalloc.start()
+    try:
+        vault = unstash(path, insert=False, frame={}, verbose=False)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / float(_nbytes(vault[name]))
+
+
+class TestMemory(object):
+    def test_round_trip(self):
+        frame = _frame()
+        frame['objects'] = pd.DataFrame({'x': ['a', 'bc'] * (NROWS // 2),
+                                         'y': np.arange(NROWS // 2 * 2)})
+        with ensure_clean() as path:
+            stash(path, frame=frame, verbose=False)
+            vault = unstash(path, frame={}, verbose=False)
+            pd.testing.assert_frame_equal(vault.df, frame['df'])
+            assert vault.df.index.freq == frame['df'].index.freq
+            pd.testing.assert_series_equal(vault.s, frame['s'])
+            pd.testing.assert_frame_equal(vault.objects, frame['objects'])
+
+    def test_peak_memory(self):
+        frame = _frame()
+        with ensure_clean() as path:
+            for name in sorted(frame):
+                stash(path, frame=frame, include=[name], verbose=False)
+                assert _peak_ratio(path, name) < MAX_PEAK_RATIO
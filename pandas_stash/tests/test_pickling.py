@@ -0,0 +1,97 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pytest
+import tables
+from pandas.util.testing import ensure_clean
+
+from pandas_stash import Loader, stash, stash_diff, unstash
+from pandas_stash.io import UnsupportedValueWarning
+from pandas_stash.manifest import read_manifest
+
+
+class Model(object):
+    def __init__(self, coef, name):
+        self.coef = coef
+        self.name = name
+
+
+class TestPickleFallback(object):
+    def test_round_trip(self):
+        model = Model(np.random.randn(1000, 10), 'ols')
+        frame = {'model': model, 'objects': np.array([None, 'a']),
+                 'os': os, 'x': 1.0}
+        with ensure_clean() as path:
+            stash(path, frame=frame, verbose=False, fallback='pickle',
+                  checksums=True)
+            vault = unstash(path, frame={}, verbose=False)
+            assert vault.items == ['model', 'objects', 'x']
+            assert isinstance(vault.model, Model)
+            assert vault.model.name == 'ols'
+            np.testing.assert_array_equal(vault.model.coef, model.coef)
+            assert vault.model.coef.flags.writeable
+            np.testing.assert_array_equal(vault.objects, frame['objects'])
+            with tables.open_file(path) as h5f:
+                manifest = read_manifest(h5f)
+                group = h5f.get_node('/pickle:model')
+                payload = group.payload.nrows
+                buffers = group._v_attrs.stash_buffers
+            entry = manifest['variables']['model']
+            assert entry['kind'] == 'pickle'
+            assert entry['type'] == 'Model'
+            assert 'hash' in entry
+            # The coefficients are stored out-of-band
+            assert buffers == 1
+            assert payload < model.coef.nbytes
+
+    def test_default_skips(self):
+        frame = {'model': Model(np.arange(3), 'ols')}
+        with ensure_clean() as path:
+            stash(path, frame=frame, verbose=False)
+            vault = unstash(path, frame={}, verbose=False)
+            assert vault.items == []
+
+    def test_unpicklable(self):
+        frame = {'func': lambda x: x, 'x': 1.0}
+        with ensure_clean() as path:
+            with pytest.warns(UnsupportedValueWarning):
+                stash(path, frame=frame, verbose=False, fallback='pickle')
+            vault = unstash(path, frame={}, verbose=False)
+            assert vault.items == ['x']
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            stash(frame={}, verbose=False, fallback='json')
+
+    def test_read_lazy_and_diff(self):
+        first = Model(np.arange(100.0), 'a')
+        second = Model(np.arange(100.0) + 1, 'a')
+        with ensure_clean() as path_a, ensure_clean() as path_b:
+            stash(path_a, frame={'model': first}, verbose=False,
+                  fallback='pickle', checksums=False)
+            stash(path_b, frame={'model': second}, verbose=False,
+                  fallback='pickle')
+            loader = Loader(path_a, insert=False, frame={}, verbose=False)
+            np.testing.assert_array_equal(loader.read('model').coef,
+                                          first.coef)
+            vault = unstash(path_b, insert=False, frame={}, verbose=False,
+                            lazy=True)
+            np.testing.assert_array_equal(vault.model.coef, second.coef)
+            assert list(stash_diff(path_a, path_b).changed) == ['model']
+            assert stash_diff(path_a, path_a).unchanged == ['model']
+
+    def test_store_dir(self):
+        store_dir = tempfile.mkdtemp()
+        try:
+            model = Model(np.arange(100.0), 'a')
+            with ensure_clean() as path:
+                stash(path, frame={'model': model}, verbose=False,
+                      fallback='pickle', store_dir=store_dir)
+                vault = unstash(path, frame={}, verbose=False)
+                np.testing.assert_array_equal(vault.model.coef, model.coef)
+                with tables.open_file(path) as h5f:
+                    assert '/pickle:model' not in h5f
+        finally:
+            shutil.rmtree(store_dir)
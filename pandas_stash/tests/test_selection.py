@@ -0,0 +1,217 @@
+from collections.abc import Mapping
+import os
+import re
+import shutil
+import tempfile
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.util.testing import ensure_clean
+
+from pandas_stash import stash, unstash
+from pandas_stash.selection import NameMatcher, Selector, namespace
+
+
+class CountingFrame(Mapping):
+    """
+    Mapping that counts the scans of its keys
+    """
+
+    def __init__(self, data):
+        self._data = data
+        self.scans = 0
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __iter__(self):
+        self.scans += 1
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+
+def _names(n):
+    return ['var_{0}_{1}'.format(i % 1000, i) for i in range(n)]
+
+
+class TestNameMatcher(object):
+    def test_patterns(self):
+        matcher = NameMatcher(['exact', 'ap*le', 'ap*x', '*pple', 'f?t_*',
+                               'm[ab]*', 'x.*'])
+        assert not matcher.exact
+        matched = ['exact', 'apple', 'ap_x', 'pineapple', 'fit_1', 'mb',
+                   'x.y']
+        for name in matched:
+            assert matcher(name)
+        unmatched = ['exactly', 'apples', 'fiit_1', 'mc', 'xy', 'a']
+        for name in unmatched:
+            assert not matcher(name)
+
+    def test_regexes(self):
+        matcher = NameMatcher([re.compile(r'_\d+$'),
+                               re.compile('^model', re.IGNORECASE)])
+        assert matcher('fit_12')
+        assert matcher('MODEL_a')
+        assert not matcher('fit_12a')
+        assert not matcher('a_model')
+
+    def test_exact(self):
+        matcher = NameMatcher(['b', 'a', 'b'])
+        assert matcher.exact
+        assert matcher.names == ['b', 'a']
+        assert not NameMatcher(['a', re.compile('b')]).exact
+
+
+class TestSelector(object):
+    def test_namespace(self):
+        first = {'a': 1, 'b': 2}
+        second = {'b': 3, 'c': 4}
+        frame = namespace([first, second])
+        assert dict(frame) == {'a': 1, 'b': 2, 'c': 4}
+        assert namespace((first,)) is first
+        proxy = MappingProxyType(first)
+        assert namespace(proxy) is proxy
+        with pytest.raises(TypeError):
+            namespace([first, 1])
+        with pytest.raises(TypeError):
+            namespace([])
+
+    def test_select(self):
+        frame = {'a': 1, 'b': np.zeros(10), 'c': np.zeros(1000), '_d': 1.0,
+                 'e': 'text', 1: 'not a name'}
+        assert Selector().names(frame) == ['a', 'b', 'c', 'e']
+        assert Selector(private=True).names(frame) == ['a', 'b', 'c', '_d',
+                                                       'e']
+        assert Selector(exclude=['a', 'b', 'c*']).names(frame) == ['e']
+        # Without a wildcard, ? is part of a name
+        assert Selector(include=['?']).names(frame) == []
+        assert Selector(include=['a'], exclude=['a']).names(frame) == ['a']
+        selected = Selector(types=np.ndarray).select(frame)
+        assert [name for name, _ in selected] == ['b', 'c']
+        selected = Selector(types=[int, str], max_nbytes=100).select(frame)
+        assert [name for name, _ in selected] == ['a', 'e']
+        selected = Selector(max_nbytes=1000).select(frame)
+        assert 'c' not in [name for name, _ in selected]
+        with pytest.raises(ValueError):
+            Selector(max_nbytes=-1)
+
+    def test_exact_include_does_not_scan(self):
+        frame = CountingFrame(dict((name, 1) for name in _names(1000)))
+        selector = Selector(include=['var_1_1', 'missing', 'var_2_2'])
+        assert selector.names(frame) == ['var_1_1', 'var_2_2']
+        assert frame.scans == 0
+        Selector(include=['var_1_*']).names(frame)
+        assert frame.scans == 1
+
+
+class TestStashSelection(object):
+    def test_list_only(self):
+        frame = {'df': pd.DataFrame({'a': [1, 2]}), 'arr': np.arange(3),
+                 'x': 1.0, 'results': {'a': np.arange(2)},
+                 'obj': object(), 'os': os}
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'workspace.h5')
+        try:
+            selection = stash(path, frame=frame, list_only=True,
+                              verbose=False)
+            assert not os.path.exists(path)
+        finally:
+            shutil.rmtree(directory)
+        assert selection == {'df': 'pandas', 'arr': 'numpy', 'x': 'builtin',
+                             'results': 'container'}
+        selection = stash(frame=frame, list_only=True, fallback='pickle',
+                          numpy=False, verbose=False)
+        assert selection == {'df': 'pandas', 'x': 'builtin',
+                             'results': 'container', 'obj': 'pickle'}
+        selection = stash(frame=frame, list_only=True, types=np.ndarray,
+                          verbose=False)
+        assert selection == {'arr': 'numpy'}
+
+    def test_frames(self):
+        local = {'a': 1, 'df': pd.DataFrame({'a': [1.0]})}
+        module = {'a': 2, 'b': 'text'}
+        with ensure_clean() as path:
+            stash(path, frame=[local, MappingProxyType(module)],
+                  verbose=False)
+            vault = unstash(path, frame={}, verbose=False)
+        assert vault.a == 1
+        assert vault.b == 'text'
+        pd.testing.assert_frame_equal(vault.df, local['df'])
+
+    def test_predicates(self):
+        frame = {'fit_1': np.zeros(10), 'fit_2': np.zeros(10000),
+                 'fit_a': np.zeros(10), 'name': 'fit', 'other': 1}
+        with ensure_clean() as path:
+            stash(path, frame=frame, include=[re.compile(r'^fit_\d$')],
+                  max_nbytes=1000, verbose=False)
+            vault = unstash(path, frame={}, verbose=False)
+        assert list(vault) == ['fit_1']
+
+    def test_shards(self):
+        first = {'a': np.arange(10)}
+        second = {'a': 1, 'b': np.arange(5), 'c': 1.0}
+        directory = os.path.join(tempfile.mkdtemp(), 'stash')
+        try:
+            stash(directory, frame=[first, second], shards=2, workers=1,
+                  max_nbytes=60, verbose=False)
+            vault = unstash(directory, frame={}, verbose=False)
+        finally:
+            shutil.rmtree(os.path.dirname(directory))
+        assert sorted(vault) == ['b', 'c']
+
+
+class NoScanFrame(CountingFrame):
+    """
+    Mapping that fails if its keys are scanned
+    """
+
+    def __iter__(self):
+        raise AssertionError('the namespace was scanned')
+
+    def keys(self):
+        raise AssertionError('the namespace was scanned')
+
+
+class TestScaling(object):
+    """
+    Selection from large namespaces
+
+    The time taken is measured by benchmarks/selection.py.
+    """
+
+    def test_many_patterns(self):
+        frame = dict((name, 1) for name in _names(100000))
+        patterns = ['var_{0}_*'.format(i) for i in range(300)]
+        patterns += ['res_{0}'.format(i) for i in range(300)]
+        selector = Selector(include=patterns)
+        assert len(selector.names(frame)) == 100 * 300
+        # Patterns are grouped by the length of their literal prefix, so
+        # each name is tried against one matcher per length
+        matcher = NameMatcher(patterns)
+        assert [length for length, _ in matcher._prefixed] == [6, 7, 8]
+        assert matcher._wildcards is None
+
+    def test_many_names(self):
+        frame = CountingFrame(dict((name, 1) for name in _names(100000)))
+        patterns = ['var_{0}_*'.format(i) for i in range(100)]
+        patterns.append(re.compile('_99999$'))
+        selected = Selector(exclude=patterns).names(frame)
+        assert len(selected) == 90000 - 1
+        assert 'var_999_99999' not in selected
+        assert 'var_100_100' in selected
+        assert frame.scans == 1
+
+    def test_exact_names(self):
+        frame = NoScanFrame(dict((name, 1) for name in _names(100000)))
+        include = _names(100)
+        selector = Selector(include=include + ['missing'])
+        assert selector.names(frame) == include
+        selected = selector.select(frame)
+        assert [name for name, _ in selected] == include
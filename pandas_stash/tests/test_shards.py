@@ -0,0 +1,164 @@
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pytest
+import tables
+
+from pandas_stash import stash, unstash
+from pandas_stash.manifest import read_manifest
+from pandas_stash.shards import INDEX_FILE, assign_shards
+
+
+@pytest.fixture
+def directory():
+    path = tempfile.mkdtemp()
+    yield os.path.join(path, 'workspace')
+    shutil.rmtree(path)
+
+
+def _frame():
+    return {'big': np.random.randn(100000),
+            'df': pd.DataFrame({'a': np.arange(1000.0),
+                                'b': ['x', 'y'] * 500}),
+            's': pd.Series(np.arange(100)),
+            'arr': np.arange(10),
+            'x': 1.0, 'y': 'text',
+            'results': {'fits': [np.arange(3)]}}
+
+
+def _index(path):
+    with open(os.path.join(path, INDEX_FILE)) as index_file:
+        return json.load(index_file)
+
+
+def _inodes(path):
+    return dict((name, os.stat(os.path.join(path, name)).st_ino)
+                for name in _index(path)['shards'])
+
+
+def _assert_restored(vault, frame):
+    assert sorted(vault) == sorted(frame)
+    np.testing.assert_array_equal(vault.big, frame['big'])
+    pd.testing.assert_frame_equal(vault.df, frame['df'])
+    pd.testing.assert_series_equal(vault.s, frame['s'])
+    np.testing.assert_array_equal(vault.arr, frame['arr'])
+    np.testing.assert_array_equal(vault.results['fits'][0],
+                                  frame['results']['fits'][0])
+    assert vault.x == 1.0
+    assert vault.y == 'text'
+
+
+class TestAssignShards(object):
+    def test_balanced(self):
+        sizes = {'a': 100, 'b': 60, 'c': 50, 'd': 40, 'e': 10}
+        shards = assign_shards(sizes, 2)
+        loads = [sum(sizes[name] for name in shards if shards[name] == i)
+                 for i in range(2)]
+        assert sorted(loads) == [120, 140]
+
+    def test_previous_kept(self):
+        sizes = {'a': 100, 'b': 100, 'c': 1}
+        shards = assign_shards(sizes, 3, previous={'a': 2, 'b': 2,
+                                                   'gone': 0})
+        assert shards['a'] == shards['b'] == 2
+        assert shards['c'] in (0, 1)
+        assert assign_shards(sizes, 2, previous={'a': 2})['a'] in (0, 1)
+
+
+class TestShards(object):
+    def test_round_trip(self, directory):
+        frame = _frame()
+        stash(directory, frame=frame, shards=3, workers=2, verbose=False)
+        assert sorted(os.listdir(directory)) == [
+            INDEX_FILE, 'shard-0000.h5', 'shard-0001.h5', 'shard-0002.h5']
+        _assert_restored(unstash(directory, frame={}, verbose=False), frame)
+        restored = {}
+        unstash(directory, frame=restored, verbose=False)
+        assert sorted(restored) == sorted(frame)
+        np.testing.assert_array_equal(restored['big'], frame['big'])
+
+    def test_unchanged_shards_kept(self, directory):
+        frame = _frame()
+        del frame['results']
+        stash(directory, frame=frame, shards=3, verbose=False)
+        before = _inodes(directory)
+        shard_of = dict((name, entry['shard']) for name, entry in
+                        _index(directory)['variables'].items())
+        frame['arr'] = np.arange(20)
+        stash(directory, frame=frame, verbose=False)
+        after = _inodes(directory)
+        changed = 'shard-{0:04d}.h5'.format(shard_of['arr'])
+        for name in before:
+            assert (before[name] != after[name]) == (name == changed)
+        vault = unstash(directory, frame={}, verbose=False)
+        np.testing.assert_array_equal(vault.arr, np.arange(20))
+        # Removing a variable rewrites its shard
+        del frame['arr']
+        stash(directory, frame=frame, verbose=False)
+        assert 'arr' not in unstash(directory, frame={}, verbose=False)
+
+    def test_changed_options_rewrite(self, directory):
+        frame = _frame()
+        del frame['results']
+        stash(directory, frame=frame, shards=2, verbose=False)
+        before = _inodes(directory)
+        stash(directory, frame=frame, verbose=False, complevel=9,
+              checksums=True)
+        after = _inodes(directory)
+        assert all(before[name] != after[name] for name in before)
+        for name in after:
+            with tables.open_file(os.path.join(directory, name)) as h5f:
+                entries = read_manifest(h5f)['variables'].values()
+            assert all('hash' in entry for entry in entries
+                       if entry['kind'] != 'builtin')
+        vault = unstash(directory, frame={}, verbose=False)
+        pd.testing.assert_frame_equal(vault.df, frame['df'])
+        before = after
+        stash(directory, frame=frame, verbose=False, complevel=9,
+              checksums=True)
+        assert _inodes(directory) == before
+
+    def test_change_shard_count(self, directory):
+        frame = _frame()
+        stash(directory, frame=frame, shards=4, verbose=False)
+        stash(directory, frame=frame, shards=2, verbose=False)
+        assert sorted(os.listdir(directory)) == [
+            INDEX_FILE, 'shard-0000.h5', 'shard-0001.h5']
+        _assert_restored(unstash(directory, frame={}, verbose=False), frame)
+
+    def test_deferred(self, directory):
+        frame = _frame()
+        stash(directory, frame=frame, shards=2, verbose=False)
+        vault = unstash(directory, frame={}, insert=False, lazy=True,
+                        verbose=False)
+        np.testing.assert_array_equal(vault.big[:5], frame['big'][:5])
+        vault = unstash(directory, frame={}, insert=False, verbose=False,
+                        max_bytes=10000)
+        _assert_restored(vault, frame)
+
+    def test_read_in_process(self, directory, monkeypatch):
+        frame = _frame()
+        stash(directory, frame=frame, shards=3, workers=1, verbose=False)
+
+        def no_processes(*args, **kwargs):
+            raise AssertionError('shards must be read in this process')
+
+        monkeypatch.setattr('pandas_stash.shards.multiprocessing.Pool',
+                            no_processes)
+        _assert_restored(unstash(directory, frame={}, verbose=False), frame)
+        vault = unstash(directory, frame={}, insert=False, lazy=True,
+                        verbose=False)
+        np.testing.assert_array_equal(vault.big[:5], frame['big'][:5])
+
+    def test_invalid(self, directory):
+        with pytest.raises(ValueError):
+            stash(directory, frame={'x': 1.0}, shards=0, verbose=False)
+        with pytest.raises(ValueError):
+            stash(directory, frame={'x': 1.0}, shards=1.5, verbose=False)
+        stash(directory, frame={'x': 1.0}, shards=1, verbose=False)
+        with pytest.raises(ValueError):
+            unstash(directory, frame={}, max_bytes=100, verbose=False)
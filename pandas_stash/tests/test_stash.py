@@ -240,3 +240,64 @@ class TestVault(object):
             assert 'a' in globals()
             np.testing.assert_array_equal(vault.a, np.array([1, 0, 1, 0, 1, 0], dtype=np.bool))
         del a
+
+    def test_max_bytes(self):
+        frame = {'df': pd.DataFrame(np.random.randn(1000, 10)),
+                 's': pd.Series(np.arange(1000.0)),
+                 'arr': np.random.randn(1000, 10),
+                 'a': 1}
+        with ensure_clean() as path:
+            stash(path, frame=frame, verbose=False)
+            vault = unstash(path, verbose=False, insert=False,
+                            max_bytes=100000)
+            assert vault.items == ['a', 'arr', 'df', 's']
+            assert vault._resident_bytes == 0
+            assert vault.a == 1
+            pd.testing.assert_frame_equal(vault.df, frame['df'])
+            pd.testing.assert_series_equal(vault.s, frame['s'])
+            np.testing.assert_array_equal(vault.arr, frame['arr'])
+            assert 'df' not in vault._resident
+            assert vault._resident_bytes <= 100000
+            pd.testing.assert_frame_equal(vault['df'], frame['df'])
+            assert 'df' in vault._resident
+
+            with pytest.raises(ValueError):
+                unstash(path, verbose=False, max_bytes=100000)
+
+    def test_numpy_native_dtypes(self):
+        record = np.dtype([('x', np.float64), ('y', np.int32, (2,)),
+                           ('when', 'M8[s]'), ('name', 'S4')])
+        records = np.zeros((3, 2), dtype=record)
+        records['x'] = np.arange(6.0).reshape((3, 2))
+        records['when'] = np.datetime64('2015-07-06', 's')
+        records['name'] = b'abc'
+        frame = {'c128': np.arange(12.0).reshape((3, 4)) * (1 - 2j),
+                 'c64': np.arange(4, dtype=np.complex64),
+                 'f16': np.arange(4, dtype=np.float16),
+                 'dt': np.arange(4).astype('M8[ns]'),
+                 'days': np.arange(4).astype('M8[D]'),
+                 'td': np.arange(4).astype('m8[ms]'),
+                 'records': records,
+                 'empty': np.empty((0, 2), dtype=np.complex128)}
+        with ensure_clean() as path:
+            stash(path, frame=frame, verbose=False)
+            for max_bytes in (None, 10 ** 6):
+                vault = unstash(path, frame={}, verbose=False,
+                                insert=max_bytes is None, max_bytes=max_bytes)
+                assert vault.items == sorted(frame)
+                for key in frame:
+                    assert vault[key].dtype == frame[key].dtype
+                    assert vault[key].shape == frame[key].shape
+                    np.testing.assert_array_equal(vault[key], frame[key])
+
+    def test_numpy_native_not_converted(self):
+        frame = {'dt': np.arange(4).astype('M8[ns]')}
+        with ensure_clean() as path:
+            stash(path, frame=frame, verbose=False)
+            import tables
+            with tables.open_file(path) as h5f:
+                node = h5f.get_node('/', 'array:dt')
+                assert isinstance(node, tables.CArray)
+                assert node.dtype == np.int64
+            stash(path, frame=frame, verbose=False, numpy=False)
+            assert unstash(path, frame={}, verbose=False) == {}
@@ -0,0 +1,202 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pytest
+import tables
+from pandas.util.testing import ensure_clean
+
+from pandas_stash import stash, stash_diff, stash_gc, unstash
+from pandas_stash.arrays import ArrayProxy
+from pandas_stash.hashing import hash_variable
+from pandas_stash.manifest import read_manifest
+from pandas_stash.store import ObjectStore
+
+
+@pytest.fixture
+def store_dir():
+    path = tempfile.mkdtemp()
+    yield path
+    shutil.rmtree(path)
+
+
+def _frame():
+    return {'df': pd.DataFrame({'a': np.arange(100.0),
+                                'b': ['x'] * 100}),
+            's': pd.Series(np.arange(10)),
+            'arr': np.random.randn(50, 3),
+            'scalar': 1.0}
+
+
+class TestObjectStore(object):
+    def test_round_trip(self, store_dir):
+        frame = _frame()
+        with ensure_clean() as path:
+            stash(path, frame=frame, verbose=False, store_dir=store_dir)
+            with tables.open_file(path) as h5f:
+                names = [node._v_name for node in h5f.root]
+                manifest = read_manifest(h5f)
+            assert sorted(names) == ['builtin:float', 'stash:manifest']
+            assert manifest['store_dir'] == os.path.abspath(store_dir)
+            assert len(ObjectStore(store_dir).blobs()) == 3
+            for lazy in (False, True):
+                vault = unstash(path, frame={}, insert=False, verbose=False,
+                                lazy=lazy)
+                assert vault.items == sorted(frame)
+                pd.testing.assert_frame_equal(vault.df, frame['df'])
+                pd.testing.assert_series_equal(vault.s, frame['s'])
+                np.testing.assert_array_equal(vault.arr, frame['arr'])
+                assert vault.scalar == 1.0
+            assert isinstance(vault.arr, ArrayProxy)
+
+    def test_deduplication(self, store_dir):
+        frame = _frame()
+        objects = ObjectStore(store_dir)
+        with ensure_clean() as first, ensure_clean() as second:
+            stash(first, frame=frame, verbose=False, store_dir=store_dir)
+            blobs = objects.blobs()
+            renamed = {'copy_of_df': frame['df'], 'arr': frame['arr']}
+            stash(second, frame=renamed, verbose=False, store_dir=store_dir)
+            assert objects.blobs() == blobs
+            assert len(objects.refs()) == 2
+            vault = unstash(second, frame={}, verbose=False)
+            pd.testing.assert_frame_equal(vault.copy_of_df, frame['df'])
+
+    def test_gc(self, store_dir):
+        frame = _frame()
+        objects = ObjectStore(store_dir)
+        with ensure_clean() as first, ensure_clean() as second:
+            stash(first, frame=frame, verbose=False, store_dir=store_dir)
+            stash(second, frame={'arr': frame['arr']}, verbose=False,
+                  store_dir=store_dir)
+            assert stash_gc(store_dir, grace=0) == []
+            # Overwriting drops the references to df and s
+            stash(first, frame={'arr': frame['arr']}, verbose=False,
+                  store_dir=store_dir)
+            assert stash_gc(store_dir) == []
+            assert len(stash_gc(store_dir, grace=0, dry_run=True)) == 2
+            assert len(objects.blobs()) == 3
+            assert len(stash_gc(store_dir, grace=0)) == 2
+            assert len(objects.blobs()) == 1
+            np.testing.assert_array_equal(
+                unstash(first, frame={}, verbose=False).arr, frame['arr'])
+            # Stashes written without the store no longer reference it
+            stash(second, frame=frame, verbose=False)
+        assert len(stash_gc(store_dir, grace=0)) == 1
+        assert objects.refs() == []
+        assert objects.blobs() == []
+
+    def test_missing_blob(self, store_dir):
+        with ensure_clean() as path:
+            stash(path, frame=_frame(), verbose=False, store_dir=store_dir)
+            for _, blob in ObjectStore(store_dir).blobs():
+                os.remove(blob)
+            with pytest.raises(IOError):
+                unstash(path, frame={}, verbose=False)
+
+    def test_alternative_store_dir(self, store_dir):
+        frame = _frame()
+        with ensure_clean() as path:
+            stash(path, frame=frame, verbose=False, store_dir=store_dir)
+            moved = store_dir + '-moved'
+            shutil.move(store_dir, moved)
+            try:
+                vault = unstash(path, frame={}, verbose=False,
+                                store_dir=moved)
+                pd.testing.assert_frame_equal(vault.df, frame['df'])
+            finally:
+                shutil.move(moved, store_dir)
+
+
+class TestHashing(object):
+    def test_array(self):
+        arr = np.arange(100.0)
+        assert hash_variable(arr) == hash_variable(arr.copy())
+        assert hash_variable(arr) != hash_variable(arr.astype(np.float32))
+        assert hash_variable(arr) != hash_variable(arr.reshape((10, 10)))
+        changed = arr.copy()
+        changed[-1] = -1
+        assert hash_variable(arr)['hash'] != hash_variable(changed)['hash']
+        fortran = np.asfortranarray(np.random.randn(10, 10))
+        assert (hash_variable(fortran) ==
+                hash_variable(np.ascontiguousarray(fortran)))
+
+    def test_pandas(self):
+        df = pd.DataFrame({'a': np.arange(10.0), 'b': list('abcdefghij')})
+        digest = hash_variable(df)
+        assert digest == hash_variable(df.copy())
+        assert len(digest['columns']) == 2
+        assert digest != hash_variable(df.rename(columns={'a': 'c'}))
+        assert digest != hash_variable(df.astype({'a': np.float32}))
+        assert digest != hash_variable(df.set_index(df.index + 1))
+        changed = df.copy()
+        changed.loc[3, 'b'] = 'z'
+        changed_digest = hash_variable(changed)
+        assert changed_digest['columns'][0] == digest['columns'][0]
+        assert changed_digest['columns'][1] != digest['columns'][1]
+        assert hash_variable(df.a) != hash_variable(df.a.rename('b'))
+
+    def test_categories(self):
+        cat = pd.Categorical(['a', 'b', 'a'], categories=['a', 'b'])
+        extra = pd.Categorical(['a', 'b', 'a'], categories=['a', 'b', 'c'])
+        ordered = pd.Categorical(['a', 'b', 'a'], categories=['a', 'b'],
+                                 ordered=True)
+        digests = [hash_variable(pd.DataFrame({'c': values}))
+                   for values in (cat, extra, ordered)]
+        assert len(set(digest['hash'] for digest in digests)) == 3
+        assert len(set(digest['blocks'][0] for digest in digests)) == 3
+        assert len(set(digest['columns'][0] for digest in digests)) == 3
+        index = pd.Series([1.0, 2.0], index=pd.CategoricalIndex(['a', 'b']))
+        other = index.set_axis(pd.CategoricalIndex(['a', 'b'],
+                                                   categories=['b', 'a']))
+        assert hash_variable(index) != hash_variable(other)
+
+    def test_categories_in_store(self, store_dir):
+        first = pd.Series(pd.Categorical(['a', 'b'], categories=['a', 'b']))
+        second = pd.Series(pd.Categorical(['a', 'b'],
+                                          categories=['a', 'b', 'c']))
+        with ensure_clean() as path_a, ensure_clean() as path_b:
+            stash(path_a, frame={'s': first}, store_dir=store_dir,
+                  verbose=False)
+            stash(path_b, frame={'s': second}, store_dir=store_dir,
+                  verbose=False)
+            vault = unstash(path_b, frame={}, verbose=False)
+            pd.testing.assert_series_equal(vault.s, second)
+            assert list(stash_diff(path_a, path_b).changed) == ['s']
+
+    def test_value_types(self):
+        values = [['1', 'a'], [1, 'a'], [b'1', b'a'], [1.0, 'a']]
+        digests = [hash_variable(pd.Series(v)) for v in values]
+        assert len(set(digest['hash'] for digest in digests)) == 4
+        assert len(set(digest['blocks'][0] for digest in digests)) == 4
+        index = [hash_variable(pd.Series([1.0, 2.0], index=v))['hash']
+                 for v in values]
+        assert len(set(index)) == 4
+        missing = pd.Series([1, 'a', None]), pd.Series([1, 'a', np.nan])
+        assert hash_variable(missing[0]) == hash_variable(missing[1])
+
+    def test_index_types(self):
+        s = pd.Series(np.arange(3.0))
+        int_index = s.set_axis(pd.Index(np.arange(3)))
+        assert hash_variable(s)['hash'] != hash_variable(int_index)['hash']
+
+    def test_types_in_store(self, store_dir):
+        cat = pd.Categorical(['x', 'y'])
+        frames = [pd.DataFrame({'c': ['1', 'a'], 'k': cat}),
+                  pd.DataFrame({'c': [1, 'a'], 'k': cat}),
+                  pd.DataFrame({'k': cat}),
+                  pd.DataFrame({'k': cat}, index=pd.Index([0, 1]))]
+        paths = [os.path.join(store_dir, 'stash{0}.h5'.format(i))
+                 for i in range(len(frames))]
+        for path, df in zip(paths, frames):
+            stash(path, frame={'df': df}, store_dir=store_dir,
+                  fallback='pickle', verbose=False)
+        for path, df in zip(paths, frames):
+            vault = unstash(path, frame={}, verbose=False)
+            pd.testing.assert_frame_equal(vault.df, df, check_index_type=True)
+
+    def test_unhashable(self):
+        df = pd.DataFrame({'a': [[1], [2]]})
+        assert hash_variable(df) is None
@@ -0,0 +1,145 @@
+import numpy as np
+import pandas as pd
+import pytest
+import tables
+from pandas.util.testing import ensure_clean
+
+from pandas_stash import stash, stash_stream, unstash, unstash_stream
+from pandas_stash.cli import verify_stash
+from pandas_stash.hashing import BLOCK_ROWS, hash_array, hash_pandas
+from pandas_stash.manifest import read_manifest
+
+
+def _frames(nchunks, rows):
+    for i in range(nchunks):
+        index = pd.RangeIndex(i * rows, (i + 1) * rows)
+        yield pd.DataFrame({'a': np.arange(rows) + i * rows * 1.0,
+                            'b': np.array(['x', 'yz'])[np.arange(rows) % 2]},
+                           index=pd.Index(index.values))
+
+
+def _arrays(nchunks, rows):
+    for i in range(nchunks):
+        yield np.arange(i * rows * 3, (i + 1) * rows * 3).reshape(rows, 3)
+
+
+def _manifest(path):
+    with tables.open_file(path) as h5f:
+        return read_manifest(h5f)
+
+
+class TestStashStream(object):
+    @pytest.mark.parametrize('prefetch', [True, False])
+    def test_frames(self, prefetch):
+        rows = BLOCK_ROWS // 3 + 7
+        expected = pd.concat(list(_frames(5, rows)))
+        with ensure_clean() as path:
+            stash_stream(path, 'df', _frames(5, rows), prefetch=prefetch,
+                         checksums=True)
+            vault = unstash(path, frame={}, verbose=False)
+            pd.testing.assert_frame_equal(vault.df, expected)
+            entry = _manifest(path)['variables']['df']
+            assert entry['shape'] == [5 * rows, 2]
+            assert entry['hash'] == hash_pandas(expected)['hash']
+            assert entry['blocks'] == hash_pandas(expected)['blocks']
+            assert set(status for _, status, _ in
+                       verify_stash(path)) == {'ok'}
+
+    @pytest.mark.parametrize('prefetch', [True, False])
+    def test_arrays(self, prefetch):
+        expected = np.concatenate(list(_arrays(4, 1000)))
+        with ensure_clean() as path:
+            stash_stream(path, 'arr', _arrays(4, 1000), prefetch=prefetch,
+                         checksums=True)
+            vault = unstash(path, frame={}, verbose=False)
+            np.testing.assert_array_equal(vault.arr, expected)
+            lazy = unstash(path, frame={}, verbose=False, insert=False,
+                           lazy=True)
+            np.testing.assert_array_equal(lazy.arr[1500:1510],
+                                          expected[1500:1510])
+            entry = _manifest(path)['variables']['arr']
+            assert entry['hash'] == hash_array(expected)['hash']
+            assert set(status for _, status, _ in
+                       verify_stash(path)) == {'ok'}
+
+    def test_strings(self):
+        chunks = [np.array(['a', 'bc']), np.array(['de', 'f'])[:0],
+                  np.array(['hi', 'j'])]
+        with ensure_clean() as path:
+            stash_stream(path, 'arr', chunks)
+            np.testing.assert_array_equal(
+                unstash(path, frame={}, verbose=False).arr,
+                np.array(['a', 'bc', 'hi', 'j']))
+
+    def test_existing_stash(self):
+        frame = {'df': pd.DataFrame({'a': [1.0]}), 'x': 1.0, 'y': 2.0}
+        with ensure_clean() as path:
+            stash(path, frame=frame, verbose=False)
+            stash_stream(path, 'x', _arrays(2, 10), checksums=False)
+            stash_stream(path, 'df', _frames(2, 10))
+            vault = unstash(path, frame={}, verbose=False)
+            assert sorted(vault) == ['df', 'x', 'y']
+            assert vault.y == 2.0
+            np.testing.assert_array_equal(
+                vault.x, np.concatenate(list(_arrays(2, 10))))
+            pd.testing.assert_frame_equal(vault.df,
+                                          pd.concat(list(_frames(2, 10))))
+            assert 'hash' not in _manifest(path)['variables']['x']
+
+    def test_legacy_stash(self):
+        with ensure_clean() as path:
+            stash(path, frame={'x': 1.0}, verbose=False)
+            with tables.open_file(path, mode='a') as h5f:
+                h5f.remove_node('/', 'stash:manifest')
+            with pytest.raises(ValueError):
+                stash_stream(path, 'arr', _arrays(2, 10))
+            vault = unstash(path, frame={}, verbose=False)
+            assert vault.x == 1.0
+
+    def test_errors_keep_stash(self):
+        def failing():
+            yield np.arange(10)
+            raise RuntimeError('producer failed')
+
+        with ensure_clean() as path:
+            stash(path, frame={'arr': np.arange(3)}, verbose=False)
+            with pytest.raises(RuntimeError):
+                stash_stream(path, 'arr', failing())
+            with pytest.raises(ValueError):
+                stash_stream(path, 'arr', [np.arange(3), np.arange(3.0)])
+            with pytest.raises(ValueError):
+                stash_stream(path, 'df', iter([]))
+            with pytest.raises(TypeError):
+                stash_stream(path, 'df', [['not', 'a', 'chunk']])
+            vault = unstash(path, frame={}, verbose=False)
+            assert sorted(vault) == ['arr']
+            np.testing.assert_array_equal(vault.arr, np.arange(3))
+            with tables.open_file(path) as h5f:
+                assert '/stream:arr' not in h5f
+
+
+class TestUnstashStream(object):
+    def test_chunks(self):
+        df = pd.concat(list(_frames(3, 100)))
+        arr = np.random.randn(250, 2)
+        with ensure_clean() as path:
+            stash(path, frame={'df': df, 'arr': arr, 'x': 1.0},
+                  verbose=False)
+            chunks = list(unstash_stream(path, 'df', rows=120))
+            assert [len(chunk) for chunk in chunks] == [120, 120, 60]
+            pd.testing.assert_frame_equal(pd.concat(chunks), df)
+            chunks = list(unstash_stream(path, 'arr', rows=100))
+            assert [len(chunk) for chunk in chunks] == [100, 100, 50]
+            np.testing.assert_array_equal(np.concatenate(chunks), arr)
+            assert len(list(unstash_stream(path, 'arr'))) == 1
+            with pytest.raises(TypeError):
+                unstash_stream(path, 'x')
+            with pytest.raises(KeyError):
+                unstash_stream(path, 'missing')
+
+    def test_round_trip(self):
+        with ensure_clean() as path:
+            stash_stream(path, 'df', _frames(4, 50))
+            chunks = unstash_stream(path, 'df', rows=50)
+            for chunk, expected in zip(chunks, _frames(4, 50)):
+                pd.testing.assert_frame_equal(chunk, expected)
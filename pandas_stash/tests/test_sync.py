@@ -0,0 +1,91 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pandas_stash import stash, unstash, wait_for_stash
+
+
+@pytest.fixture
+def directory():
+    path = tempfile.mkdtemp()
+    yield path
+    shutil.rmtree(path)
+
+
+class TestAtomic(object):
+    def test_no_temporary_files(self, directory):
+        path = os.path.join(directory, 'stash.h5')
+        stash(path, frame={'x': 1.0, 'arr': np.arange(10)}, verbose=False)
+        stash(path, frame={'x': 2.0}, verbose=False)
+        assert os.listdir(directory) == ['stash.h5']
+        assert unstash(path, frame={}, verbose=False).x == 2.0
+
+    def test_failed_write_keeps_previous(self, directory):
+        path = os.path.join(directory, 'stash.h5')
+        stash(path, frame={'x': 1.0}, verbose=False)
+        unstorable = pd.DataFrame({'a': [[1], 'a']})
+        with pytest.raises(Exception):
+            stash(path, frame={'x': 2.0, 'df': unstorable}, verbose=False)
+        assert os.listdir(directory) == ['stash.h5']
+        assert unstash(path, frame={}, verbose=False).x == 1.0
+
+    def test_replaced_while_deferred(self, directory):
+        path = os.path.join(directory, 'stash.h5')
+        frame = {'arr': np.arange(10), 's': pd.Series(np.arange(3))}
+        stash(path, frame=frame, verbose=False)
+        vault = unstash(path, insert=False, frame={}, verbose=False,
+                        lazy=True)
+        proxy = vault.arr
+        assert proxy[3] == 3
+        time.sleep(0.01)
+        stash(path, frame={'arr': np.arange(20)}, verbose=False)
+        with pytest.raises(IOError):
+            proxy[3]
+        with pytest.raises(IOError):
+            vault.s
+
+    def test_not_atomic(self, directory):
+        path = os.path.join(directory, 'stash.h5')
+        stash(path, frame={'x': 1.0}, verbose=False, atomic=False)
+        assert os.listdir(directory) == ['stash.h5']
+        assert unstash(path, frame={}, verbose=False).x == 1.0
+
+
+class TestWaitForStash(object):
+    def test_existing(self, directory):
+        path = os.path.join(directory, 'stash.h5')
+        stash(path, frame={'x': 1.0}, verbose=False)
+        assert wait_for_stash(path, timeout=1) == os.stat(path).st_mtime
+
+    def test_timeout(self, directory):
+        path = os.path.join(directory, 'stash.h5')
+        with pytest.raises(IOError):
+            wait_for_stash(path, timeout=0.1)
+        # Files without a manifest are not complete stashes
+        pd.Series([1.0]).to_hdf(path, 'series')
+        with pytest.raises(IOError):
+            wait_for_stash(path, timeout=0.1)
+
+    def test_newer_than(self, directory):
+        path = os.path.join(directory, 'stash.h5')
+        stash(path, frame={'x': 1.0}, verbose=False)
+        first = wait_for_stash(path)
+
+        def publish():
+            time.sleep(0.2)
+            stash(path, frame={'x': 2.0}, verbose=False)
+
+        writer = threading.Thread(target=publish)
+        writer.start()
+        try:
+            second = wait_for_stash(path, newer_than=first, timeout=10)
+        finally:
+            writer.join()
+        assert second > first
+        assert unstash(path, frame={}, verbose=False).x == 2.0
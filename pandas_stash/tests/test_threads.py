@@ -0,0 +1,170 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+import shutil
+import tempfile
+import threading
+import warnings
+
+import numpy as np
+import pandas as pd
+from tables.exceptions import NaturalNameWarning
+
+from pandas_stash import Loader, stash, stash_stream, unstash, unstash_stream
+from pandas_stash.concurrency import hdf5_lock
+
+THREADS = 8
+ROUNDS = 4
+
+
+def _frame(seed):
+    rs = np.random.RandomState(seed)
+    return {'df': pd.DataFrame({'a': rs.randn(500),
+                                'b': np.arange(500) + seed,
+                                'c': ['x', 'y'] * 250}),
+            's': pd.Series(rs.randn(100)),
+            'arr': rs.randn(50, 4),
+            'x': float(seed),
+            'results': {'fits': [np.arange(seed), 'label']}}
+
+
+def _check(vault, frame):
+    pd.testing.assert_frame_equal(vault['df'], frame['df'])
+    pd.testing.assert_series_equal(vault['s'], frame['s'])
+    np.testing.assert_array_equal(vault['arr'], frame['arr'])
+    assert vault['x'] == frame['x']
+    np.testing.assert_array_equal(vault['results']['fits'][0],
+                                  frame['results']['fits'][0])
+
+
+def _round_trip(directory, seed):
+    # Threads sharing a file write the same variables to it.  Lazy vaults
+    # raise once their file is replaced, so each thread reads its own.
+    frame = _frame(seed % THREADS)
+    path = os.path.join(directory, 'stash-{0}.h5'.format(seed % THREADS))
+    own = os.path.join(directory, 'lazy-{0}.h5'.format(seed))
+    for _ in range(ROUNDS):
+        stash(path, frame=frame, verbose=False)
+        _check(unstash(path, frame={}, verbose=False), frame)
+        stash(own, frame=frame, verbose=False)
+        _check(unstash(own, frame={}, insert=False, verbose=False,
+                       lazy=True), frame)
+        loader = Loader(path, insert=False, verbose=False)
+        np.testing.assert_array_equal(loader.read('arr'), frame['arr'])
+        buffer = stash(frame=frame, to='memory', verbose=False)
+        _check(unstash(buffer, frame={}, verbose=False), frame)
+    return seed
+
+
+def _streamed(directory, seed):
+    frame = _frame(seed)
+    chunks = (frame['df'].iloc[i:i + 100] for i in range(0, 500, 100))
+    path = os.path.join(directory, 'stream-{0}.h5'.format(seed))
+    stash_stream(path, 'df', chunks)
+    out = pd.concat(unstash_stream(path, 'df', rows=64))
+    pd.testing.assert_frame_equal(out, frame['df'])
+    shared = os.path.join(directory, 'streams.h5')
+    out = pd.concat(unstash_stream(shared, 'df', rows=64 + seed))
+    pd.testing.assert_frame_equal(out, _frame(0)['df'])
+    return seed
+
+
+def _lock_free():
+    # Whether another thread can take the lock
+    result = []
+
+    def attempt():
+        lock = hdf5_lock()
+        acquired = lock.acquire(blocking=False)
+        if acquired:
+            lock.release()
+        result.append(acquired)
+
+    thread = threading.Thread(target=attempt)
+    thread.start()
+    thread.join()
+    return result[0]
+
+
+class Probe(object):
+    """
+    Object that records whether the lock is free while it is pickled and
+    unpickled
+    """
+
+    free = []
+
+    def __init__(self, unpickled=False):
+        if unpickled:
+            Probe.free.append(_lock_free())
+
+    def __reduce__(self):
+        Probe.free.append(_lock_free())
+        return Probe, (True,)
+
+
+class TestThreads(object):
+    def setup_method(self):
+        self.directory = tempfile.mkdtemp()
+
+    def teardown_method(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_separate_files(self):
+        seeds = list(range(THREADS))
+        with ThreadPoolExecutor(THREADS) as executor:
+            done = list(executor.map(
+                lambda seed: _round_trip(self.directory, seed), seeds))
+        assert done == seeds
+
+    def test_shared_files(self):
+        # Several threads write and read each file in turn
+        seeds = list(range(2 * THREADS))
+        directory = self.directory
+
+        def work(seed):
+            frame = _frame(seed % THREADS)
+            path = os.path.join(directory, 'shared.h5')
+            stash(path, frame=frame, verbose=False)
+            vault = unstash(path, frame={}, verbose=False)
+            assert set(vault.keys()) == set(frame)
+            return _round_trip(directory, seed)
+
+        with ThreadPoolExecutor(THREADS) as executor:
+            done = list(executor.map(work, seeds))
+        assert done == seeds
+
+    def test_streams(self):
+        path = os.path.join(self.directory, 'streams.h5')
+        stash(path, frame=_frame(0), verbose=False)
+        seeds = list(range(THREADS))
+        with ThreadPoolExecutor(THREADS) as executor:
+            done = list(executor.map(
+                lambda seed: _streamed(self.directory, seed), seeds))
+        assert done == seeds
+
+    def test_warning_filters_unchanged(self):
+        path = os.path.join(self.directory, 'filters.h5')
+        with warnings.catch_warnings(record=True) as w:
+            stash(path, frame=_frame(0), verbose=False)
+            filters = list(warnings.filters)
+            stash(path, frame=_frame(0), verbose=False)
+            unstash(path, frame={}, verbose=False)
+            assert warnings.filters == filters
+        assert not [m for m in w if issubclass(m.category, NaturalNameWarning)]
+
+    def test_pickled_without_lock(self):
+        path = os.path.join(self.directory, 'probe.h5')
+        Probe.free = []
+        stash(path, frame={'probe': Probe()}, fallback='pickle',
+              verbose=False)
+        assert Probe.free == [True]
+        assert isinstance(unstash(path, frame={}, verbose=False)['probe'],
+                          Probe)
+        assert Probe.free == [True, True]
+
+    def test_reentrant(self):
+        path = os.path.join(self.directory, 'reentrant.h5')
+        with hdf5_lock():
+            with hdf5_lock():
+                stash(path, frame={'x': 1.0}, verbose=False)
+            assert unstash(path, frame={}, verbose=False)['x'] == 1.0
@@ -1,3 +1,4 @@
+import sys
 import warnings
 
 from pandas_stash.vault import Vault, ReservedWordWarning
@@ -65,3 +66,98 @@ class TestVault(object):
         vault['b'] = 'b'
         assert sorted(vault.items) == sorted(vault.keys())
         assert sorted(['items'] + vault.items) == sorted(dir(vault))
+
+    def test_lazy(self):
+        calls = []
+
+        def load():
+            calls.append(1)
+            return 'value'
+
+        vault = Vault()
+        vault._set_lazy('a', load)
+        assert 'a' in vault
+        assert calls == []
+        assert vault.a == 'value'
+        assert vault['a'] == 'value'
+        assert len(calls) == 1
+        vault['a'] = 'other'
+        assert vault.a == 'other'
+        assert len(calls) == 1
+
+    def test_lazy_as_dict(self):
+        vault = Vault(max_bytes=10)
+        vault._set_lazy('a', lambda: 'a')
+        vault._set_lazy('b', lambda: 'b')
+        vault.c = 'c'
+        expected = {'a': 'a', 'b': 'b', 'c': 'c'}
+        assert dict(vault) == expected
+        assert {**vault} == expected
+        assert vault == expected
+        assert expected == vault
+        assert not vault != expected
+        assert vault != {'a': 'a'}
+        assert vault == vault.copy()
+        values = vault.values()
+        assert list(values) == ['a', 'b', 'c']
+        assert list(values) == ['a', 'b', 'c']
+        assert len(values) == 3
+        assert 'b' in values
+        assert vault.setdefault('a') == 'a'
+        assert vault.popitem() == ('c', 'c')
+
+    def test_max_bytes(self):
+        loads = []
+
+        def loader(key):
+            def load():
+                loads.append(key)
+                return bytearray(100)
+            return load
+
+        max_bytes = 2 * sys.getsizeof(bytearray(100)) + 10
+        vault = Vault(max_bytes=max_bytes)
+        for key in ('a', 'b', 'c', 'd'):
+            vault._set_lazy(key, loader(key))
+        vault.a
+        vault.b
+        assert loads == ['a', 'b']
+        vault.a  # a is now the most recently used
+        vault.c  # evicts b
+        assert loads == ['a', 'b', 'c']
+        assert vault._resident_bytes <= max_bytes
+        vault.a
+        assert loads == ['a', 'b', 'c']
+        vault.b
+        assert loads == ['a', 'b', 'c', 'b']
+        vault.d
+        assert len(vault._resident) == 2
+        assert sorted(vault.keys()) == ['a', 'b', 'c', 'd']
+        assert vault.items == ['a', 'b', 'c', 'd']
+        assert sorted(['items'] + vault.items) == sorted(dir(vault))
+        assert len(list(vault.values())) == 4
+
+    def test_max_bytes_oversized(self):
+        vault = Vault(max_bytes=10)
+        vault._set_lazy('a', lambda: bytearray(100))
+        assert len(vault.a) == 100
+        assert 'a' in vault._resident
+        del vault['a']
+        assert 'a' not in vault
+        assert vault._resident_bytes == 0
+
+    def test_copy_and_pickle(self):
+        import pickle
+        vault = Vault(max_bytes=1000)
+        vault._set_lazy('a', lambda: 'a')
+        vault.b = 'b'
+        copied = vault.copy()
+        assert isinstance(copied, Vault)
+        assert copied.a == 'a'
+        assert copied.b == 'b'
+        restored = pickle.loads(pickle.dumps(vault))
+        assert restored == {'a': 'a', 'b': 'b'}
+        assert vault.get('a') == 'a'
+        assert vault.get('z', 1) == 1
+        assert vault.pop('a') == 'a'
+        assert 'a' not in vault
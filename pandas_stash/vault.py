@@ -1,6 +1,10 @@
 """
 Inspired by Bunch, only simpler.
 """
+import sys
+from collections import OrderedDict
+from collections.abc import ValuesView
+
 from .compat import iterkeys, string_types
 
 RESERVED = dir({}) + ['items']
@@ -10,10 +14,50 @@ class ReservedWordWarning(Warning):
     pass
 
 
+class _NotLoaded(object):
+    """
+    Placeholder for a value that is held in a file but not in memory
+    """
+
+    def __repr__(self):
+        return '<not loaded>'
+
+
+NOT_LOADED = _NotLoaded()
+
+
+def _nbytes(value, deep=True):
+    """
+    Approximate number of bytes used by a value held in a vault
+
+    The objects held by object columns of pandas objects, such as strings,
+    are only counted if deep is True, which requires visiting each one.
+    """
+    memory_usage = getattr(value, 'memory_usage', None)
+    if callable(memory_usage):  # pandas
+        try:
+            usage = memory_usage(index=True, deep=deep)
+        except TypeError:  # Index and Categorical
+            usage = memory_usage(deep=deep)
+        return int(getattr(usage, 'sum', lambda: usage)())
+    nbytes = getattr(value, 'nbytes', None)
+    if nbytes is not None:
+        return int(nbytes)
+    return sys.getsizeof(value)
+
+
 class Vault(dict):
     """
     A dictionary that also supports assignment or access using attributes.
 
+    Parameters
+    ----------
+    max_bytes: int, optional
+        Upper bound on the memory used by values that are backed by a file.
+        When set, the least-recently used backed values are dropped once the
+        budget is exceeded and transparently re-read on their next access.
+        Values assigned directly are never evicted.
+
     >>> v = Vault()
     >>> v.a = 'apple'
     >>> v['b'] = 'apple'
@@ -22,20 +66,153 @@ class Vault(dict):
     Notes
     -----
     Use items to access the list of objects stored in the vault
+
+    Values that are backed by a file but not in memory are read whenever
+    they are accessed, including when the vault is iterated over by values,
+    copied into a dict (``dict(vault)``, ``{**vault}``) or compared, so a
+    vault always behaves as a dict holding every value.
     """
 
+    def __init__(self, *args, **kwargs):
+        max_bytes = kwargs.pop('max_bytes', None)
+        dict.__init__(self, *args, **kwargs)
+        object.__setattr__(self, '_max_bytes', max_bytes)
+        object.__setattr__(self, '_sources', {})
+        object.__setattr__(self, '_resident', OrderedDict())
+        object.__setattr__(self, '_resident_bytes', 0)
+
     def __contains__(self, k):
         """
         Allows use as in x in vault
         """
         return dict.__contains__(self, k)
 
+    def __iter__(self):
+        # Overridden so that dict(vault) and {**vault} use __getitem__
+        # rather than reading the placeholders stored for unloaded values
+        return dict.__iter__(self)
+
+    def _loaded(self):
+        """
+        dict holding every value in the vault, reading values as required
+        """
+        return dict((key, self[key]) for key in list(iterkeys(self)))
+
+    def __eq__(self, other):
+        if not isinstance(other, dict):
+            return NotImplemented
+        if isinstance(other, Vault):
+            other = other._loaded()
+        return self._loaded() == other
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __getitem__(self, key):
+        value = dict.__getitem__(self, key)
+        if key not in self._sources:
+            return value
+        if value is NOT_LOADED:
+            value = self._sources[key]()
+            dict.__setitem__(self, key, value)
+            self._track(key, value)
+        else:
+            # Mark as most recently used
+            self._resident[key] = self._resident.pop(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self._forget(key)
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        self._forget(key)
+        dict.__delitem__(self, key)
+
     def __setattr__(self, key, value):
         if key in RESERVED:
             raise AttributeError('{0} is a reserved attribute.  This key can '
                                  'only be set using dictionary syntax.')
         self[key] = value
 
+    def _set_lazy(self, key, load):
+        """
+        Register a value that is read by calling load on first access
+        """
+        self._forget(key)
+        dict.__setitem__(self, key, NOT_LOADED)
+        self._sources[key] = load
+
+    def _track(self, key, value):
+        nbytes = _nbytes(value)
+        self._resident[key] = nbytes
+        object.__setattr__(self, '_resident_bytes',
+                           self._resident_bytes + nbytes)
+        if self._max_bytes is None:
+            return
+        # Evict least-recently used values, never the one just loaded
+        while self._resident_bytes > self._max_bytes:
+            oldest = next(iter(self._resident))
+            if oldest == key:
+                break
+            self._evict(oldest)
+
+    def _evict(self, key):
+        nbytes = self._resident.pop(key)
+        object.__setattr__(self, '_resident_bytes',
+                           self._resident_bytes - nbytes)
+        dict.__setitem__(self, key, NOT_LOADED)
+
+    def _forget(self, key):
+        self._sources.pop(key, None)
+        if key in self._resident:
+            self._evict(key)
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def pop(self, key, *default):
+        if key in self:
+            value = self[key]
+            del self[key]
+            return value
+        return dict.pop(self, key, *default)
+
+    def setdefault(self, key, default=None):
+        if key in self:
+            return self[key]
+        self[key] = default
+        return default
+
+    def popitem(self):
+        if not self:
+            raise KeyError('popitem(): vault is empty')
+        key = list(iterkeys(self))[-1]
+        return key, self.pop(key)
+
+    def values(self):
+        """
+        View of the values in the vault, which are loaded as required
+        """
+        return ValuesView(self)
+
+    def copy(self):
+        vault = Vault(max_bytes=self._max_bytes)
+        for key in iterkeys(self):
+            if key in self._sources:
+                vault._set_lazy(key, self._sources[key])
+            else:
+                dict.__setitem__(vault, key, dict.__getitem__(self, key))
+        return vault
+
+    def __reduce__(self):
+        # Values held in a file are read so that the pickle is self-contained
+        items = [(key, self[key]) for key in list(iterkeys(self))]
+        return self.__class__, (items,)
+
     @property
     def items(self):
         """
@@ -54,7 +231,7 @@ class Vault(dict):
 
     def __getattr__(self, item):
         try:
-            return dict.__getitem__(self, item)
+            return self[item]
         except KeyError:
             raise AttributeError(item)
 
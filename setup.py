@@ -8,6 +8,11 @@ setup(
     license='NSCA',
     author='Kevin Sheppard',
     url='https://github.com/bashtage/pandas-stash',
+    python_requires='>=3.8',
+    install_requires=['numpy>=1.16.5', 'pandas>=1.2', 'tables>=3.6.1'],
+    entry_points={
+        'console_scripts': ['pandas-stash = pandas_stash.cli:main']
+    },
     long_description=open('README.md').read()
 )
 